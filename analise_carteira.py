@@ -0,0 +1,254 @@
+"""
+Análise da carteira: descontos agregados de todos os clientes do armazenamento.
+
+Aplica em lote, sobre todos os clientes de uma vez, a mesma conta do relatório
+final (ajustar_datas -> inserir_totais_na_coluna): para cada cliente,
+A = soma dos descontos, B = valor recebido, Indébito = A - B e Indébito em
+dobro = 2 x (A - B). Sobre esses valores são montados os resumos:
+
+  por_rubrica   total, clientes e meses por rubrica/credor (normalizada), do maior total ao menor
+  por_ano       total, clientes e meses por ano
+  por_cliente   A, B, Indébito e Indébito em dobro por cliente, do maior indébito ao menor
+  indebito      distribuição do indébito entre os clientes (faixas de valor)
+
+Os dados são lidos do armazenamento (armazenamento.py) com uma consulta por
+tabela e agregados com group-bys vetorizados, em centavos (somas exatas); nenhum
+relatório de cliente é percorrido individualmente.
+
+A origem padrão são os descontos finais gravados pelos relatórios. Com
+origem="lancamentos", usa os consolidados: as linhas de DESCONTOS são filtradas
+pelo glossário (cada rubrica distinta é pontuada uma única vez), o que inclui
+clientes cujo relatório final ainda não foi gerado.
+
+Uso:
+    python analise_carteira.py [--banco fichas.sqlite3] [--top 20]
+                               [--ano-inicial 2018] [--ano-final 2022]
+                               [--origem descontos|lancamentos] [--csv DIRETORIO]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from armazenamento import CAMINHO_PADRAO as BANCO_PADRAO, obter_armazenamento
+from glossario import ClassificadorGlossario, pontuar_descricoes
+from valores import formatar_brl, texto_brl
+
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+
+# Limites (em reais) das faixas de indébito; a última faixa é aberta
+FAIXAS_INDEBITO = [0, 1_000, 5_000, 10_000, 50_000, 100_000]
+
+COLUNAS_DESCONTOS = ["cliente_id", "matricula", "nome", "discriminacao", "discriminacao_norm",
+                     "categoria", "ano", "mes", "centavos"]
+
+
+def carregar_descontos(armazenamento, origem="descontos", classificador=None, threshold=85,
+                       ano_inicial=None, ano_final=None) -> pd.DataFrame:
+    """
+    Descontos de todos os clientes (uma linha por rubrica e mês), em uma única
+    consulta. Com origem="lancamentos", `classificador` (ClassificadorGlossario ou
+    lista de termos) seleciona as rubricas do consolidado com score >= threshold.
+    """
+    if origem not in ("descontos", "lancamentos"):
+        raise ValueError(f"Origem inválida: {origem}")
+    if origem == "lancamentos" and classificador is None:
+        raise ValueError("Informe o classificador para analisar os consolidados.")
+
+    condicoes, parametros = [], []
+    if origem == "lancamentos":
+        condicoes.append("UPPER(t.tipo) = 'DESCONTOS'")
+    if ano_inicial is not None:
+        condicoes.append("t.ano >= ?")
+        parametros.append(int(ano_inicial))
+    if ano_final is not None:
+        condicoes.append("t.ano <= ?")
+        parametros.append(int(ano_final))
+    categoria = "t.categoria" if origem == "descontos" else "NULL AS categoria"
+    sql = (
+        f"SELECT t.cliente_id, c.matricula, c.nome, t.discriminacao, t.discriminacao_norm, {categoria}, "
+        f"t.ano, t.mes, t.centavos FROM {origem} t JOIN clientes c ON c.id = t.cliente_id"
+    )
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    df = armazenamento.ler_sql(sql, parametros)
+
+    if origem == "lancamentos" and not df.empty:
+        # Pontua cada rubrica distinta uma vez e propaga o resultado por máscara
+        unicas = pd.Series(pd.unique(df["discriminacao"]), dtype=object)
+        if isinstance(classificador, ClassificadorGlossario):
+            pontuacoes = classificador.pontuar(unicas)
+        else:
+            pontuacoes = pontuar_descricoes(unicas, classificador)
+        scores = df["discriminacao"].map(pontuacoes["SCORE"]).fillna(0)
+        df = df[scores >= threshold]
+        if "CATEGORIA" in pontuacoes.columns:
+            df = df.assign(categoria=df["discriminacao"].map(pontuacoes["CATEGORIA"]))
+    return df.reset_index(drop=True)[COLUNAS_DESCONTOS]
+
+
+def carregar_recebidos(armazenamento) -> pd.Series:
+    """Valor recebido (B), em centavos, por cliente_id (clientes sem relatório valem 0)."""
+    df = armazenamento.ler_sql("SELECT id AS cliente_id, valor_recebido_centavos FROM clientes")
+    return df.set_index("cliente_id")["valor_recebido_centavos"].fillna(0).astype("int64")
+
+
+def totais_por_cliente(df_descontos, recebidos) -> pd.DataFrame:
+    """
+    Versão em lote de inserir_totais_na_coluna: A, B, Indébito (A-B) e Indébito em
+    dobro, em centavos, por cliente, ordenados do maior indébito ao menor.
+    """
+    colunas = ["cliente_id", "matricula", "nome", "meses", "a_centavos", "b_centavos",
+               "indebito_centavos", "indebito_dobro_centavos"]
+    if df_descontos.empty:
+        return pd.DataFrame(columns=colunas)
+    por_cliente = df_descontos.groupby("cliente_id", sort=False).agg(
+        matricula=("matricula", "first"),
+        nome=("nome", "first"),
+        meses=("centavos", "size"),
+        a_centavos=("centavos", "sum"),
+    )
+    por_cliente["b_centavos"] = recebidos.reindex(por_cliente.index, fill_value=0).to_numpy()
+    por_cliente["indebito_centavos"] = por_cliente["a_centavos"] - por_cliente["b_centavos"]
+    por_cliente["indebito_dobro_centavos"] = 2 * por_cliente["indebito_centavos"]
+    return por_cliente.reset_index().sort_values("indebito_centavos", ascending=False, kind="stable")[colunas]
+
+
+def resumo_por_rubrica(df_descontos, top=None) -> pd.DataFrame:
+    """Total, clientes e meses por rubrica/credor, do maior total ao menor."""
+    colunas = ["discriminacao", "categoria", "clientes", "meses", "total_centavos", "participacao"]
+    if df_descontos.empty:
+        return pd.DataFrame(columns=colunas)
+    resumo = df_descontos.groupby("discriminacao_norm", sort=False).agg(
+        discriminacao=("discriminacao", "first"),
+        categoria=("categoria", "first"),
+        clientes=("cliente_id", "nunique"),
+        meses=("centavos", "size"),
+        total_centavos=("centavos", "sum"),
+    )
+    resumo["participacao"] = (resumo["total_centavos"] / resumo["total_centavos"].sum()).round(4)
+    resumo = resumo.sort_values("total_centavos", ascending=False, kind="stable").reset_index(drop=True)
+    return (resumo.head(top) if top else resumo)[colunas]
+
+
+def resumo_por_ano(df_descontos) -> pd.DataFrame:
+    """Total, clientes, meses e rubricas distintas por ano."""
+    colunas = ["ano", "clientes", "meses", "rubricas", "total_centavos"]
+    if df_descontos.empty:
+        return pd.DataFrame(columns=colunas)
+    resumo = df_descontos.groupby("ano").agg(
+        clientes=("cliente_id", "nunique"),
+        meses=("centavos", "size"),
+        rubricas=("discriminacao_norm", "nunique"),
+        total_centavos=("centavos", "sum"),
+    )
+    return resumo.reset_index()[colunas]
+
+
+def distribuicao_indebito(totais, faixas=None) -> pd.DataFrame:
+    """
+    Quantidade de clientes e indébito total por faixa de valor (limites em reais).
+    Com as faixas padrão, indébitos negativos (recebido maior que o descontado)
+    ficam na primeira faixa.
+    """
+    faixas = FAIXAS_INDEBITO if faixas is None else faixas
+    limites = [-np.inf] + [int(f) * 100 for f in faixas] + [np.inf]
+    rotulos = [f"< {texto_brl(faixas[0] * 100)}"] + [
+        f"{texto_brl(inicio * 100)} a {texto_brl(fim * 100)}" for inicio, fim in zip(faixas[:-1], faixas[1:])
+    ] + [f">= {texto_brl(faixas[-1] * 100)}"]
+    colunas = ["faixa", "clientes", "indebito_centavos"]
+    if totais.empty:
+        return pd.DataFrame({"faixa": rotulos, "clientes": 0, "indebito_centavos": 0}, columns=colunas)
+    faixa = pd.cut(totais["indebito_centavos"], bins=limites, labels=rotulos, right=False)
+    resumo = totais.groupby(faixa, observed=False).agg(
+        clientes=("cliente_id", "size"),
+        indebito_centavos=("indebito_centavos", "sum"),
+    )
+    return resumo.rename_axis("faixa").reset_index()[colunas]
+
+
+def analisar_carteira(armazenamento=None, top=20, origem="descontos", classificador=None, threshold=85,
+                      ano_inicial=None, ano_final=None) -> dict:
+    """
+    Resumos da carteira: {"por_rubrica", "por_ano", "por_cliente", "indebito"}
+    (DataFrames com valores em centavos) e "geral" (dict com os totais).
+    """
+    armazenamento = armazenamento or obter_armazenamento()
+    df = carregar_descontos(armazenamento, origem, classificador, threshold, ano_inicial, ano_final)
+    totais = totais_por_cliente(df, carregar_recebidos(armazenamento))
+    geral = {
+        "clientes": int(len(totais)),
+        "meses": int(len(df)),
+        "a_centavos": int(totais["a_centavos"].sum()),
+        "b_centavos": int(totais["b_centavos"].sum()),
+        "indebito_centavos": int(totais["indebito_centavos"].sum()),
+    }
+    return {
+        "geral": geral,
+        "por_rubrica": resumo_por_rubrica(df, top),
+        "por_ano": resumo_por_ano(df),
+        "por_cliente": totais.head(top) if top else totais,
+        "indebito": distribuicao_indebito(totais),
+    }
+
+
+def formatar_resumo(df) -> pd.DataFrame:
+    """Cópia do resumo com as colunas *_centavos formatadas em reais ("1.234,56")."""
+    df = df.copy()
+    for coluna in [c for c in df.columns if c.endswith("_centavos")]:
+        df[coluna.removesuffix("_centavos")] = formatar_brl(df.pop(coluna))
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumos de descontos de todos os clientes do armazenamento.")
+    parser.add_argument("--banco", default=BANCO_PADRAO, help="Arquivo SQLite do armazenamento.")
+    parser.add_argument("--top", type=int, default=20, help="Linhas dos rankings (0 para todas).")
+    parser.add_argument("--ano-inicial", type=int, default=None)
+    parser.add_argument("--ano-final", type=int, default=None)
+    parser.add_argument("--origem", choices=["descontos", "lancamentos"], default="descontos",
+                        help="Descontos finais dos relatórios ou consolidados filtrados pelo glossário.")
+    parser.add_argument("--threshold", type=int, default=85,
+                        help="Similaridade mínima com o glossário (origem lancamentos).")
+    parser.add_argument("--glossario", default=os.path.join(DIRETORIO_APP, "Rubricas.txt"))
+    parser.add_argument("--tarifas", default=os.path.join(DIRETORIO_APP, "Tarifas.txt"))
+    parser.add_argument("--csv", help="Diretório onde gravar cada resumo em CSV.")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.banco):
+        parser.error(f"armazenamento não encontrado: {args.banco}")
+    classificador = None
+    if args.origem == "lancamentos":
+        import app5  # só para o glossário; a análise pelos descontos finais não precisa dele
+        classificador = app5.carregar_classificador(args.glossario, args.tarifas)
+
+    resultado = analisar_carteira(
+        obter_armazenamento(args.banco), top=args.top, origem=args.origem, classificador=classificador,
+        threshold=args.threshold, ano_inicial=args.ano_inicial, ano_final=args.ano_final,
+    )
+    geral = resultado["geral"]
+    print(f"{geral['clientes']} cliente(s), {geral['meses']} lançamento(s) de desconto")
+    print(f"A = {texto_brl(geral['a_centavos'])}   B = {texto_brl(geral['b_centavos'])}"
+          f"   Indébito = {texto_brl(geral['indebito_centavos'])}")
+    titulos = {
+        "por_rubrica": "Maiores rubricas/credores",
+        "por_ano": "Totais por ano",
+        "por_cliente": "Maiores indébitos por cliente",
+        "indebito": "Distribuição do indébito",
+    }
+    with pd.option_context("display.max_rows", None, "display.width", 160):
+        for nome, titulo in titulos.items():
+            print(f"\n{titulo}")
+            print(formatar_resumo(resultado[nome]).to_string(index=False))
+
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+        for nome in titulos:
+            resultado[nome].to_csv(os.path.join(args.csv, f"{nome}.csv"), index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,35 +1,92 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import re
 import tempfile
 import os
+import time
+import mmap
+import uuid
 import base64
 from io import BytesIO
+from contextlib import contextmanager, closing, nullcontext
 
-# Fuzzy matching
-from rapidfuzz import process, fuzz
+# Os módulos pesados (PyMuPDF, python-docx, fpdf2, rapidfuzz, Camelot/OpenCV) são
+# importados no primeiro uso, para a tela de envio abrir sem carregá-los;
+# aquecimento.py os pré-carrega em segundo plano depois que a interface sobe.
 
-# Geração de DOCX
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.section import WD_ORIENT
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+# Escape do texto no XML das linhas do DOCX (python-docx é importado só ao gerar o relatório)
+from xml.sax.saxutils import escape as escape_xml
 
-# Extração de texto do PDF
-from PyPDF2 import PdfReader
-import fitz
+# Fuzzy matching (pontuação em lote contra o glossário)
+from glossario import (
+    pontuar_descricoes, obter_classificador, ClassificadorGlossario,
+    CATEGORIA_RUBRICA, CATEGORIA_TARIFA
+)
+
+# Cache em disco dos resultados de extração (por hash do PDF)
+from cache_extracao import obter_cache, hash_arquivo, hash_bytes, chave_extracao
+
+# Leitura das tabelas (Camelot) por faixas de páginas em paralelo
+from extracao_paralela import ler_tabelas, iterar_tabelas
+
+# OCR (Tesseract) das páginas digitalizadas, sem camada de texto
+from ocr_paginas import OCR_PADRAO, pagina_sem_texto, reconhecer_paginas
+
+# Valores monetários (centavos inteiros, formatos BR/US)
+from valores import para_centavos, centavos_de_texto, centavos_digitados, formatar_brl, formatar_us, texto_brl
+
+# Medição de tempo/CPU/memória de cada etapa (painel lateral e log JSON lines)
+from instrumentacao import MedicaoDocumento
+
+# Fila de tarefas em segundo plano (extração fora da thread do script)
+from tarefas import obter_fila, CONCLUIDA, ERRO, CANCELADA
+
+# Armazenamento persistente (SQLite) das fichas extraídas, para consultas entre clientes
+from armazenamento import obter_armazenamento, periodos_consolidado
+
+# Pré-carga dos módulos pesados e dos glossários em segundo plano
+from aquecimento import AQUECIMENTO_PADRAO, aquecer, medicao_aquecimento
+
+# Logomarca e glossários carregados uma vez por processo (recarregados se o arquivo mudar)
+from recursos import obter_recurso
+
+# DataFrames da sessão (consolidado e recortes) compactos, com orçamento de memória
+from estado_sessao import obter_estado, uso_memoria
+
+# Backend padrão de extração de tabelas ("camelot" ou "texto")
+BACKEND_PADRAO = os.environ.get("FICHA_BACKEND", "camelot")
+
+# Diretório dos PDFs temporários gravados só para o Camelot (None = padrão do sistema)
+DIRETORIO_TEMP = os.environ.get("FICHA_TMP_DIR") or None
+
+# Triagem das páginas pela camada de texto antes do Camelot ("0" desativa)
+TRIAGEM_PADRAO = os.environ.get("FICHA_TRIAGEM", "1") != "0"
+
+class ErroExtracao(Exception):
+    """Falha ao extrair os dados de uma ficha (PDF ilegível, sem tabelas etc.)."""
 
 ###############################################################################
 # FALLBACK PARA st.session_state (EVITA KeyError)
 ###############################################################################
 _fallback_state = {
     "df_consolidado": None,
-    "df_filtrado_descontos": None,
-    "df_gloss": None,
-    "df_incluido": None,
+    "estado_dados": None,
+    "pontuacoes_rubricas": None,
+    "filtro_rubricas": None,
+    "pdf_consolidado": None,
     "nome_cliente": None,
     "matricula": None,
     "nome_servidor": None,
+    "medicao": None,
+    "tarefas_sessao": None,
+    "extracoes_canceladas": None,
+    "id_sessao": None,
+    "fichas_armazenadas": None,
+    "documentos_sessao": None,
+    "descontos_gravados": None,
+    "identificacoes": None,
+    "consulta_tarefa": False,
     # Opcionalmente, valor_recebido (B)
     "valor_recebido": "0"
 }
@@ -73,20 +130,459 @@ def remover_prefixos_indesejados(texto: str) -> str:
     retorno = re.sub(r"\s+", " ", retorno).strip()
     return retorno
 
+###############################################################################
+# GRADE DA TABELA PELA CAMADA DE TEXTO (COORDENADAS DAS PALAVRAS – PyMuPDF)
+###############################################################################
+def agrupar_linhas(palavras):
+    """
+    Agrupa palavras (x0, y0, x1, y1, texto, ...) em linhas visuais, pela posição
+    vertical. Retorna lista de linhas (de cima para baixo), cada uma com as palavras
+    ordenadas da esquerda para a direita.
+    """
+    if not palavras:
+        return []
+    alturas = sorted(p[3] - p[1] for p in palavras)
+    tolerancia = max(alturas[len(alturas) // 2] * 0.5, 1.0)
+    ordenadas = sorted(palavras, key=lambda p: ((p[1] + p[3]) / 2, p[0]))
+    linhas = []
+    linha_atual = [ordenadas[0]]
+    y_linha = (ordenadas[0][1] + ordenadas[0][3]) / 2
+    for p in ordenadas[1:]:
+        y = (p[1] + p[3]) / 2
+        if y - y_linha > tolerancia:
+            linhas.append(sorted(linha_atual, key=lambda w: w[0]))
+            linha_atual = [p]
+            y_linha = y
+        else:
+            linha_atual.append(p)
+    linhas.append(sorted(linha_atual, key=lambda w: w[0]))
+    return linhas
+
+def _texto_linha(linha):
+    return " ".join(p[4] for p in linha)
+
+def _fronteiras_colunas(cabecalho, corpo):
+    """
+    Calcula as fronteiras (x) entre as colunas do cabeçalho: entre dois rótulos
+    vizinhos, usa o meio do maior vão horizontal não atravessado por nenhuma
+    palavra do corpo da tabela (ou o ponto médio entre os rótulos, se não houver vão).
+    """
+    fronteiras = []
+    for esq, dir_ in zip(cabecalho, cabecalho[1:]):
+        lo, hi = esq[2], dir_[0]
+        if hi <= lo:
+            fronteiras.append((esq[2] + dir_[0]) / 2)
+            continue
+        ocupados = sorted(
+            (max(p[0], lo), min(p[2], hi)) for p in corpo if p[2] > lo and p[0] < hi
+        )
+        melhor_vao, cursor = (0.0, None), lo
+        for ini, fim in ocupados:
+            if ini - cursor > melhor_vao[0]:
+                melhor_vao = (ini - cursor, (cursor + ini) / 2)
+            cursor = max(cursor, fim)
+        if hi - cursor > melhor_vao[0]:
+            melhor_vao = (hi - cursor, (cursor + hi) / 2)
+        fronteiras.append(melhor_vao[1] if melhor_vao[1] is not None else (lo + hi) / 2)
+    return fronteiras
+
+def tabela_por_palavras(palavras):
+    """
+    Reconstrói a grade TIPO / DISCRIMINAÇÃO / meses de uma página a partir das
+    coordenadas das palavras. Retorna um DataFrame no mesmo formato das tabelas do
+    Camelot (primeira linha = cabeçalho, última = 'TOTAL BRUTO'), ou None se o bloco
+    'TIPO'...'TOTAL BRUTO' não for encontrado na página.
+    """
+    linhas = agrupar_linhas(palavras)
+    idx_cab = next((
+        i for i, linha in enumerate(linhas)
+        if any(p[4].upper() == "TIPO" for p in linha)
+        and any("DISCRIMIN" in p[4].upper() for p in linha)
+    ), None)
+    if idx_cab is None:
+        return None
+    idx_fim = next((
+        i for i in range(idx_cab + 1, len(linhas))
+        if "TOTAL BRUTO" in _texto_linha(linhas[i]).upper()
+    ), None)
+    if idx_fim is None:
+        return None
+
+    cabecalho = linhas[idx_cab]
+    corpo = linhas[idx_cab + 1:idx_fim]
+    fronteiras = _fronteiras_colunas(cabecalho, [p for linha in corpo for p in linha])
+    rotulos = [p[4] for p in cabecalho]
+    idx_tipo = next(i for i, r in enumerate(rotulos) if r.upper() == "TIPO")
+    idx_discr = next(i for i, r in enumerate(rotulos) if "DISCRIMIN" in r.upper())
+    colunas_texto = {idx_tipo, idx_discr}
+
+    def _celulas(linha):
+        celulas = [[] for _ in rotulos]
+        for p in linha:
+            x_centro = (p[0] + p[2]) / 2
+            col = sum(1 for f in fronteiras if x_centro > f)
+            celulas[col].append(p[4])
+        return [" ".join(c) for c in celulas]
+
+    registros = [rotulos]
+    for linha in corpo:
+        celulas = _celulas(linha)
+        sem_valores = not any(v for i, v in enumerate(celulas) if i not in colunas_texto)
+        # Linha sem TIPO e sem valores = continuação (quebra de linha) da DISCRIMINAÇÃO anterior
+        if sem_valores and not celulas[idx_tipo] and len(registros) > 1:
+            anterior = registros[-1]
+            anterior[idx_discr] = f"{anterior[idx_discr]}\n{celulas[idx_discr]}".strip()
+            continue
+        registros.append(celulas)
+    registros.append(_celulas(linhas[idx_fim]))
+    return pd.DataFrame(registros)
+
+def _celula_ano_por_linhas(palavras, termo_referencia):
+    """
+    Procura, nas linhas visuais da página, a linha que contém o termo (ex.: 'ANO REFERÊNCIA')
+    e retorna seu texto (acrescido da linha seguinte, se o ano não estiver na mesma linha).
+    """
+    linhas = agrupar_linhas(palavras)
+    for i, linha in enumerate(linhas):
+        texto = _texto_linha(linha)
+        if termo_referencia.upper() in texto.upper():
+            if not extrair_ultimos_quatro_digitos(texto) and i + 1 < len(linhas):
+                texto = f"{texto}\n{_texto_linha(linhas[i + 1])}"
+            return texto
+    return None
+
+###############################################################################
+# TRIAGEM DAS PÁGINAS (CAMADA DE TEXTO, ANTES DO CAMELOT)
+###############################################################################
+def triar_paginas(texto_paginas):
+    """
+    Classifica as páginas pelo texto (PyMuPDF), sem detectar linhas. Retorna um
+    DataFrame com, por página, GRADE: contém o bloco 'TIPO' / 'DISCRIMINAÇÃO' ...
+    'TOTAL BRUTO'. Capas, folhas de assinatura, anexos e páginas em branco ficam
+    com GRADE False.
+    """
+    texto = pd.Series(texto_paginas, dtype="string").fillna("").str.upper()
+    grade = (
+        texto.str.contains(r"\bTIPO\b", regex=True)
+        & texto.str.contains("DISCRIMIN", regex=False)
+        & texto.str.contains("TOTAL BRUTO", regex=False)
+    )
+    return pd.DataFrame({
+        "PÁGINA": np.arange(1, len(texto) + 1),
+        "GRADE": grade.to_numpy(dtype=bool),
+    })
+
+###############################################################################
+# DOCUMENTO DA FICHA (PDF LIDO UMA ÚNICA VEZ)
+###############################################################################
+class DocumentoFicha:
+    """
+    Abre o PDF da ficha uma única vez e expõe, sob demanda, o texto de cada página,
+    as palavras com suas coordenadas (PyMuPDF) e as tabelas detectadas pelo Camelot.
+    Todos os extratores leem deste objeto, em vez de reabrir o arquivo.
+
+    A ficha pode vir de um caminho (`pdf_path`) ou dos bytes em memória (`dados`,
+    ex.: o arquivo enviado ao Streamlit). Com `dados`, o texto é lido direto da
+    memória e um arquivo temporário só é gravado quando o Camelot precisa ler
+    alguma página (e removido logo em seguida). Com `mapear=True`, o arquivo em
+    `pdf_path` é mapeado em memória (mmap) para o hash e a leitura do texto; feche
+    o documento (`fechar()` ou bloco `with`) ao terminar.
+
+    `workers` define quantos processos leem as tabelas em paralelo
+    (None = variável FICHA_WORKERS; 0 = todos os núcleos) e fazem o OCR
+    (None = variável FICHA_OCR_WORKERS).
+
+    `backend` escolhe como as tabelas são obtidas:
+      - "camelot": detecção de linhas (lattice) em todas as páginas;
+      - "texto": grade reconstruída das coordenadas das palavras (PyMuPDF),
+        recorrendo ao Camelot apenas nas páginas em que o bloco
+        'TIPO'...'TOTAL BRUTO' não for encontrado.
+    (None = variável FICHA_BACKEND; padrão "camelot").
+
+    Com `ocr=True` (None = variável FICHA_OCR), as páginas sem camada de texto
+    (fichas digitalizadas) passam pelo OCR (ocr_paginas.py); o texto e as palavras
+    reconhecidos substituem os da página e a grade é reconstruída das palavras,
+    em qualquer backend (o Camelot não lê texto de imagens).
+
+    Com `triagem=True` (None = variável FICHA_TRIAGEM; padrão ativada), só as
+    páginas cuja camada de texto tem a grade (triar_paginas) vão para o extrator;
+    se nenhuma página tiver, todas vão, como sem a triagem.
+
+    `hash_sha256` aceita o hash já conhecido do PDF (não é recalculado).
+    """
+
+    def __init__(self, pdf_path=None, workers=None, backend=None, dados=None, mapear=False, ocr=None,
+                 triagem=None, hash_sha256=None):
+        if (pdf_path is None) == (dados is None):
+            raise ValueError("Informe o caminho do PDF ou o seu conteúdo (dados), não ambos.")
+        self.caminho = pdf_path
+        self.mapear = mapear
+        self._dados = dados
+        self._mapa = None
+        self.workers = workers
+        self.backend = backend or BACKEND_PADRAO
+        self.ocr = OCR_PADRAO if ocr is None else ocr
+        self.triagem = TRIAGEM_PADRAO if triagem is None else triagem
+        self._triagem_paginas = None
+        # Páginas cujas tabelas vieram da camada de texto (backend "texto" ou OCR)
+        self.paginas_camada_texto = set()
+        # Páginas cujo texto veio do OCR
+        self.paginas_ocr = set()
+        self._texto_camada = None
+        self._palavras_camada = None
+        self._texto_paginas = None
+        self._palavras_paginas = None
+        self._tabelas = None
+        self._hash = hash_sha256
+
+    @property
+    def hash_sha256(self):
+        """SHA-256 do conteúdo do PDF, usado como chave do cache de extração."""
+        if self._hash is None:
+            dados = self.dados
+            self._hash = hash_arquivo(self.caminho) if dados is None else hash_bytes(dados)
+        return self._hash
+
+    @property
+    def chave_extracao(self):
+        """Chave do cache de extração e das tarefas: o hash do PDF, o backend, o OCR e a triagem."""
+        return chave_extracao(self.hash_sha256, self.backend, self.ocr, self.triagem)
+
+    @property
+    def dados(self):
+        """Conteúdo do PDF em memória (bytes recebidos ou arquivo mapeado), ou None."""
+        if self._dados is None and self.mapear:
+            with open(self.caminho, "rb") as f:
+                self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._dados = memoryview(self._mapa)
+        return self._dados
+
+    def fechar(self):
+        """Libera o mapeamento do arquivo (documentos criados com mapear=True)."""
+        if self._mapa is not None:
+            self._dados.release()
+            self._mapa.close()
+            self._dados = None
+            self._mapa = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    @contextmanager
+    def caminho_em_disco(self):
+        """
+        Caminho do PDF para os leitores que só aceitam arquivos (Camelot). Para
+        documentos em memória, grava um arquivo temporário que é removido ao sair
+        do bloco, inclusive em caso de erro.
+        """
+        if self.caminho is not None:
+            yield self.caminho
+            return
+        fd, caminho_tmp = tempfile.mkstemp(suffix=".pdf", dir=DIRETORIO_TEMP)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._dados)
+            yield caminho_tmp
+        finally:
+            try:
+                os.unlink(caminho_tmp)
+            except FileNotFoundError:
+                pass
+
+    def _carregar_camada(self):
+        import fitz
+
+        dados = self.dados
+        doc = fitz.open(self.caminho) if dados is None else fitz.open(stream=dados, filetype="pdf")
+        try:
+            texto_paginas = []
+            palavras_paginas = []
+            for page in doc:
+                texto_paginas.append(page.get_text("text"))
+                palavras_paginas.append(page.get_text("words"))
+        finally:
+            doc.close()
+        self._texto_camada = texto_paginas
+        self._palavras_camada = palavras_paginas
+
+    def carregar_texto(self, verificar_cancelamento=None):
+        """
+        Lê o texto e as palavras das páginas (com o OCR, se ativado), caso ainda não
+        lidos. `verificar_cancelamento` é chamado entre as páginas do OCR.
+        """
+        if self._texto_paginas is None:
+            self._carregar_texto(verificar_cancelamento)
+
+    def _carregar_texto(self, verificar_cancelamento=None):
+        if self._texto_camada is None:
+            self._carregar_camada()
+        texto_paginas = list(self._texto_camada)
+        palavras_paginas = list(self._palavras_camada)
+        if self.ocr:
+            sem_texto = [i for i, palavras in enumerate(palavras_paginas, start=1) if pagina_sem_texto(palavras)]
+            if sem_texto:
+                with self.caminho_em_disco() as caminho:
+                    reconhecidas = reconhecer_paginas(
+                        caminho, sem_texto, self.workers, verificar_cancelamento=verificar_cancelamento
+                    )
+                for pagina, (texto, palavras) in reconhecidas.items():
+                    texto_paginas[pagina - 1] = texto
+                    palavras_paginas[pagina - 1] = palavras
+                self.paginas_ocr = set(reconhecidas)
+        self._texto_paginas = texto_paginas
+        self._palavras_paginas = palavras_paginas
+
+    @property
+    def texto_paginas(self):
+        """Lista com o texto de cada página (índice 0 = página 1)."""
+        if self._texto_paginas is None:
+            self._carregar_texto()
+        return self._texto_paginas
+
+    @property
+    def texto_sem_ocr(self):
+        """
+        Texto de cada página sem disparar o OCR (para a interface): o texto completo,
+        se já carregado, ou só a camada de texto do PDF (vazia nas páginas digitalizadas).
+        """
+        if self._texto_paginas is not None or not self.ocr:
+            return self.texto_paginas
+        if self._texto_camada is None:
+            self._carregar_camada()
+        return self._texto_camada
+
+    @property
+    def palavras_paginas(self):
+        """Lista, por página, das palavras (x0, y0, x1, y1, texto, bloco, linha, n)."""
+        if self._palavras_paginas is None:
+            self._carregar_texto()
+        return self._palavras_paginas
+
+    @property
+    def num_paginas(self):
+        return len(self.texto_paginas)
+
+    @property
+    def triagem_paginas(self):
+        """Classificação das páginas pela camada de texto (ver triar_paginas)."""
+        if self._triagem_paginas is None:
+            self._triagem_paginas = triar_paginas(self.texto_paginas)
+        return self._triagem_paginas
+
+    def paginas_com_tabela(self):
+        """Páginas enviadas ao extrator: as com grade na triagem (ou todas, sem triagem)."""
+        todas = list(range(1, self.num_paginas + 1))
+        if not self.triagem:
+            return todas
+        triagem = self.triagem_paginas
+        com_grade = triagem.loc[triagem["GRADE"], "PÁGINA"].tolist()
+        return com_grade or todas
+
+    @property
+    def tabelas(self):
+        """
+        Tabelas detectadas pelo Camelot (flavor 'lattice') nas páginas aprovadas na
+        triagem, como lista de tuplas (página, DataFrame), em ordem de página.
+        A leitura ocorre uma única vez (em paralelo, se houver mais de um worker).
+        """
+        if self._tabelas is None:
+            self._tabelas = self._tabelas_camada_texto()
+        return self._tabelas
+
+    def _paginas_por_palavras(self):
+        """Páginas cuja grade é reconstruída das palavras: todas no backend "texto"; as do OCR no "camelot"."""
+        if self.backend == "texto":
+            return list(range(1, self.num_paginas + 1))
+        return sorted(self.paginas_ocr)
+
+    def _grades_camada_texto(self):
+        """
+        Gera (página, grade da camada de texto ou None) para as páginas aprovadas
+        na triagem, registrando as resolvidas; as que não são lidas pelas palavras
+        vêm com None (e vão para o Camelot).
+        """
+        palavras_paginas = self.palavras_paginas  # carrega o texto (e o OCR) antes de escolher as páginas
+        por_palavras = set(self._paginas_por_palavras())
+        for pagina in self.paginas_com_tabela():
+            palavras = palavras_paginas[pagina - 1]
+            df_grade = tabela_por_palavras(palavras) if pagina in por_palavras else None
+            if df_grade is not None:
+                self.paginas_camada_texto.add(pagina)
+            yield pagina, df_grade
+
+    def _tabelas_camada_texto(self):
+        """Monta as tabelas pela camada de texto (quando houver) e usa o Camelot nas páginas restantes."""
+        tabelas_por_pagina = {}
+        pendentes = []
+        for pagina, df_grade in self._grades_camada_texto():
+            if df_grade is None:
+                pendentes.append(pagina)
+            else:
+                tabelas_por_pagina[pagina] = [df_grade]
+        if pendentes:
+            with self.caminho_em_disco() as caminho:
+                for pagina, df_table in ler_tabelas(caminho, pendentes, self.workers):
+                    tabelas_por_pagina.setdefault(pagina, []).append(df_table)
+        return [
+            (pagina, df_table)
+            for pagina in sorted(tabelas_por_pagina)
+            for df_table in tabelas_por_pagina[pagina]
+        ]
+
+    def iterar_tabelas(self):
+        """
+        Gera as tabelas (página, DataFrame) à medida que são extraídas, para exibição
+        progressiva. As páginas da camada de texto (backend "texto" ou OCR) vêm
+        primeiro e as demais (Camelot) em seguida. Ao final, `tabelas` fica preenchido
+        (em ordem de página) e não é extraído de novo.
+        """
+        if self._tabelas is not None:
+            yield from self._tabelas
+            return
+        extraidas = []
+        pendentes = []
+        for pagina, df_grade in self._grades_camada_texto():
+            if df_grade is None:
+                pendentes.append(pagina)
+            else:
+                extraidas.append((pagina, df_grade))
+                yield pagina, df_grade
+        if pendentes:
+            # Se a exibição for interrompida, o fechamento do gerador remove o temporário
+            with self.caminho_em_disco() as caminho:
+                for pagina, df_table in iterar_tabelas(caminho, pendentes, self.workers):
+                    extraidas.append((pagina, df_table))
+                    yield pagina, df_table
+        # sort estável: mantém a ordem das tabelas dentro de cada página
+        self._tabelas = sorted(extraidas, key=lambda item: item[0])
+
+
+def _como_documento(fonte):
+    """Aceita um DocumentoFicha, um caminho de PDF ou os seus bytes e retorna um DocumentoFicha."""
+    if isinstance(fonte, DocumentoFicha):
+        return fonte
+    if isinstance(fonte, (bytes, bytearray, memoryview)):
+        return DocumentoFicha(dados=fonte)
+    return DocumentoFicha(fonte)
+
+def _texto_identificacao(documento, sem_ocr):
+    return documento.texto_sem_ocr if sem_ocr else documento.texto_paginas
+
 ###############################################################################
 # EXTRAIR NOME DO CLIENTE (UTILIZANDO PyMuPDF)
 ###############################################################################
-def extrair_nome_cliente(pdf_path):
+def extrair_nome_cliente(documento, sem_ocr=False):
     """
     Tenta capturar o nome do servidor (e CPF) nas linhas
-    após 'NOME DO SERVIDOR', via PyMuPDF (fitz).
+    após 'NOME DO SERVIDOR', a partir do texto (PyMuPDF) do documento.
+    Com `sem_ocr=True`, não espera pelo OCR (usa DocumentoFicha.texto_sem_ocr).
     """
     try:
-        doc = fitz.open(pdf_path)
-        texto_completo = ""
-        for page in doc:
-            texto_completo += page.get_text("text") + "\n"
-        doc.close()
+        documento = _como_documento(documento)
+        texto_completo = "\n".join(_texto_identificacao(documento, sem_ocr)) + "\n"
 
         pattern = re.compile(
             r"NOME\s+DO\s+SERVIDOR.*?(?:\n.*?){0,6}([A-Za-zÀ-ÖØ-öø-ÿ\s]+)\s+(\d{3}\.\d{3}\.\d{3}-\d{2})",
@@ -102,36 +598,48 @@ def extrair_nome_cliente(pdf_path):
         return "N/D"
 
 ###############################################################################
-# EXTRAIR NOME E MATRÍCULA (UTILIZANDO PyPDF2)
+# EXTRAIR NOME E MATRÍCULA (PRIMEIRA PÁGINA)
 ###############################################################################
-def extrair_nome_e_matricula(pdf_path):
+def extrair_nome_e_matricula(documento, sem_ocr=False):
     """
-    Lê a primeira página via PyPDF2 e procura linhas com 'NOME' e 'MATRÍCULA-SEQ-DIG'.
-    Retorna 'N/D' se não encontradas.
+    Lê o texto da primeira página do documento e procura linhas com 'NOME' e
+    'MATRÍCULA-SEQ-DIG'. Retorna 'N/D' se não encontradas.
+    Com `sem_ocr=True`, não espera pelo OCR (usa DocumentoFicha.texto_sem_ocr).
     """
     nome = "N/D"
     matricula = "N/D"
     try:
-        with open(pdf_path, 'rb') as f:
-            reader = PdfReader(f)
-            if len(reader.pages) > 0:
-                text = reader.pages[0].extract_text() or ""
-                lines = text.split('\n')
-                for i, linha in enumerate(lines):
-                    if "NOME" in linha.upper() and i+1 < len(lines):
-                        valor_nome = lines[i+1].strip()
-                        match_nome = re.match(r"([^\d]+)", valor_nome)
-                        if match_nome:
-                            nome = match_nome.group(1).strip()
-                    if "MATRÍCULA-SEQ-DIG" in linha.upper() and i+1 < len(lines):
-                        valor_matr = lines[i+1].strip()
-                        matr_match = re.search(r"(\d{3}\.\d{3}-\d\s*[A-Z]*)", valor_matr)
-                        if matr_match:
-                            matricula = matr_match.group(1).strip()
+        documento = _como_documento(documento)
+        texto_paginas = _texto_identificacao(documento, sem_ocr)
+        if texto_paginas:
+            text = texto_paginas[0] or ""
+            lines = text.split('\n')
+            for i, linha in enumerate(lines):
+                if "NOME" in linha.upper() and i+1 < len(lines):
+                    valor_nome = lines[i+1].strip()
+                    match_nome = re.match(r"([^\d]+)", valor_nome)
+                    if match_nome:
+                        nome = match_nome.group(1).strip()
+                if "MATRÍCULA-SEQ-DIG" in linha.upper() and i+1 < len(lines):
+                    valor_matr = lines[i+1].strip()
+                    matr_match = re.search(r"(\d{3}\.\d{3}-\d\s*[A-Z]*)", valor_matr)
+                    if matr_match:
+                        matricula = matr_match.group(1).strip()
     except:
         pass
     return nome or "N/D", matricula or "N/D"
 
+def extrair_cpf(documento, sem_ocr=False):
+    """Primeiro CPF (000.000.000-00) da primeira página do documento, ou 'N/D'."""
+    try:
+        documento = _como_documento(documento)
+        texto_paginas = _texto_identificacao(documento, sem_ocr)
+        texto = texto_paginas[0] if texto_paginas else ""
+        match = re.search(r"\d{3}\.\d{3}\.\d{3}-\d{2}", texto or "")
+        return match.group(0) if match else "N/D"
+    except:
+        return "N/D"
+
 ###############################################################################
 # FUNÇÕES DE SUPORTE
 ###############################################################################
@@ -142,57 +650,100 @@ def sanitizar_para_arquivo(texto: str) -> str:
     texto = texto.strip().replace(" ", "_")
     return re.sub(r"[^\w\-_\.]", "", texto, flags=re.UNICODE)
 
+def _codificar_base64(dados):
+    return base64.b64encode(dados).decode()
+
+def _linhas_glossario(dados):
+    return tuple(dados.decode("utf-8").splitlines())
+
+def _montar_classificador(dados_rubricas, dados_tarifas):
+    return obter_classificador({
+        CATEGORIA_RUBRICA: list(_linhas_glossario(dados_rubricas)),
+        CATEGORIA_TARIFA: list(_linhas_glossario(dados_tarifas)),
+    })
+
 def get_image_base64(file_path):
     """
     Retorna a string base64 de uma imagem, útil para exibir no Streamlit.
+    A codificação é feita uma vez por processo (refeita se o arquivo mudar).
     """
-    if not os.path.exists(file_path):
+    try:
+        return obter_recurso(file_path, _codificar_base64)
+    except OSError:
         return ""
-    with open(file_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode()
 
 def carregar_glossario(path):
     """
     Lê um arquivo txt (uma rubrica por linha) e retorna como lista de strings.
+    O arquivo é lido uma vez por processo (relido se mudar).
     """
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read().splitlines()
+        return list(obter_recurso(path, _linhas_glossario))
     except Exception as e:
         st.error(f"Erro ao carregar glossário: {e}")
         return []
 
+def carregar_classificador(path_rubricas="Rubricas.txt", path_tarifas="Tarifas.txt"):
+    """
+    Carrega Rubricas.txt (cartão/empréstimo) e Tarifas.txt (tarifas/associações) em um
+    único classificador indexado, que rotula cada desconto com a sua categoria.
+    O classificador é compartilhado pelo processo e reconstruído só quando um dos
+    arquivos muda.
+    """
+    try:
+        return obter_recurso((path_rubricas, path_tarifas), _montar_classificador)
+    except Exception:
+        # Algum glossário ausente ou ilegível: carrega os que houver, com o aviso de erro
+        return obter_classificador({
+            CATEGORIA_RUBRICA: carregar_glossario(path_rubricas),
+            CATEGORIA_TARIFA: carregar_glossario(path_tarifas),
+        })
+
 ###############################################################################
 # EXTRAIR CELULAS DE INTERESSE (ANO REFERÊNCIA)
 ###############################################################################
-def extrair_celulas_interesse(pdf_path, termo_referencia="ANO REFERÊNCIA"):
+def extrair_celulas_interesse(documento, termo_referencia="ANO REFERÊNCIA", levantar_erros=False):
     """
-    Utiliza Camelot para identificar as células que contêm o texto 'ANO REFERÊNCIA' (ou outro termo).
+    Percorre as tabelas (Camelot) do documento para identificar as células que contêm
+    o texto 'ANO REFERÊNCIA' (ou outro termo). Nas páginas cuja grade veio da camada de
+    texto, procura o termo diretamente nas linhas do texto.
     Retorna DataFrame com as páginas e o conteúdo.
+    Com levantar_erros=True (uso fora do Streamlit), as exceções são propagadas.
     """
-    import camelot
     try:
-        tables = camelot.read_pdf(pdf_path, pages="all", flavor="lattice")
-        if not tables.n:
+        documento = _como_documento(documento)
+        tabelas = documento.tabelas
+        if not tabelas:
             return None
         dados = []
-        for table in tables:
-            pagina_atual = int(table.page)
-            df_table = table.df.copy()
-            for row_idx in range(df_table.shape[0]):
-                for col_idx in range(df_table.shape[1]):
-                    conteudo_celula = str(df_table.iat[row_idx, col_idx])
-                    if termo_referencia.upper() in conteudo_celula.upper():
-                        dados.append({
-                            "PÁGINA": pagina_atual,
-                            "CONTEÚDO": conteudo_celula
-                        })
+        for pagina_atual in sorted(documento.paginas_camada_texto):
+            conteudo_linha = _celula_ano_por_linhas(
+                documento.palavras_paginas[pagina_atual - 1], termo_referencia
+            )
+            if conteudo_linha:
+                dados.append({"PÁGINA": pagina_atual, "CONTEÚDO": conteudo_linha})
+        for pagina_atual, df_table in tabelas:
+            if pagina_atual in documento.paginas_camada_texto:
+                continue
+            for conteudo_celula in _celulas_com_termo(df_table, termo_referencia):
+                dados.append({
+                    "PÁGINA": pagina_atual,
+                    "CONTEÚDO": conteudo_celula
+                })
         df_resultado = pd.DataFrame(dados, columns=["PÁGINA", "CONTEÚDO"])
+        df_resultado = df_resultado.sort_values("PÁGINA", kind="stable", ignore_index=True)
         return df_resultado if not df_resultado.empty else None
     except Exception as e:
+        if levantar_erros:
+            raise
         st.error(f"Erro ao extrair células de interesse: {e}")
         return None
 
+def _celulas_com_termo(df_table, termo_referencia):
+    """Conteúdo das células da tabela que contêm o termo, linha a linha."""
+    celulas = df_table.to_numpy(dtype=str).ravel()
+    return [c for c in celulas if termo_referencia.upper() in c.upper()]
+
 def extrair_ultimos_quatro_digitos(texto):
     """
     Retorna os últimos 4 dígitos encontrados em 'texto'.
@@ -208,133 +759,382 @@ def classificar_registros_ffill(df):
         df["TIPO"] = df["TIPO"].replace("", None).ffill()
     return df
 
+def montar_anos_referencia(df_ano_celulas):
+    """
+    A partir das células de 'ANO REFERÊNCIA', retorna (DataFrame PÁGINA/ANO, dicionário PÁGINA -> ANO).
+    """
+    if df_ano_celulas is None or df_ano_celulas.empty:
+        return None, {}
+    df_ano_celulas = df_ano_celulas.copy()
+    df_ano_celulas["ANO"] = df_ano_celulas["CONTEÚDO"].apply(extrair_ultimos_quatro_digitos)
+    df_ano_celulas = df_ano_celulas[["PÁGINA", "ANO"]].drop_duplicates(subset="PÁGINA")
+    return df_ano_celulas, dict(zip(df_ano_celulas["PÁGINA"], df_ano_celulas["ANO"]))
+
+def preparar_consolidado(df_consolidado, dict_anos):
+    """
+    Completa o TIPO (forward fill), tipa a PÁGINA e aplica o mapa de anos ao DataFrame consolidado.
+    """
+    df_consolidado = classificar_registros_ffill(df_consolidado)
+    df_consolidado["PÁGINA"] = df_consolidado["PÁGINA"].astype(int)
+    # Caso alguma página não esteja no dicionário, mantemos a 'ANO' já extraída
+    df_consolidado["ANO"] = df_consolidado["PÁGINA"].map(dict_anos).fillna(df_consolidado["ANO"])
+    return df_consolidado
+
+def filtrar_descontos(df_consolidado, incluir_cabecalho=True):
+    """
+    Retorna as linhas de DESCONTOS do consolidado (e, opcionalmente, as de cabeçalho 'TIPO').
+    """
+    tipo = df_consolidado["TIPO"].str.upper()
+    mascara = tipo == "DESCONTOS"
+    if incluir_cabecalho:
+        mascara |= tipo == "TIPO"
+    return df_consolidado[mascara].copy()
+
 ###############################################################################
 # EXTRAIR TABELAS – DATAFRAME CONSOLIDADO (TODAS AS COLUNAS + ANO)
 ###############################################################################
-def extrair_tabelas(pdf_path, anos_referencia):
+COLUNAS_FINAIS = [
+    "PÁGINA", "TIPO", "DISCRIMINAÇÃO",
+    "JAN", "FEV", "MAR", "ABR", "MAI", "JUN",
+    "JUL", "AGO", "SET", "OUT", "NOV", "DEZ",
+    "ANO"
+]
+
+MESES_IMPAR = ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]
+MESES_PAR = ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
+
+def _linhas_com_marcador(texto_maiusculo, marcador):
+    """Posições das linhas em que alguma célula contém o marcador (busca vetorizada)."""
+    return np.flatnonzero((np.char.find(texto_maiusculo, marcador) >= 0).any(axis=1))
+
+def _coluna_do_rotulo(rotulo, meses_pagina):
+    """Mapeia o rótulo do cabeçalho da tabela para o nome de coluna final (ou None)."""
+    c_up = str(rotulo).upper().strip()
+    if "TIPO" in c_up:
+        return "TIPO"
+    if "DISCRIMIN" in c_up:
+        return "DISCRIMINAÇÃO"
+    for mes in meses_pagina:
+        if mes in c_up:
+            return mes
+    return None
+
+def _limites_bloco(df_tab):
+    """
+    Localiza (início, fim) do bloco da tabela: a linha com 'TIPO' (cabeçalho) e a
+    linha com 'TOTAL BRUTO' (exclusiva). Retorna None se o bloco não existir.
+    """
+    if df_tab.empty:
+        return None
+    texto_maiusculo = np.char.upper(df_tab.to_numpy(dtype=str))
+    start_idx_list = _linhas_com_marcador(texto_maiusculo, "TIPO")
+    end_idx_list = _linhas_com_marcador(texto_maiusculo, "TOTAL BRUTO")
+    if not len(start_idx_list) or not len(end_idx_list):
+        return None
+    start_idx = start_idx_list[0]
+    end_idx = end_idx_list[0]
+    if end_idx <= start_idx:
+        return None
+    return start_idx, end_idx
+
+def _alocar_colunas(num_linhas):
+    """Arrays vazios (None) para cada coluna final; PÁGINA é inteira."""
+    dados = {col: np.empty(num_linhas, dtype=object) for col in COLUNAS_FINAIS}
+    dados["PÁGINA"] = np.empty(num_linhas, dtype=np.int64)
+    return dados
+
+def _preencher_colunas(dados, pos, df_tab, limites, pagina_atual, anos_referencia):
+    """
+    Copia as linhas do bloco (sem o cabeçalho) para `dados` a partir da posição `pos`,
+    mapeando as colunas conforme página ímpar (JAN..JUN) ou par (JUL..DEZ).
+    Retorna a quantidade de linhas copiadas.
+    """
+    start_idx, end_idx = limites
+    # A primeira linha do trecho é o cabeçalho; as demais, os registros
+    cabecalho = df_tab.iloc[start_idx].tolist()
+    corpo = df_tab.iloc[start_idx + 1:end_idx].to_numpy(dtype=object)
+    num_linhas = corpo.shape[0]
+    fim = pos + num_linhas
+
+    # Páginas ímpares – colunas de JAN a JUN; páginas pares – colunas de JUL a DEZ
+    meses_pagina = MESES_IMPAR if pagina_atual % 2 != 0 else MESES_PAR
+    preenchidas = set()
+    for idx_col, rotulo in enumerate(cabecalho):
+        destino = _coluna_do_rotulo(rotulo, meses_pagina)
+        if destino is not None and destino not in preenchidas:
+            dados[destino][pos:fim] = corpo[:, idx_col]
+            preenchidas.add(destino)
+
+    dados["PÁGINA"][pos:fim] = pagina_atual
+    dados["ANO"][pos:fim] = anos_referencia.get(pagina_atual, "")
+    return num_linhas
+
+def normalizar_tabela(df_tab, pagina_atual, anos_referencia):
+    """
+    Recorta a tabela de uma página entre as linhas 'TIPO' e 'TOTAL BRUTO', mapeia as
+    colunas conforme página ímpar (JAN..JUN) ou par (JUL..DEZ) e acrescenta PÁGINA e ANO.
+    Retorna o DataFrame no formato COLUNAS_FINAIS, ou None se o bloco não existir.
+    """
+    limites = _limites_bloco(df_tab)
+    if limites is None:
+        return None
+    dados = _alocar_colunas(limites[1] - limites[0] - 1)
+    _preencher_colunas(dados, 0, df_tab, limites, pagina_atual, anos_referencia)
+    return pd.DataFrame(dados, columns=COLUNAS_FINAIS)
+
+def extrair_tabelas(documento, anos_referencia, levantar_erros=False):
     """
-    Extrai tabelas de cada página usando Camelot (flavor 'lattice'),
+    Usa as tabelas de cada página detectadas pelo Camelot (flavor 'lattice'),
     reorganiza as colunas, e identifica colunas de acordo com página ímpar/par.
+    As linhas de todas as tabelas são copiadas uma única vez para colunas pré-alocadas.
+    Com levantar_erros=True (uso fora do Streamlit), as falhas viram ErroExtracao.
     """
-    import camelot
     try:
-        tables = camelot.read_pdf(pdf_path, pages="all", flavor="lattice")
-        if not tables.n:
+        tabelas = _como_documento(documento).tabelas
+        if not tabelas:
+            if levantar_erros:
+                raise ErroExtracao("Nenhuma tabela detectada no PDF.")
             st.error("Nenhuma tabela detectada no PDF.")
             return None
 
-        colunas_finais = [
-            "PÁGINA", "TIPO", "DISCRIMINAÇÃO",
-            "JAN", "FEV", "MAR", "ABR", "MAI", "JUN",
-            "JUL", "AGO", "SET", "OUT", "NOV", "DEZ",
-            "ANO"
-        ]
-        df_final = pd.DataFrame(columns=colunas_finais)
-
-        for table in tables:
-            df_tab = table.df.copy()
-            pagina_atual = int(table.page)
-
-            # Localiza indices de início e fim (com base em 'TIPO' e 'TOTAL BRUTO')
-            start_idx_list = df_tab.index[df_tab.apply(
-                lambda row: any("TIPO" in str(cell).upper() for cell in row), axis=1
-            )].tolist()
-            end_idx_list = df_tab.index[df_tab.apply(
-                lambda row: any("TOTAL BRUTO" in str(cell).upper() for cell in row), axis=1
-            )].tolist()
-
-            if not start_idx_list or not end_idx_list:
-                continue
-            start_idx = start_idx_list[0]
-            end_idx = end_idx_list[0]
-            if end_idx <= start_idx:
-                continue
+        # 1ª passada: localiza os blocos; 2ª: copia as linhas para colunas pré-alocadas
+        recortes = []
+        for pagina_atual, df_table in tabelas:
+            limites = _limites_bloco(df_table)
+            if limites is not None and limites[1] - limites[0] > 1:
+                recortes.append((pagina_atual, df_table, limites))
+        if not recortes:
+            return None
 
-            # Recorta o trecho da tabela
-            df_slice = df_tab.iloc[start_idx:end_idx].copy()
-            df_slice.columns = df_slice.iloc[0].values  # Usar a primeira linha como cabeçalho
-            df_slice = df_slice[1:]  # Remove a linha de cabeçalho duplicada
-            df_slice.reset_index(drop=True, inplace=True)
-
-            # Ajusta colunas conforme página ímpar ou par
-            if pagina_atual % 2 != 0:
-                # Páginas ímpares – colunas de JAN a JUN
-                colunas_impar = ["TIPO", "DISCRIMINAÇÃO", "JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]
-                map_rename = {}
-                for c in df_slice.columns:
-                    c_up = c.upper().strip()
-                    if "TIPO" in c_up:
-                        map_rename[c] = "TIPO"
-                    elif "DISCRIMIN" in c_up:
-                        map_rename[c] = "DISCRIMINAÇÃO"
-                    elif "JAN" in c_up:
-                        map_rename[c] = "JAN"
-                    elif "FEV" in c_up:
-                        map_rename[c] = "FEV"
-                    elif "MAR" in c_up:
-                        map_rename[c] = "MAR"
-                    elif "ABR" in c_up:
-                        map_rename[c] = "ABR"
-                    elif "MAI" in c_up:
-                        map_rename[c] = "MAI"
-                    elif "JUN" in c_up:
-                        map_rename[c] = "JUN"
-                df_slice.rename(columns=map_rename, inplace=True)
-                for col in colunas_impar:
-                    if col not in df_slice.columns:
-                        df_slice[col] = None
-                for mes in ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]:
-                    df_slice[mes] = None
-            else:
-                # Páginas pares – colunas de JUL a DEZ
-                colunas_par = ["TIPO", "DISCRIMINAÇÃO", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
-                map_rename = {}
-                for c in df_slice.columns:
-                    c_up = c.upper().strip()
-                    if "TIPO" in c_up:
-                        map_rename[c] = "TIPO"
-                    elif "DISCRIMIN" in c_up:
-                        map_rename[c] = "DISCRIMINAÇÃO"
-                    elif "JUL" in c_up:
-                        map_rename[c] = "JUL"
-                    elif "AGO" in c_up:
-                        map_rename[c] = "AGO"
-                    elif "SET" in c_up:
-                        map_rename[c] = "SET"
-                    elif "OUT" in c_up:
-                        map_rename[c] = "OUT"
-                    elif "NOV" in c_up:
-                        map_rename[c] = "NOV"
-                    elif "DEZ" in c_up:
-                        map_rename[c] = "DEZ"
-                df_slice.rename(columns=map_rename, inplace=True)
-                for col in colunas_par:
-                    if col not in df_slice.columns:
-                        df_slice[col] = None
-                for mes in ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]:
-                    df_slice[mes] = None
-
-            df_slice["PÁGINA"] = pagina_atual
-            df_slice["ANO"] = anos_referencia.get(pagina_atual, "")
-            df_slice = df_slice[
-                ["PÁGINA", "TIPO", "DISCRIMINAÇÃO",
-                 "JAN", "FEV", "MAR", "ABR", "MAI", "JUN",
-                 "JUL", "AGO", "SET", "OUT", "NOV", "DEZ", "ANO"]
-            ]
-            df_final = pd.concat([df_final, df_slice], ignore_index=True)
-
-        return df_final if not df_final.empty else None
+        dados = _alocar_colunas(sum(fim - ini - 1 for _, _, (ini, fim) in recortes))
+        pos = 0
+        for pagina_atual, df_table, limites in recortes:
+            pos += _preencher_colunas(dados, pos, df_table, limites, pagina_atual, anos_referencia)
+        # copy=False: as colunas pré-alocadas são usadas diretamente, sem nova cópia
+        return pd.DataFrame(dados, columns=COLUNAS_FINAIS, copy=False)
     except Exception as e:
+        if levantar_erros:
+            if isinstance(e, ErroExtracao):
+                raise
+            raise ErroExtracao(f"Erro ao extrair tabelas: {e}") from e
         st.error(f"Erro ao extrair tabelas: {e}")
         return None
 
+def extrair_tabelas_por_pagina(documento, termo_referencia="ANO REFERÊNCIA"):
+    """
+    Versão progressiva de extrair_celulas_interesse + extrair_tabelas: gera, para cada
+    tabela assim que é extraída, (página, fatia normalizada ou None, mapa PÁGINA -> ANO
+    até o momento). O ANO de cada página vem da própria página, logo a fatia já sai
+    completa. Concatenadas e ordenadas por PÁGINA (sort estável), as fatias formam o
+    mesmo DataFrame de extrair_tabelas.
+    """
+    documento = _como_documento(documento)
+    dict_anos = {}
+    for pagina_atual, df_table in documento.iterar_tabelas():
+        if pagina_atual not in dict_anos:
+            if pagina_atual in documento.paginas_camada_texto:
+                celulas = [_celula_ano_por_linhas(
+                    documento.palavras_paginas[pagina_atual - 1], termo_referencia
+                )]
+            else:
+                celulas = _celulas_com_termo(df_table, termo_referencia)
+            celulas = [c for c in celulas if c]
+            if celulas:
+                dict_anos[pagina_atual] = extrair_ultimos_quatro_digitos(celulas[0])
+        df_fatia = normalizar_tabela(df_table, pagina_atual, dict_anos)
+        if df_fatia is not None and df_fatia.empty:
+            df_fatia = None
+        yield pagina_atual, df_fatia, dict_anos
+
+def juntar_fatias(fatias):
+    """Concatena as fatias por página (uma única vez) na ordem de extrair_tabelas."""
+    if not fatias:
+        return None
+    df = pd.concat(fatias, ignore_index=True)
+    return df.sort_values("PÁGINA", kind="stable", ignore_index=True)
+
+###############################################################################
+# MESCLAR FICHAS DO MESMO SERVIDOR (VÁRIOS ARQUIVOS)
+###############################################################################
+def chave_matricula(matricula):
+    """Chave de agrupamento das fichas de um servidor: os dígitos da matrícula ("N/D" se ausente)."""
+    digitos = re.sub(r"\D", "", str(matricula or ""))
+    return digitos or "N/D"
+
+def chave_conjunto(documentos):
+    """
+    Chave de um conjunto de fichas: a chave de extração (uma ficha) ou o hash das
+    chaves ordenadas. Com outro backend ou OCR, o consolidado (e a chave) mudam.
+    """
+    hashes = sorted(documento.chave_extracao for documento in documentos)
+    return hashes[0] if len(hashes) == 1 else hash_bytes("".join(hashes).encode())
+
+def _ano_inicial(dict_anos):
+    anos = [int(a) for a in dict_anos.values() if str(a).isdigit()]
+    return min(anos) if anos else 9999
+
+def mesclar_consolidados(partes):
+    """
+    Une os consolidados de várias fichas do mesmo servidor em um só, como se fossem
+    um único PDF. `partes` é uma lista de (dict_anos, df_consolidado) por arquivo.
+
+    As fichas são ordenadas pelo ano inicial e as páginas de cada uma são deslocadas
+    pelo total (arredondado para par) das anteriores, preservando a paridade que
+    define os meses (JAN..JUN / JUL..DEZ). Células repetidas em fichas que cobrem o
+    mesmo período são deduplicadas: cada linha é identificada por ANO, semestre,
+    TIPO, DISCRIMINAÇÃO e ocorrência; vale o primeiro valor não vazio de cada mês,
+    e as linhas de um mesmo ano/semestre ficam na página da primeira ficha que o
+    contém (depois, as páginas são renumeradas sem lacunas).
+    Retorna (dict_anos, df_consolidado), já com o TIPO completo.
+    """
+    partes = [(d, df) for d, df in partes if df is not None and not df.empty]
+    if not partes:
+        return {}, None
+    if len(partes) == 1:
+        dict_anos, df = partes[0]
+        return dict_anos, preparar_consolidado(df.copy(), dict_anos)
+
+    partes = sorted(partes, key=lambda parte: _ano_inicial(parte[0]))
+    frames = []
+    deslocamento = 0
+    for arquivo, (dict_anos, df) in enumerate(partes):
+        df = preparar_consolidado(df.copy(), dict_anos)
+        df["PÁGINA"] += deslocamento
+        df["_ARQUIVO"] = arquivo
+        frames.append(df)
+        ultima = int(df["PÁGINA"].max()) - deslocamento
+        deslocamento += ultima + ultima % 2
+    df = pd.concat(frames, ignore_index=True)
+
+    meses = MESES_IMPAR + MESES_PAR
+    impar = (df["PÁGINA"] % 2 == 1).to_numpy()
+    ano = df["ANO"].fillna("").astype(str)
+    # Páginas sem ANO não são comparáveis entre fichas: ficam em um período próprio
+    periodo = ano.where(ano != "", "P" + df["PÁGINA"].astype(str)) + np.where(impar, "/1", "/2")
+    ocorrencia = df.groupby(["_ARQUIVO", "PÁGINA", "TIPO", "DISCRIMINAÇÃO"], sort=False, dropna=False).cumcount()
+    chave = [periodo, df["TIPO"].fillna(""), df["DISCRIMINAÇÃO"].fillna(""), ocorrencia]
+
+    valores = df[meses].replace("", None)
+    unicos = valores.groupby(chave, sort=False).first()
+    primeira = df.groupby(chave, sort=False)[["TIPO", "DISCRIMINAÇÃO", "ANO"]].first()
+    pagina_periodo = df.groupby(periodo, sort=False)["PÁGINA"].first()
+
+    resultado = primeira.reset_index(drop=True)
+    periodo_linha = unicos.index.get_level_values(0)
+    resultado["PÁGINA"] = pagina_periodo.reindex(periodo_linha).to_numpy()
+    impar = (resultado["PÁGINA"] % 2 == 1).to_numpy()
+    # Meses do semestre da página vazios voltam a "", os do outro semestre a None
+    for mes in meses:
+        coluna = unicos[mes].to_numpy(dtype=object)
+        do_semestre = impar if mes in MESES_IMPAR else ~impar
+        vazio = pd.isna(coluna)
+        coluna[vazio & do_semestre] = ""
+        coluna[vazio & ~do_semestre] = None
+        resultado[mes] = coluna
+    resultado = resultado[COLUNAS_FINAIS].sort_values("PÁGINA", kind="stable", ignore_index=True)
+
+    # Renumera as páginas sem lacunas (as páginas repetidas saíram), mantendo a paridade
+    renumeracao = {}
+    nova = 0
+    for pagina in resultado["PÁGINA"].unique():
+        nova += 1 if (nova + 1) % 2 == pagina % 2 else 2
+        renumeracao[pagina] = nova
+    resultado["PÁGINA"] = resultado["PÁGINA"].map(renumeracao)
+
+    dict_anos = {
+        int(pagina): ano_pagina
+        for pagina, ano_pagina in zip(resultado["PÁGINA"], resultado["ANO"])
+        if ano_pagina not in ("", None)
+    }
+    return dict_anos, resultado
+
 ###############################################################################
 # SALVAR DATAFRAME CONSOLIDADO EM PDF – INCLUINDO CABEÇALHO "Extrato Financeiro Único"
 ###############################################################################
-def salvar_em_pdf(df, nome_pdf):
+ALTURA_LINHA_PDF = 10
+VERSAO_PDF_CONSOLIDADO = 1  # muda quando o layout muda (invalida os PDFs em cache)
+
+def _largura_coluna_pdf(col):
+    """Largura (mm) da coluna no PDF do consolidado."""
+    col = col.upper()
+    if col == "DISCRIMINAÇÃO":
+        return 70
+    if col in ("PÁGINA", "ANO"):
+        return 15
+    if col == "TIPO":
+        return 30
+    return 20
+
+class _EscritorTabelaPdf:
+    """
+    Escreve linhas de tabela (texto centralizado e bordas) diretamente no FPDF, sem
+    pdf.cell por célula: cada valor é um pdf.text e a grade de cada bloco de linhas
+    contíguas na mesma folha é desenhada de uma vez (uma linha por borda). A
+    aparência é a mesma de pdf.cell(..., border=1, align='C').
+    """
+
+    def __init__(self, pdf, larguras, altura=ALTURA_LINHA_PDF):
+        self.pdf = pdf
+        self.larguras = larguras
+        self.altura = altura
+        self.x_colunas = [pdf.l_margin]
+        for largura in larguras:
+            self.x_colunas.append(self.x_colunas[-1] + largura)
+        self._larguras_texto = {}
+        self._y_bloco = None
+        self._linhas_bloco = 0
+
+    def _largura_texto(self, texto):
+        largura = self._larguras_texto.get(texto)
+        if largura is None:
+            # Fonte padrão (core): soma direta da tabela de larguras dos caracteres
+            try:
+                cw = self.pdf.current_font.cw
+                largura = sum(cw[c] for c in texto) * self.pdf.font_size / 1000
+            except (AttributeError, KeyError, TypeError):
+                largura = self.pdf.get_string_width(texto)
+            self._larguras_texto[texto] = largura
+        return largura
+
+    def _fechar_bloco(self):
+        """Desenha a grade (bordas) das linhas escritas desde o início do bloco."""
+        if not self._linhas_bloco:
+            return
+        pdf = self.pdf
+        x_ini, x_fim = self.x_colunas[0], self.x_colunas[-1]
+        y_fim = self._y_bloco + self._linhas_bloco * self.altura
+        for i in range(self._linhas_bloco + 1):
+            y = self._y_bloco + i * self.altura
+            pdf.line(x_ini, y, x_fim, y)
+        for x in self.x_colunas:
+            pdf.line(x, self._y_bloco, x, y_fim)
+        self._y_bloco = None
+        self._linhas_bloco = 0
+
+    def escrever(self, valores):
+        """Escreve uma linha (sequência de textos, um por coluna) e avança o cursor."""
+        pdf = self.pdf
+        if pdf.will_page_break(self.altura):
+            self._fechar_bloco()
+            pdf.add_page(same=True)
+        if self._y_bloco is None:
+            self._y_bloco = pdf.y
+        y_texto = pdf.y + 0.5 * self.altura + 0.3 * pdf.font_size
+        for x, largura, texto in zip(self.x_colunas, self.larguras, valores):
+            if texto:
+                pdf.text(x + (largura - self._largura_texto(texto)) / 2, y_texto, texto)
+        self._linhas_bloco += 1
+        pdf.set_xy(pdf.l_margin, pdf.y + self.altura)
+
+    def concluir(self):
+        self._fechar_bloco()
+
+def gerar_pdf_consolidado(df) -> bytes:
     """
-    Gera um PDF com o cabeçalho 'Extrato Financeiro Único' (usando FPDF).
+    Gera os bytes do PDF com o cabeçalho 'Extrato Financeiro Único' (usando FPDF).
     Cada página do PDF corresponde à página do DF. Ajusta colunas conforme ímpar/par.
+    As linhas são agrupadas por página uma única vez e o texto de todas as células é
+    convertido de uma vez, logo o custo cresce linearmente com o número de linhas.
     """
     from fpdf import FPDF
 
@@ -354,94 +1154,162 @@ def salvar_em_pdf(df, nome_pdf):
     pdf.add_page()
     pdf.set_font("Arial", size=10)
 
-    paginas_unicas = sorted(df["PÁGINA"].unique())
-    for pagina in paginas_unicas:
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, f"Página {pagina}", border=False, ln=True, align='C')
-        pdf.ln(5)
-        df_pag = df[df["PÁGINA"] == pagina].copy()
-
-        # Remoção das colunas não pertinentes para cada página ímpar/par
-        if pagina % 2 != 0:
-            for col_drop in ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]:
-                if col_drop in df_pag.columns:
-                    df_pag.drop(columns=col_drop, inplace=True)
-        else:
-            for col_drop in ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]:
-                if col_drop in df_pag.columns:
-                    df_pag.drop(columns=col_drop, inplace=True)
-
-        colunas_cabecalho = list(df_pag.columns)
-        larguras = []
-        for col in colunas_cabecalho:
-            if col.upper() == "DISCRIMINAÇÃO":
-                larguras.append(70)
-            elif col.upper() == "PÁGINA":
-                larguras.append(15)
-            elif col.upper() in ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN",
-                                 "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]:
-                larguras.append(20)
-            elif col.upper() == "TIPO":
-                larguras.append(30)
-            elif col.upper() == "ANO":
-                larguras.append(15)
-            else:
-                larguras.append(20)
-
-        pdf.set_font("Arial", size=10)
-        # Cabeçalho da tabela
-        for i, col in enumerate(colunas_cabecalho):
-            pdf.cell(larguras[i], 10, col, border=1, align='C')
-        pdf.ln()
+    if not df.empty:
+        # Texto de todas as células (nulos -> ""), com as linhas ordenadas por página
+        paginas = df["PÁGINA"].to_numpy()
+        ordem = np.argsort(paginas, kind="stable")
+        textos = df.astype(object).where(df.notna(), "").astype(str).to_numpy()[ordem]
+        paginas_unicas, inicios = np.unique(paginas[ordem], return_index=True)
+        fins = list(inicios[1:]) + [len(ordem)]
+
+        # Colunas de cada paridade: páginas ímpares sem JUL..DEZ, pares sem JAN..JUN
+        colunas = list(df.columns)
+        indices_paridade = {
+            paridade: [i for i, col in enumerate(colunas) if col not in (MESES_PAR if paridade else MESES_IMPAR)]
+            for paridade in (1, 0)
+        }
+
+        for pagina, inicio, fim in zip(paginas_unicas, inicios, fins):
+            pdf.set_font("Arial", 'B', 12)
+            pdf.cell(0, 10, f"Página {pagina}", border=False, ln=True, align='C')
+            pdf.ln(5)
+
+            indices = indices_paridade[int(pagina) % 2]
+            colunas_cabecalho = [colunas[i] for i in indices]
+            pdf.set_font("Arial", size=10)
+            escritor = _EscritorTabelaPdf(pdf, [_largura_coluna_pdf(col) for col in colunas_cabecalho])
+            # Cabeçalho da tabela
+            escritor.escrever(colunas_cabecalho)
+            # Linhas
+            for linha in textos[inicio:fim][:, indices].tolist():
+                escritor.escrever(linha)
+            escritor.concluir()
+            pdf.ln(5)
+
+    return bytes(pdf.output())
 
-        # Linhas
-        for _, row in df_pag.iterrows():
-            for i, col in enumerate(colunas_cabecalho):
-                valor = str(row[col]) if pd.notnull(row[col]) else ""
-                pdf.cell(larguras[i], 10, valor, border=1, align='C')
-            pdf.ln()
-        pdf.ln(5)
+def salvar_em_pdf(df, nome_pdf):
+    """
+    Gera um PDF com o cabeçalho 'Extrato Financeiro Único' (usando FPDF) em nome_pdf.
+    Cada página do PDF corresponde à página do DF. Ajusta colunas conforme ímpar/par.
+    """
+    with open(nome_pdf, "wb") as f:
+        f.write(gerar_pdf_consolidado(df))
 
-    pdf.output(nome_pdf)
+def obter_pdf_consolidado(df, chave=None):
+    """
+    Retorna os bytes do PDF do consolidado, gerando-o apenas se ainda não estiver no
+    cache em disco para a chave (chave das fichas).
+    """
+    if chave is None:
+        return gerar_pdf_consolidado(df)
+    cache = obter_cache()
+    sufixo = f".extrato_v{VERSAO_PDF_CONSOLIDADO}.pdf"
+    dados = cache.obter_arquivo(chave, sufixo)
+    if dados is None:
+        dados = gerar_pdf_consolidado(df)
+        try:
+            cache.salvar_arquivo(chave, sufixo, dados)
+        except OSError:
+            pass
+    return dados
 
 ###############################################################################
 # FUNÇÕES PARA ANÁLISE DE DESCONTOS E GERAÇÃO DE RELATÓRIOS
 ###############################################################################
-def cruzar_descontos_com_rubricas(df_descontos, glossary, threshold=85):
+def cruzar_descontos_com_rubricas(df_descontos, glossary, threshold=85, pontuacoes=None):
     """
     Faz um fuzzy matching entre as discriminações de df_descontos e o glossary,
     retornando somente as linhas que atingirem a pontuação (threshold) definida.
+    `glossary` pode ser uma lista de termos ou um ClassificadorGlossario; neste caso,
+    as linhas retornadas recebem a coluna CATEGORIA (rubrica ou tarifa/associação).
+    `pontuacoes` (scores já calculados) pode ser reaproveitado entre chamadas; assim,
+    mudar o threshold é apenas uma máscara sobre os scores.
     """
-    if df_descontos.empty or not glossary:
+    if df_descontos.empty or not len(glossary):
         return pd.DataFrame()
-    unique_desc = df_descontos["DISCRIMINAÇÃO"].unique()
-    mapping = {}
-    for desc in unique_desc:
-        result = process.extractOne(desc, glossary, scorer=fuzz.ratio)
-        score = result[1] if result else 0
-        mapping[desc] = (score >= threshold)
-    return df_descontos[df_descontos["DISCRIMINAÇÃO"].map(mapping)]
+    if pontuacoes is None:
+        pontuacoes = pontuar_glossario(df_descontos["DISCRIMINAÇÃO"], glossary)
+    scores = df_descontos["DISCRIMINAÇÃO"].map(pontuacoes["SCORE"]).fillna(0)
+    df_resultado = df_descontos[scores >= threshold]
+    if "CATEGORIA" in pontuacoes.columns:
+        df_resultado = df_resultado.assign(
+            CATEGORIA=df_resultado["DISCRIMINAÇÃO"].map(pontuacoes["CATEGORIA"])
+        )
+    return df_resultado
+
+def pontuar_glossario(descricoes, glossary):
+    """Scores das descrições contra uma lista de termos ou um ClassificadorGlossario."""
+    if isinstance(glossary, ClassificadorGlossario):
+        return glossary.pontuar(descricoes)
+    return pontuar_descricoes(descricoes, glossary)
 
 def formatar_valor_brl(us_string: str) -> str:
     """
-    Converte string no formato US (ex.: '123,456.78' ou '1234.56') para BR '123.456,78'.
-    Mantém somente um ponto para separar milhar e a vírgula antes dos centavos.
+    Converte um valor (ex.: '123,456.78', '1234.56' ou '1.234,56') para BR '123.456,78'.
+    Textos que não são valores são devolvidos sem alteração.
     """
-    try:
-        temp = us_string.replace(",", "")
-        if temp.count('.') > 1:
-            parts = temp.split('.')
-            temp = parts[0] + '.' + ''.join(parts[1:])
-        valor_float = float(temp)
-        return f"{valor_float:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except:
-        return us_string
+    centavos = centavos_de_texto(us_string)
+    return us_string if centavos is None else texto_brl(centavos)
+
+COLUNAS_VALOR = ("DESCONTOS", "VALOR (R$)")
+
+LINHAS_ESPECIAIS = [
+    "A = Valor Total (R$)",
+    "B = Valor Recebido - Autor (a)",
+    "Indébito (A-B)",
+    "Indébito em dobro (R$)"
+]
+
+# Propriedades dos runs (tamanho em meios-pontos): linhas comuns 9pt; especiais 14pt, negrito, vermelho
+_RPR_DOCX_COMUM = '<w:rPr><w:sz w:val="18"/></w:rPr>'
+_RPR_DOCX_ESPECIAL = '<w:rPr><w:b/><w:color w:val="FF0000"/><w:sz w:val="28"/></w:rPr>'
+
+def textos_para_relatorio(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Texto de cada célula como aparece nos relatórios: nulos viram "" e as colunas de
+    valor (COLUNAS_VALOR) saem no formato brasileiro ("1.234,56"), convertidas de
+    uma vez; textos que não são valores ficam como estão.
+    """
+    textos = df.astype(object).where(df.notna(), "").astype(str)
+    for col in df.columns:
+        if str(col).upper() in COLUNAS_VALOR:
+            centavos = para_centavos(df[col])
+            textos[col] = formatar_brl(centavos).where(centavos.notna(), textos[col])
+    return textos
+
+def _linhas_docx_xml(textos, especiais, larguras_tc):
+    """XML (w:tr) de todas as linhas da tabela, montado de uma vez."""
+    partes = []
+    for linha, especial in zip(textos, especiais):
+        rpr = _RPR_DOCX_ESPECIAL if especial else _RPR_DOCX_COMUM
+        partes.append("<w:tr>")
+        for texto, largura in zip(linha, larguras_tc):
+            run = (
+                f'<w:r>{rpr}<w:t xml:space="preserve">{escape_xml(texto)}</w:t></w:r>'
+                if texto else ""
+            )
+            partes.append(
+                f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{largura}"/></w:tcPr>'
+                f'<w:p><w:pPr><w:jc w:val="center"/></w:pPr>{run}</w:p></w:tc>'
+            )
+        partes.append("</w:tr>")
+    return "".join(partes)
 
 def df_to_docx_bytes(df: pd.DataFrame, titulo: str) -> bytes:
     """
     Converte um DataFrame em um arquivo DOCX (paisagem), retorna os bytes gerados.
     As linhas especiais (A, B, Indébito, Indébito em dobro) terão toda a linha em vermelho.
+    Os valores já saem no formato brasileiro e as linhas da tabela são geradas
+    diretamente em XML, em um único passo, sem arquivos temporários.
     """
+    from docx import Document
+    from docx.shared import Inches
+    from docx.enum.section import WD_ORIENT
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
+
     document = Document()
     for section in document.sections:
         section.orientation = WD_ORIENT.LANDSCAPE
@@ -457,14 +1325,6 @@ def df_to_docx_bytes(df: pd.DataFrame, titulo: str) -> bytes:
     if "DESCRIÇÃO" in df.columns:
         df = df.drop(columns=["DESCRIÇÃO"])
 
-    # Linhas especiais
-    linhas_especiais = [
-        "A = Valor Total (R$)",
-        "B = Valor Recebido - Autor (a)",
-        "Indébito (A-B)",
-        "Indébito em dobro (R$)"
-    ]
-
     if df.empty:
         p = document.add_paragraph("DataFrame vazio - nenhum dado para exibir.")
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
@@ -479,28 +1339,15 @@ def df_to_docx_bytes(df: pd.DataFrame, titulo: str) -> bytes:
                 for run in paragraph.runs:
                     run.font.bold = True
 
-        # Linhas do DataFrame
-        for _, row in df.iterrows():
-            row_cells = table.add_row().cells
-            eh_linha_especial = False
-            if "DISCRIMINAÇÃO" in df.columns:
-                if row["DISCRIMINAÇÃO"] in linhas_especiais:
-                    eh_linha_especial = True
-
-            for i, col_name in enumerate(colunas):
-                val = str(row[col_name]) if pd.notnull(row[col_name]) else ""
-                paragraph = row_cells[i].paragraphs[0]
-                run = paragraph.add_run(val)
-
-                # Se for linha especial, deixar texto e valores em vermelho
-                if eh_linha_especial:
-                    run.font.color.rgb = RGBColor(0xFF, 0x00, 0x00)
-                    run.font.size = Pt(14)
-                    run.bold = True
-                else:
-                    run.font.size = Pt(9)
-
-                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        # Linhas do DataFrame: texto formatado em lote e XML de todas as linhas de uma vez
+        if "DISCRIMINAÇÃO" in df.columns:
+            especiais = df["DISCRIMINAÇÃO"].isin(LINHAS_ESPECIAIS).tolist()
+        else:
+            especiais = [False] * len(df)
+        larguras_tc = [cell.width.twips if cell.width is not None else 0 for cell in hdr_cells]
+        xml_linhas = _linhas_docx_xml(textos_para_relatorio(df).to_numpy().tolist(), especiais, larguras_tc)
+        tabela_xml = parse_xml(f"<w:tbl {nsdecls('w')}>{xml_linhas}</w:tbl>")
+        table._tbl.extend(list(tabela_xml))
 
         # Ajuste de largura
         width_map = {}
@@ -518,78 +1365,47 @@ def df_to_docx_bytes(df: pd.DataFrame, titulo: str) -> bytes:
     document.save(buf)
     return buf.getvalue()
 
-def ajustar_valores_docx(file_input_bytes: bytes) -> bytes:
-    """
-    Recebe bytes de um arquivo docx, faz a correção de valores no texto,
-    do formato '123,456.78' (US) para '123.456,78' (BR).
-    """
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp_in:
-        tmp_in.write(file_input_bytes)
-        tmp_in.flush()
-        input_path = tmp_in.name
-
-    output_path = input_path.replace(".docx", "_corrigido.docx")
-    doc = Document(input_path)
-    pattern = re.compile(r'([\d,]+\.\d{2})')
-
-    for para in doc.paragraphs:
-        found = pattern.findall(para.text)
-        if found:
-            for val_us in found:
-                val_br = formatar_valor_brl(val_us)
-                para.text = para.text.replace(val_us, val_br)
-
-    # Também corrigir tabelas
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                txt = cell.text
-                found = pattern.findall(txt)
-                if found:
-                    for val_us in found:
-                        val_br = formatar_valor_brl(val_us)
-                        cell.text = cell.text.replace(val_us, val_br)
-
-    doc.save(output_path)
-
-    with open(output_path, "rb") as f:
-        final_bytes = f.read()
-
-    os.remove(input_path)
-    os.remove(output_path)
-    return final_bytes
-
 def ajustar_datas(df):
     """
     Transforma colunas JAN..DEZ + ANO em linhas do tipo:
       DATAS (Ex.: "JAN/2021"), DISCRIMINAÇÃO, VALOR (R$).
+    A conversão é feita de uma vez sobre a matriz linhas x meses (ordem: linha,
+    depois mês); valores nulos, zerados ou não numéricos são descartados.
     """
     meses = ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
-    linhas_ajustadas = []
-    for idx, row in df.iterrows():
-        ano = row.get("ANO", "")
-        discriminacao = row.get("DISCRIMINAÇÃO", "")
-        for mes in meses:
-            valor = row.get(mes, None)
-            if pd.notnull(valor):
-                try:
-                    valor_float = float(str(valor).replace(",", "."))  # Ajusta para float
-                except:
-                    valor_float = 0
-                if valor_float != 0:
-                    data = f"{mes}/{ano}" if str(ano).isdigit() and len(str(ano)) == 4 else mes
-                    linhas_ajustadas.append({
-                        "DATAS": data,
-                        "DISCRIMINAÇÃO": discriminacao,
-                        "VALOR (R$)": valor_float
-                    })
-    df_ajustado = pd.DataFrame(linhas_ajustadas, columns=["DATAS", "DISCRIMINAÇÃO", "VALOR (R$)"])
-    return df_ajustado
+    colunas = ["DATAS", "DISCRIMINAÇÃO", "VALOR (R$)"]
+    if df.empty:
+        return pd.DataFrame(columns=colunas)
+
+    # Matriz linhas x meses -> vetor (linha a linha), convertida para centavos em um único passo
+    matriz = df.reindex(columns=meses).to_numpy(dtype=object)
+    centavos = para_centavos(pd.Series(matriz.ravel(), dtype=object))
+    mascara = (centavos.fillna(0) != 0).to_numpy(dtype=bool)
+    valores = centavos.to_numpy(dtype=np.float64, na_value=0) / 100
+
+    n = len(df)
+    idx_linha = np.repeat(np.arange(n), len(meses))[mascara]
+    idx_mes = np.tile(np.arange(len(meses)), n)[mascara]
+
+    # "MES/ANO" quando o ANO tem 4 dígitos; caso contrário, só o mês
+    anos = df["ANO"].astype(str) if "ANO" in df.columns else pd.Series("", index=df.index)
+    sufixo = np.where(anos.str.fullmatch(r"\d{4}"), "/" + anos, "").astype(object)
+    datas = np.array(meses, dtype=object)[idx_mes] + sufixo[idx_linha]
+
+    discriminacao = (
+        df["DISCRIMINAÇÃO"].to_numpy(dtype=object) if "DISCRIMINAÇÃO" in df.columns
+        else np.full(n, "", dtype=object)
+    )
+    return pd.DataFrame({
+        "DATAS": datas,
+        "DISCRIMINAÇÃO": discriminacao[idx_linha],
+        "VALOR (R$)": valores[mascara],
+    }, columns=colunas)
 
 ###############################################################################
 # FUNÇÃO PARA INSERIR AS 4 LINHAS (A, B, Indébito, e Indébito em dobro)
 ###############################################################################
-def inserir_totais_na_coluna(df, col_valor):
+def inserir_totais_na_coluna(df, col_valor, valor_recebido=None):
     """
     Insere 4 linhas no final do DF:
       A = Valor Total (R$)
@@ -597,7 +1413,8 @@ def inserir_totais_na_coluna(df, col_valor):
       Indébito (A-B)
       Indébito em dobro (R$)
 
-    O valor de B é obtido de st.session_state["valor_recebido"] (ou '0').
+    O valor de B é o parâmetro valor_recebido ou, se omitido,
+    st.session_state["valor_recebido"] (ou '0').
     O texto é injetado em "DISCRIMINAÇÃO".
     """
     if "DESCRIÇÃO" in df.columns:
@@ -606,34 +1423,20 @@ def inserir_totais_na_coluna(df, col_valor):
     if col_valor not in df.columns:
         return df
 
-    def _to_float(x):
-        try:
-            return float(str(x).replace(',', '.').strip())
-        except:
-            return 0.0
-
-    # Soma (A)
-    soma = df[col_valor].apply(_to_float).sum()
+    # Soma (A), em centavos
+    soma = int(para_centavos(df[col_valor]).sum())
     df_novo = df.copy()
 
-    # Recupera o valor B do estado
-    valor_b_str = get_state_value("valor_recebido") or "0"
-    try:
-        valor_b_num = float(str(valor_b_str).replace(',', '.').strip())
-    except:
-        valor_b_num = 0.0
+    # Recupera o valor B (parâmetro ou estado)
+    valor_b_str = str(valor_recebido) if valor_recebido is not None else (get_state_value("valor_recebido") or "0")
+    valor_b = centavos_digitados(valor_b_str) or 0
 
     # Calcula indebito e indebito em dobro
-    indebito = soma - valor_b_num
+    indebito = soma - valor_b
     indebito_dobro = 2 * indebito
 
-    def en_us_format(number: float) -> str:
-        return f"{number:,.2f}"
-
-    A_str = en_us_format(soma)
-    B_str = valor_b_str.strip()
-    indebito_str = en_us_format(indebito)
-    indebito_dobro_str = en_us_format(indebito_dobro)
+    # B entra já convertido (como A e o indébito): os relatórios não releem o texto digitado
+    A_str, B_str, indebito_str, indebito_dobro_str = formatar_us([soma, valor_b, indebito, indebito_dobro])
 
     # Inserir as linhas especiais na coluna "DISCRIMINAÇÃO"
     df_novo = pd.concat([
@@ -683,15 +1486,404 @@ def inserir_totais_na_coluna(df, col_valor):
 
     return df_novo
 
+###############################################################################
+# PDF DO RELATÓRIO FINAL DE DESCONTOS
+###############################################################################
+def gerar_pdf_descontos_finais(df_com_totais, titulo_final):
+    """
+    Gera o PDF (paisagem) do relatório final de descontos, com as linhas especiais
+    (A, B, Indébito, Indébito em dobro) destacadas em vermelho. Retorna os bytes do PDF.
+    """
+    from fpdf import FPDF
+
+    class PDFDescontosFinais(FPDF):
+        def header(self):
+            self.set_font("Arial", "B", 16)
+            self.cell(0, 10, titulo_final, border=False, ln=True, align='C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Página {self.page_no()}', border=False, ln=False, align='C')
+
+    pdf_doc = PDFDescontosFinais(orientation="L", format="A4")
+    pdf_doc.add_page()
+
+    # Remover "DESCRIÇÃO" se ainda existir
+    if "DESCRIÇÃO" in df_com_totais.columns:
+        df_com_totais = df_com_totais.drop(columns=["DESCRIÇÃO"])
+
+    colunas_final = df_com_totais.columns.tolist()
+    col_widths = []
+    for c in colunas_final:
+        if c.upper() == "DISCRIMINAÇÃO":
+            col_widths.append(150)
+        elif c.upper() == "DATAS":
+            col_widths.append(40)
+        else:
+            col_widths.append(40)
+
+    # Cabeçalho
+    pdf_doc.set_font("Arial", "B", 10)
+    for i, col in enumerate(colunas_final):
+        pdf_doc.cell(col_widths[i], 8, col, border=1, align='C')
+    pdf_doc.ln()
+
+    # Linhas especiais para destacar
+    linhas_especiais = [
+        "A = Valor Total (R$)",
+        "B = Valor Recebido - Autor (a)",
+        "Indébito (A-B)",
+        "Indébito em dobro (R$)"
+    ]
+
+    # Impressão das linhas do PDF
+    for _, row_ in df_com_totais.iterrows():
+        is_special_line = False
+        if row_["DISCRIMINAÇÃO"] in linhas_especiais:
+            is_special_line = True
+
+        for i, col in enumerate(colunas_final):
+            val = str(row_[col]) if pd.notnull(row_[col]) else ""
+
+            # Se for coluna de valores (DESCONTOS), converter para BR (inclusive as linhas de totais)
+            if col.upper() == "DESCONTOS" and not (val in linhas_especiais):
+                val = formatar_valor_brl(val)
+
+            # Configurar cores/fonte se for linha especial
+            if is_special_line:
+                pdf_doc.set_text_color(255, 0, 0)     # Vermelho
+                pdf_doc.set_font("Arial", "B", 12)    # Negrito, maior
+            else:
+                pdf_doc.set_text_color(0, 0, 0)
+                pdf_doc.set_font("Arial", "", 10)
+
+            pdf_doc.cell(col_widths[i], 8, val, border=1, align='C')
+        pdf_doc.ln()
+
+    # Gerado direto em memória (sem arquivo temporário)
+    return bytes(pdf_doc.output())
+
+###############################################################################
+# PIPELINE COMPLETO SEM INTERFACE (USADO PELO PROCESSAMENTO EM LOTE)
+###############################################################################
+def processar_ficha(documento, rubricas, threshold=85, valor_recebido="0", usar_cache=True, medicao=None):
+    """
+    Executa, sem Streamlit, o mesmo fluxo da aplicação para uma ficha:
+    nome/matrícula, anos de referência, tabelas consolidadas, filtro de descontos,
+    cruzamento com o glossário, datas ajustadas e linhas de totais.
+    `rubricas` é uma lista de termos ou um ClassificadorGlossario.
+    Todos os descontos que atingem o threshold são incluídos (sem seleção manual).
+    Cada etapa é medida em `medicao` (MedicaoDocumento; sem ela, os registros ficam
+    só em memória e são devolvidos em "medicao").
+    Falhas de extração levantam ErroExtracao.
+    Retorna um dicionário com os resultados intermediários e finais.
+    """
+    documento = _como_documento(documento)
+    if medicao is None:
+        medicao = MedicaoDocumento(documento.hash_sha256, origem="processar_ficha", caminho_log=False)
+    with medicao.etapa("extrair_nome_e_matricula"):
+        nome, matricula = extrair_nome_e_matricula(documento)
+    with medicao.etapa("extrair_nome_cliente"):
+        nome_servidor = extrair_nome_cliente(documento)
+    cpf = extrair_cpf(documento)
+
+    cache = obter_cache() if usar_cache else None
+    with medicao.etapa("cache_extracao"):
+        em_cache = cache.obter(documento.chave_extracao) if cache is not None else None
+    if em_cache is not None:
+        dict_anos, df_consolidado = em_cache
+    else:
+        with medicao.etapa("extrair_celulas_interesse") as registro:
+            df_ano_celulas = extrair_celulas_interesse(documento, levantar_erros=True)
+            _, dict_anos = montar_anos_referencia(df_ano_celulas)
+            registro["linhas"] = len(df_ano_celulas)
+        with medicao.etapa("extrair_tabelas") as registro:
+            df_consolidado = extrair_tabelas(documento, dict_anos, levantar_erros=True)
+            if df_consolidado is None or df_consolidado.empty:
+                raise ErroExtracao("Nenhuma linha entre 'TIPO' e 'TOTAL BRUTO' foi encontrada.")
+            registro["linhas"] = len(df_consolidado)
+        if cache is not None:
+            cache.salvar(documento.chave_extracao, dict_anos, df_consolidado)
+    with medicao.etapa("preparar_consolidado", linhas=len(df_consolidado)):
+        df_consolidado = preparar_consolidado(df_consolidado, dict_anos)
+
+    with medicao.etapa("filtrar_descontos") as registro:
+        df_descontos = filtrar_descontos(df_consolidado, incluir_cabecalho=False)
+        registro["linhas"] = len(df_descontos)
+    with medicao.etapa("cruzar_descontos_com_rubricas", linhas=len(df_descontos)):
+        df_gloss = cruzar_descontos_com_rubricas(df_descontos, rubricas, threshold)
+    with medicao.etapa("ajustar_datas", linhas=len(df_gloss)):
+        if df_gloss.empty:
+            df_final = pd.DataFrame(columns=["DATAS", "DISCRIMINAÇÃO", "DESCONTOS"])
+        else:
+            df_final = ajustar_datas(df_gloss).rename(columns={"VALOR (R$)": "DESCONTOS"})
+    with medicao.etapa("inserir_totais_na_coluna", linhas=len(df_final)):
+        df_com_totais = inserir_totais_na_coluna(df_final, "DESCONTOS", valor_recebido)
+
+    return {
+        "hash": documento.hash_sha256,
+        "nome": nome,
+        "matricula": matricula,
+        "nome_servidor": nome_servidor,
+        "cpf": cpf,
+        "anos_referencia": dict_anos,
+        "df_consolidado": df_consolidado,
+        "df_gloss": df_gloss,
+        "df_com_totais": df_com_totais,
+        "medicao": medicao,
+    }
+
+###############################################################################
+# EXTRAÇÃO EM SEGUNDO PLANO (FILA DE TAREFAS) E ACOMPANHAMENTO NA INTERFACE
+###############################################################################
+INTERVALO_CONSULTA_TAREFA = 0.5  # segundos entre as consultas da interface à tarefa
+
+def extrair_em_tarefa(tarefa, documento, medicao=None):
+    """
+    Executada pela fila de tarefas (fora da thread do Streamlit): extrai as tabelas
+    página a página, publicando cada fatia em `tarefa.parcial` e o progresso, e
+    verificando o cancelamento a cada tabela. Retorna (dict_anos, df_consolidado);
+    levanta ErroExtracao se o PDF não tiver tabelas. Se o OCR reconheceu alguma
+    página, a identificação refeita com esse texto vai em
+    `tarefa.metadados["identificacao"]`.
+    """
+    if medicao is None:
+        medicao = MedicaoDocumento(documento.hash_sha256, caminho_log=False)
+    if documento.ocr:
+        tarefa.atualizar(0.0, "Lendo o texto das páginas (OCR nas digitalizadas)")
+        documento.carregar_texto(tarefa.verificar_cancelamento)
+    # Só as páginas aprovadas na triagem são extraídas: são elas o total do progresso
+    num_paginas = len(documento.paginas_com_tabela())
+    fatias = []
+    paginas_lidas = set()
+    dict_anos = {}
+    # ANO REFERÊNCIA e tabelas são lidos juntos, página a página
+    with medicao.etapa("extrair_celulas_interesse+extrair_tabelas") as registro:
+        with closing(extrair_tabelas_por_pagina(documento)) as paginas:
+            for pagina, df_fatia, dict_anos in paginas:
+                tarefa.verificar_cancelamento()
+                paginas_lidas.add(pagina)
+                if df_fatia is not None:
+                    fatias.append(df_fatia)
+                    tarefa.parcial.append(df_fatia)
+                tarefa.atualizar(
+                    len(paginas_lidas) / max(num_paginas, 1),
+                    f"Extraindo tabelas: página {pagina} ({len(paginas_lidas)} de {num_paginas})",
+                )
+        df_consolidado = juntar_fatias(fatias)
+        registro["linhas"] = 0 if df_consolidado is None else len(df_consolidado)
+    if not documento.tabelas:
+        raise ErroExtracao("Nenhuma tabela detectada no PDF.")
+    if documento.paginas_ocr:
+        tarefa.metadados["identificacao"] = identificar_documento(documento)
+    return dict_anos, df_consolidado
+
+def documentos_da_sessao(pdfs_enviados, usar_ocr):
+    """
+    DocumentoFicha de cada PDF enviado, criados a cada execução sobre os bytes do
+    arquivo enviado (o texto só é lido se necessário). A sessão guarda apenas o hash
+    de cada arquivo (session_state["documentos_sessao"]), que não é recalculado.
+    Arquivos repetidos (mesma chave de extração) são ignorados. Retorna
+    {chave de extração: (nome do arquivo, documento)}.
+    """
+    anteriores = get_state_value("documentos_sessao") or {}
+    atuais = {}
+    documentos = {}
+    for pdf_enviado in pdfs_enviados:
+        dados = pdf_enviado.getvalue()
+        id_envio = getattr(pdf_enviado, "file_id", None) or hash_bytes(dados)
+        documento = DocumentoFicha(dados=dados, ocr=usar_ocr, hash_sha256=anteriores.get(id_envio))
+        atuais[id_envio] = documento.hash_sha256
+        documentos.setdefault(documento.chave_extracao, (pdf_enviado.name, documento))
+    set_state_value("documentos_sessao", atuais)
+    return documentos
+
+def identificar_documento(documento, sem_ocr=False, medicao=None):
+    """Nome e matrícula (primeira página), nome do servidor e CPF do documento, em um dict."""
+    with medicao.etapa("extrair_nome_e_matricula") if medicao else nullcontext():
+        nome_matricula = extrair_nome_e_matricula(documento, sem_ocr=sem_ocr)
+    with medicao.etapa("extrair_nome_cliente") if medicao else nullcontext():
+        nome_servidor = extrair_nome_cliente(documento, sem_ocr=sem_ocr)
+    return {
+        "nome_matricula": nome_matricula,
+        "nome_servidor": nome_servidor,
+        "cpf": extrair_cpf(documento, sem_ocr=sem_ocr),
+    }
+
+def identificar_fichas(documentos, medicao):
+    """
+    Identificação (identificar_documento) de cada ficha ({chave de extração: dict}),
+    sem esperar pelo OCR. Calculada uma vez por documento e guardada em
+    session_state["identificacoes"]; a extração substitui a de fichas digitalizadas
+    pela feita com o texto do OCR (atualizar_identificacao).
+    """
+    anteriores = get_state_value("identificacoes") or {}
+    resultado = {}
+    for _, documento in documentos.values():
+        chave = documento.chave_extracao
+        identificacao = anteriores.get(chave)
+        if identificacao is None:
+            identificacao = identificar_documento(documento, sem_ocr=True, medicao=medicao)
+        resultado[chave] = identificacao
+    set_state_value("identificacoes", resultado)
+    return resultado
+
+def atualizar_identificacao(tarefa):
+    """
+    Guarda na sessão a identificação refeita pela tarefa com o texto do OCR, se
+    houver; retorna True se ela mudou.
+    """
+    identificacao = tarefa.metadados.get("identificacao")
+    identificacoes = dict(get_state_value("identificacoes") or {})
+    if identificacao is None or identificacoes.get(tarefa.chave) == identificacao:
+        return False
+    identificacoes[tarefa.chave] = identificacao
+    set_state_value("identificacoes", identificacoes)
+    return True
+
+def id_sessao():
+    """Id desta sessão, usado para inscrevê-la nas tarefas da fila (criado na primeira chamada)."""
+    identificador = get_state_value("id_sessao")
+    if identificador is None:
+        identificador = uuid.uuid4().hex[:12]
+        set_state_value("id_sessao", identificador)
+    return identificador
+
+def obter_tarefa_extracao(documento, medicao, descricao="", reiniciar=False):
+    """
+    Tarefa de extração do documento nesta sessão: reaproveita a já registrada para a
+    mesma chave de extração (a fila também reaproveita a de outra sessão em andamento)
+    ou submete uma nova. Os ids ficam em session_state["tarefas_sessao"] (chave -> id).
+    """
+    fila = obter_fila()
+    tarefas_sessao = dict(get_state_value("tarefas_sessao") or {})
+    chave = documento.chave_extracao
+    if reiniciar:
+        set_state_value("extracoes_canceladas", (get_state_value("extracoes_canceladas") or set()) - {chave})
+    tarefa = None if reiniciar else fila.obter(tarefas_sessao.get(chave))
+    if tarefa is None:
+        tarefa = fila.submeter(
+            extrair_em_tarefa, documento, medicao,
+            descricao=descricao, chave=chave, assinante=id_sessao(),
+        )
+        tarefas_sessao[chave] = tarefa.id
+        set_state_value("tarefas_sessao", tarefas_sessao)
+    return tarefa
+
+def liberar_tarefa_extracao(tarefa):
+    """Retira a tarefa desta sessão depois que o resultado foi guardado no cache."""
+    obter_fila().liberar(tarefa.id, assinante=id_sessao())
+    tarefas_sessao = dict(get_state_value("tarefas_sessao") or {})
+    if tarefas_sessao.get(tarefa.chave) == tarefa.id:
+        del tarefas_sessao[tarefa.chave]
+        set_state_value("tarefas_sessao", tarefas_sessao)
+
+def acompanhar_extracoes(tarefas, reenviar):
+    """
+    Exibe o andamento das tarefas de extração (uma por arquivo). Enquanto alguma não
+    termina, mostra o progresso de cada uma, as tabelas já extraídas (com um único
+    arquivo) e o botão de cancelamento, e reexecuta o script após
+    INTERVALO_CONSULTA_TAREFA (a extração continua mesmo que o usuário interaja).
+    Com erro ou cancelamento, exibe a mensagem com a opção de extrair de novo
+    (`reenviar(tarefa)`). Uma tarefa compartilhada com outra sessão continua para
+    ela quando esta cancela; aqui, aparece como cancelada
+    (session_state["extracoes_canceladas"]). Retorna a lista de
+    (dict_anos, df_consolidado) das tarefas concluídas, na ordem recebida.
+    """
+    canceladas = get_state_value("extracoes_canceladas") or set()
+
+    def status_na_sessao(tarefa):
+        return CANCELADA if tarefa.chave in canceladas else tarefa.status
+
+    for tarefa in tarefas:
+        if status_na_sessao(tarefa) not in (ERRO, CANCELADA):
+            continue
+        rotulo = f"{tarefa.descricao}: " if len(tarefas) > 1 else ""
+        if status_na_sessao(tarefa) == ERRO:
+            st.error(f"{rotulo}Erro ao extrair tabelas: {tarefa.erro}")
+        else:
+            st.warning(f"{rotulo}Extração cancelada.")
+        if st.button("Extrair novamente", key=f"reenviar_{tarefa.id}"):
+            reenviar(tarefa)
+            st.rerun()
+
+    em_andamento = [
+        tarefa for tarefa in tarefas
+        if not tarefa.terminada and status_na_sessao(tarefa) != CANCELADA
+    ]
+    if em_andamento:
+        for tarefa in em_andamento:
+            rotulo = f"{tarefa.descricao}: " if len(tarefas) > 1 else ""
+            st.progress(tarefa.progresso, text=f"{rotulo}{tarefa.mensagem}")
+        if st.button("Cancelar extração", key=f"cancelar_{em_andamento[0].id}"):
+            for tarefa in em_andamento:
+                obter_fila().cancelar(tarefa.id, assinante=id_sessao())
+            set_state_value("extracoes_canceladas", canceladas | {t.chave for t in em_andamento})
+            st.rerun()
+        elif len(tarefas) == 1:
+            parcial = list(em_andamento[0].parcial)
+            if parcial:
+                st.dataframe(juntar_fatias(parcial))
+        time.sleep(INTERVALO_CONSULTA_TAREFA)
+        # A próxima execução é só de acompanhamento: não mede as consultas ao cache
+        set_state_value("consulta_tarefa", True)
+        st.rerun()
+
+    return [tarefa.resultado for tarefa in tarefas if status_na_sessao(tarefa) == CONCLUIDA]
+
+def exibir_fila_tarefas():
+    """Lista na barra lateral as extrações enviadas nesta sessão e o seu estado."""
+    tarefas_sessao = get_state_value("tarefas_sessao") or {}
+    tarefas = obter_fila().listar(tarefas_sessao.values())
+    if not tarefas:
+        return
+    st.sidebar.markdown("### Fila de extração")
+    for tarefa in tarefas:
+        st.sidebar.write(f"{tarefa.descricao or tarefa.id}: {tarefa.status} ({tarefa.progresso:.0%})")
+
+###############################################################################
+# PAINEL LATERAL DE DESEMPENHO (TEMPO, CPU E MEMÓRIA POR ETAPA)
+###############################################################################
+def exibir_painel_medicao(medicao):
+    """Mostra na barra lateral o último registro de cada etapa do documento atual."""
+    st.sidebar.markdown("### Desempenho por etapa")
+    st.sidebar.caption(f"Correlação: {medicao.id_correlacao}")
+    st.sidebar.dataframe(medicao.como_dataframe(), hide_index=True, use_container_width=True)
+    st.sidebar.write(f"Total: {medicao.total_wall():.2f} s")
+    uso = uso_memoria()
+    st.sidebar.caption(
+        f"Dados das sessões: {uso['memoria_mb']:.1f} MB em memória "
+        f"({uso['em_memoria']} de {uso['sessoes']} sessões)"
+    )
+
+def exibir_painel_aquecimento():
+    """Mostra na barra lateral o tempo de importação dos módulos pré-carregados."""
+    medicao = medicao_aquecimento()
+    if medicao is None:
+        return
+    st.sidebar.markdown("### Aquecimento")
+    st.sidebar.dataframe(medicao.como_dataframe(), hide_index=True, use_container_width=True)
+
 ###############################################################################
 # APLICAÇÃO STREAMLIT – FLUXO COMPLETO
 ###############################################################################
 def main():
+    # Reexecução disparada pelo acompanhamento de uma extração (acompanhar_extracoes)
+    consulta_tarefa = bool(get_state_value("consulta_tarefa"))
+    set_state_value("consulta_tarefa", False)
+
+    mostrar_medicao = st.sidebar.checkbox("Mostrar desempenho por etapa", value=False)
+    usar_ocr = st.sidebar.checkbox(
+        "OCR nas páginas digitalizadas", value=OCR_PADRAO,
+        help="Reconhece (Tesseract) apenas as páginas sem camada de texto.",
+    )
+    exibir_fila_tarefas()
+
     # 1) Exibição da logomarca (caso o arquivo exista)
-    LOGO_PATH = "MP.png"
-    if os.path.exists(LOGO_PATH):
-        with open(LOGO_PATH, "rb") as fimg:
-            logo_b64 = base64.b64encode(fimg.read()).decode()
+    logo_b64 = get_image_base64("MP.png")
+    if logo_b64:
         st.markdown(f"""
             <div style="text-align: center;">
                 <img src="data:image/png;base64,{logo_b64}" style="width:300px; height:auto;" alt="Logomarca">
@@ -701,82 +1893,187 @@ def main():
     # 2) Nome do aplicativo
     st.title("Ficha Financeira Federal")
 
-    # Upload do PDF
-    pdf_enviado = st.file_uploader("Selecione o PDF", type=["pdf"])
-    if pdf_enviado is not None:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-            tmp.write(pdf_enviado.read())
-            tmp.flush()
-            caminho_pdf = tmp.name
+    # Upload dos PDFs (uma ou mais fichas; as do mesmo servidor são mescladas)
+    pdfs_enviados = st.file_uploader("Selecione o(s) PDF(s)", type=["pdf"], accept_multiple_files=True)
+
+    # Com a tela de envio já montada, pré-carrega o restante em segundo plano (uma vez por processo)
+    if AQUECIMENTO_PADRAO:
+        aquecer({"carregar_classificador": lambda: carregar_classificador("Rubricas.txt", "Tarifas.txt")})
+    if mostrar_medicao:
+        exibir_painel_aquecimento()
+
+    if pdfs_enviados:
+        # Cada PDF é lido uma única vez, da memória, e mantido na sessão; arquivos repetidos são ignorados
+        documentos = documentos_da_sessao(pdfs_enviados, usar_ocr)
+
+        # Medição das etapas: um id de correlação por envio, mantido entre reexecuções
+        chave_envio = chave_conjunto(d for _, d in documentos.values())
+        medicao = get_state_value("medicao")
+        if medicao is None or medicao.documento != chave_envio:
+            medicao = MedicaoDocumento(chave_envio)
+            set_state_value("medicao", medicao)
+
+        # (A) Nome e matrícula de cada ficha (primeira página), para agrupar por servidor.
+        # A identificação não espera pelo OCR, que roda na tarefa de extração: até lá,
+        # usa só a camada de texto do PDF. Fica na sessão (não é refeita a cada reexecução)
+        identificacoes = identificar_fichas(documentos, medicao)
+        fichas_por_matricula = {}
+        for chave_documento, (nome_arquivo, documento_enviado) in documentos.items():
+            identificacao = identificacoes[chave_documento]
+            fichas_por_matricula.setdefault(chave_matricula(identificacao["nome_matricula"][1]), []).append(
+                (nome_arquivo, documento_enviado, identificacao)
+            )
+        if len(fichas_por_matricula) > 1:
+            chave_servidor = st.selectbox(
+                "As fichas são de mais de um servidor. Escolha a matrícula:",
+                list(fichas_por_matricula),
+                format_func=lambda chave: f"{chave} ({len(fichas_por_matricula[chave])} arquivo(s))",
+            )
+        else:
+            chave_servidor = next(iter(fichas_por_matricula))
+        fichas = fichas_por_matricula[chave_servidor]
+        documento = fichas[0][1]
+        # Chave das fichas do servidor (com uma ficha, é o próprio hash do PDF)
+        chave_fichas = chave_conjunto(f[1] for f in fichas)
 
-        # (A) Extrair nome e matrícula (primeira página)
-        nome, matricula = extrair_nome_e_matricula(caminho_pdf)
+        nome, matricula = fichas[0][2]["nome_matricula"]
         set_state_value("nome_cliente", nome)
         set_state_value("matricula", matricula)
 
         # (B) Extração aprimorada do nome do cliente (via PyMuPDF)
-        nome_cliente_extraido = extrair_nome_cliente(caminho_pdf)
+        nome_cliente_extraido = fichas[0][2]["nome_servidor"]
         st.write("Nome do cliente extraído:", nome_cliente_extraido)
+        if len(fichas) > 1:
+            st.write(f"Fichas mescladas ({len(fichas)}):", ", ".join(f[0] for f in fichas))
         set_state_value("nome_servidor", nome_cliente_extraido)
 
-        # 1) DataFrame de ANO REFERÊNCIA (PÁGINA, ANO)
+        # 1) DataFrame de ANO REFERÊNCIA (PÁGINA, ANO) – preenchido ao final da extração
         st.markdown("### 1) DataFrame de ANO REFERÊNCIA (PÁGINA, ANO)")
-        df_ano_celulas = extrair_celulas_interesse(caminho_pdf)
-        if df_ano_celulas is not None and not df_ano_celulas.empty:
-            df_ano_celulas["ANO"] = df_ano_celulas["CONTEÚDO"].apply(extrair_ultimos_quatro_digitos)
-            df_ano_celulas = df_ano_celulas[["PÁGINA", "ANO"]].drop_duplicates(subset="PÁGINA")
-            st.dataframe(df_ano_celulas)
-            dict_anos = dict(zip(df_ano_celulas["PÁGINA"], df_ano_celulas["ANO"]))
-        else:
-            dict_anos = {}
-            st.warning("Não foram encontradas células com ANO REFERÊNCIA (pode não existir).")
+        secao_anos = st.container()
 
         # 2) DataFrame Consolidado (com TODAS as colunas + ANO)
         st.markdown("### 2) DataFrame Consolidado (com TODAS as colunas + ANO)")
-        df_consolidado = extrair_tabelas(caminho_pdf, dict_anos)
+        # Resultados já calculados para um PDF (mesma chave de extração) são reaproveitados; só os
+        # arquivos novos são extraídos, na fila de tarefas (em paralelo), e a página
+        # acompanha o progresso
+        cache = obter_cache()
+        partes = []
+        tarefas = []
+        for nome_arquivo, documento_ficha, _ in fichas:
+            with nullcontext() if consulta_tarefa else medicao.etapa("cache_extracao"):
+                em_cache = cache.obter(documento_ficha.chave_extracao)
+            if em_cache is not None:
+                partes.append(em_cache)
+            else:
+                tarefas.append(obter_tarefa_extracao(documento_ficha, medicao, nome_arquivo))
+        if tarefas:
+            por_chave = {f[1].chave_extracao: f[1] for f in fichas}
+            concluidas = acompanhar_extracoes(
+                tarefas,
+                lambda tarefa: obter_tarefa_extracao(
+                    por_chave[tarefa.chave], medicao, tarefa.descricao, reiniciar=True
+                ),
+            )
+            canceladas = get_state_value("extracoes_canceladas") or set()
+            identificacao_mudou = False
+            for tarefa, (dict_anos_ficha, df_ficha) in zip(
+                [t for t in tarefas if t.status == CONCLUIDA and t.chave not in canceladas],
+                concluidas,
+            ):
+                partes.append((dict_anos_ficha, df_ficha))
+                identificacao_mudou |= atualizar_identificacao(tarefa)
+                if df_ficha is not None and not df_ficha.empty:
+                    try:
+                        cache.salvar(tarefa.chave, dict_anos_ficha, df_ficha)
+                    except Exception as e:
+                        st.warning(f"Não foi possível gravar o cache da extração: {e}")
+                    else:
+                        # O resultado já está no cache: a fila não precisa mais mantê-lo
+                        liberar_tarefa_extracao(tarefa)
+            if identificacao_mudou:
+                # Nome, matrícula e CPF lidos pelo OCR: refaz a página com eles
+                st.rerun()
+
+        if len(partes) > 1:
+            with medicao.etapa("mesclar_consolidados") as registro:
+                dict_anos, df_consolidado = mesclar_consolidados(partes)
+                registro["linhas"] = 0 if df_consolidado is None else len(df_consolidado)
+        elif partes:
+            dict_anos, df_consolidado = partes[0]
+        else:
+            dict_anos, df_consolidado = {}, None
 
-        # Exclui o arquivo temporário (PDF) para limpar
-        os.unlink(caminho_pdf)
+        with secao_anos:
+            if dict_anos:
+                st.dataframe(pd.DataFrame(list(dict_anos.items()), columns=["PÁGINA", "ANO"]))
+            else:
+                st.warning("Não foram encontradas células com ANO REFERÊNCIA (pode não existir).")
 
         if df_consolidado is not None and not df_consolidado.empty:
-            df_consolidado = classificar_registros_ffill(df_consolidado)
-            df_consolidado["PÁGINA"] = df_consolidado["PÁGINA"].astype(int)
-            # Caso alguma página não esteja no dicionário, mantemos a 'ANO' já extraída
-            df_consolidado["ANO"] = df_consolidado["PÁGINA"].map(dict_anos).fillna(df_consolidado["ANO"])
+            with medicao.etapa("preparar_consolidado", linhas=len(df_consolidado)):
+                df_consolidado = preparar_consolidado(df_consolidado, dict_anos)
             st.dataframe(df_consolidado)
 
-            # Botão de Download em PDF (DataFrame Consolidado)
-            pdf_out = os.path.join(
-                tempfile.gettempdir(),
-                f"extrato_financeiro_unico_{sanitizar_para_arquivo(nome_cliente_extraido)}.pdf"
-            )
-            salvar_em_pdf(df_consolidado, pdf_out)
-            with open(pdf_out, "rb") as fpdf:
+            # Recortes da análise guardados compactos, como posições no consolidado
+            estado = obter_estado(get_state_value("estado_dados"), chave_fichas, df_consolidado)
+            set_state_value("estado_dados", estado)
+
+            # Grava no armazenamento persistente (uma vez por conjunto de fichas na sessão)
+            fichas_armazenadas = get_state_value("fichas_armazenadas") or set()
+            if chave_fichas not in fichas_armazenadas:
+                try:
+                    with medicao.etapa("gravar_consolidado", linhas=len(df_consolidado)):
+                        obter_armazenamento().gravar_consolidado(
+                            df_consolidado, [f[1].hash_sha256 for f in fichas],
+                            matricula=matricula, cpf=fichas[0][2]["cpf"],
+                            nome=nome_cliente_extraido,
+                        )
+                    set_state_value("fichas_armazenadas", fichas_armazenadas | {chave_fichas})
+                except Exception as e:
+                    st.warning(f"Não foi possível gravar a ficha no armazenamento: {e}")
+
+            # Download em PDF (DataFrame Consolidado): gerado só quando solicitado e
+            # reaproveitado (cache pela chave das fichas) nas execuções seguintes
+            nome_pdf_consolidado = f"extrato_financeiro_unico_{sanitizar_para_arquivo(nome_cliente_extraido)}.pdf"
+            pdf_consolidado = get_state_value("pdf_consolidado")
+            if pdf_consolidado is None or pdf_consolidado[0] != chave_fichas:
+                pdf_consolidado = None
+                if st.button("Gerar PDF (DataFrame Consolidado)"):
+                    with st.spinner("Gerando PDF..."), \
+                            medicao.etapa("salvar_em_pdf", linhas=len(df_consolidado)):
+                        pdf_consolidado = (
+                            chave_fichas,
+                            obter_pdf_consolidado(df_consolidado, chave_fichas),
+                        )
+                    set_state_value("pdf_consolidado", pdf_consolidado)
+            if pdf_consolidado is not None:
                 st.download_button(
                     label="Baixar PDF (DataFrame Consolidado)",
-                    data=fpdf.read(),
-                    file_name=f"extrato_financeiro_unico_{sanitizar_para_arquivo(nome_cliente_extraido)}.pdf",
+                    data=pdf_consolidado[1],
+                    file_name=nome_pdf_consolidado,
                     mime="application/pdf"
                 )
 
             # 3) Análise de Descontos
             st.markdown("### 3) Análise de Descontos")
             if st.button("3.1) Filtrar Operações de Descontos"):
-                df_filtrado = df_consolidado[
-                    (df_consolidado["TIPO"].str.upper() == "DESCONTOS") |
-                    (df_consolidado["TIPO"].str.upper() == "TIPO")
-                ].copy()
-                set_state_value("df_filtrado_descontos", df_filtrado)
+                with medicao.etapa("filtrar_descontos") as registro:
+                    df_filtrado = filtrar_descontos(df_consolidado)
+                    registro["linhas"] = len(df_filtrado)
+                estado.guardar("df_filtrado_descontos", df_filtrado)
 
-            df_filtrado_descontos = get_state_value("df_filtrado_descontos")
+            df_filtrado_descontos = estado.obter("df_filtrado_descontos")
             if df_filtrado_descontos is not None and not df_filtrado_descontos.empty:
                 st.markdown("### 3.2) DataFrame Filtrado (Somente DESCONTOS e cabeçalho TIPO)")
                 st.dataframe(df_filtrado_descontos, use_container_width=True)
 
                 st.markdown("### 3.3) Lista das Rubricas")
-                rubricas = carregar_glossario("Rubricas.txt")
-                if rubricas:
-                    st.dataframe(pd.DataFrame({"Rubricas": rubricas}))
+                # Rubricas (cartão/empréstimo) e Tarifas (tarifas/associações) em um só classificador
+                with medicao.etapa("carregar_classificador") as registro:
+                    rubricas = carregar_classificador("Rubricas.txt", "Tarifas.txt")
+                    registro["linhas"] = len(rubricas)
+                if len(rubricas):
+                    st.dataframe(rubricas.como_dataframe())
                 else:
                     st.warning("Glossário não encontrado ou vazio.")
 
@@ -784,18 +2081,38 @@ def main():
                 st.markdown("### 4) Filtrar Descontos no Glossário (Precisão Ajustável)")
                 st.write(" ")
                 thresh = st.slider("Nível de Similaridade (0.1 a 1.0)", 0.1, 1.0, 0.85, 0.1)
+                # Scores guardados por glossário e fichas: editar Rubricas.txt/Tarifas.txt
+                # refaz scores e categorias na próxima interação, também nesta sessão
+                chave_pontuacoes = (rubricas.assinatura, chave_fichas)
+                filtro_rubricas = get_state_value("filtro_rubricas")
+                threshold_value = None
                 if st.button("Filtro com Rubricas"):
-                    if not rubricas:
+                    if not len(rubricas):
                         st.warning("Glossário vazio. Impossível filtrar.")
                     else:
                         threshold_value = int(thresh * 100)
-                        df_somente_descontos = df_filtrado_descontos[
-                            df_filtrado_descontos["TIPO"].str.upper() == "DESCONTOS"
-                        ].copy()
-                        df_gloss = cruzar_descontos_com_rubricas(df_somente_descontos, rubricas, threshold_value)
-                        set_state_value("df_gloss", df_gloss)
+                elif (filtro_rubricas is not None and filtro_rubricas[0] != chave_pontuacoes
+                      and len(rubricas) and estado.obter("df_gloss") is not None):
+                    # Glossário mudou desde o último filtro: refaz com o mesmo nível
+                    threshold_value = filtro_rubricas[1]
+                if threshold_value is not None:
+                    df_somente_descontos = filtrar_descontos(df_filtrado_descontos, incluir_cabecalho=False)
+                    # Scores calculados uma vez por glossário; novos thresholds só aplicam a máscara
+                    pontuacoes = get_state_value("pontuacoes_rubricas")
+                    with medicao.etapa("cruzar_descontos_com_rubricas", linhas=len(df_somente_descontos)):
+                        if pontuacoes is None or pontuacoes[0] != chave_pontuacoes:
+                            pontuacoes = (
+                                chave_pontuacoes,
+                                pontuar_glossario(df_somente_descontos["DISCRIMINAÇÃO"], rubricas),
+                            )
+                            set_state_value("pontuacoes_rubricas", pontuacoes)
+                        df_gloss = cruzar_descontos_com_rubricas(
+                            df_somente_descontos, rubricas, threshold_value, pontuacoes[1]
+                        )
+                    estado.guardar("df_gloss", df_gloss)
+                    set_state_value("filtro_rubricas", (chave_pontuacoes, threshold_value))
 
-                df_gloss = get_state_value("df_gloss")
+                df_gloss = estado.obter("df_gloss")
                 if df_gloss is not None and not df_gloss.empty:
                     st.markdown("#### 4.1) Descontos x Glossário")
                     st.dataframe(df_gloss, use_container_width=True)
@@ -805,9 +2122,17 @@ def main():
                     st.markdown("#### 5.1) Marque os itens que deseja incluir:")
                     desc_unicas = sorted(df_gloss["DISCRIMINAÇÃO"].unique())
                     selecionados = []
+                    qtd_por_desc = df_gloss["DISCRIMINAÇÃO"].value_counts()
+                    categoria_por_desc = (
+                        df_gloss.drop_duplicates("DISCRIMINAÇÃO").set_index("DISCRIMINAÇÃO")["CATEGORIA"]
+                        if "CATEGORIA" in df_gloss.columns else pd.Series(dtype=object)
+                    )
                     for i, desc in enumerate(desc_unicas):
-                        qtd = df_gloss[df_gloss["DISCRIMINAÇÃO"] == desc].shape[0]
-                        if st.checkbox(f"{desc} ({qtd}x)", key=f"chk_desc_{i}"):
+                        qtd = qtd_por_desc[desc]
+                        rotulo = f"{desc} ({qtd}x)"
+                        if desc in categoria_por_desc.index:
+                            rotulo += f" – {categoria_por_desc[desc]}"
+                        if st.checkbox(rotulo, key=f"chk_desc_{i}"):
                             selecionados.append(desc)
 
                     if st.button("Confirmar Inclusões"):
@@ -815,17 +2140,18 @@ def main():
                             st.warning("Nenhuma descrição selecionada.")
                         else:
                             df_incl = df_gloss[df_gloss["DISCRIMINAÇÃO"].isin(selecionados)].copy()
-                            set_state_value("df_incluido", df_incl)
+                            estado.guardar("df_incluido", df_incl)
                             st.success("Descontos selecionados com sucesso!")
 
                     st.markdown("#### 5.2) Lista Restante após Inclusões")
-                    df_incluido = get_state_value("df_incluido")
+                    df_incluido = estado.obter("df_incluido")
                     if df_incluido is not None and not df_incluido.empty:
                         st.dataframe(df_incluido, use_container_width=True)
 
                         # 5.3) Dataframe de Datas Ajustadas
                         st.markdown("#### 5.3) Dataframe de Datas Ajustadas")
-                        df_datas_ajustadas = ajustar_datas(df_incluido)
+                        with medicao.etapa("ajustar_datas", linhas=len(df_incluido)):
+                            df_datas_ajustadas = ajustar_datas(df_incluido)
                         st.dataframe(df_datas_ajustadas, use_container_width=True)
 
                         # 6) Relatório Final de Descontos
@@ -837,33 +2163,21 @@ def main():
                         # Exibe prévia em formato brasileiro na coluna 'DESCONTOS'
                         st.write("**Prévia (coluna 'DESCONTOS'):**")
                         df_preview = df_final.copy()
-                        df_preview["DESCONTOS"] = df_preview["DESCONTOS"].apply(
-                            lambda x: "R$ " + formatar_valor_brl(str(x))
-                        )
+                        centavos_descontos = para_centavos(df_final["DESCONTOS"])
+                        df_preview["DESCONTOS"] = formatar_brl(centavos_descontos, simbolo=True)
                         st.dataframe(df_preview)
 
-                        # Soma (A), manipulação de B, etc.
-                        def _to_float(x):
-                            try:
-                                return float(str(x).replace(',', '.').strip())
-                            except:
-                                return 0.0
-
-                        A_val = df_final["DESCONTOS"].apply(_to_float).sum()
-                        A_str = f"{A_val:,.2f}"
+                        # Soma (A), manipulação de B, etc. (em centavos)
+                        A_val = int(centavos_descontos.sum())
 
                         col1, col2 = st.columns(2)
                         with col1:
                             valor_b_receb = st.text_input("B = Valor Recebido - Autor (a) [utilizar ponto para separar os centavos]", "0")
-                        try:
-                            vrnum = float(valor_b_receb.replace(',', '.').strip())
-                        except:
-                            vrnum = 0.0
+                        vrnum = centavos_digitados(valor_b_receb) or 0
 
                         indebito = A_val - vrnum
                         indebito_dobro = 2 * indebito
-                        indebito_str = f"{indebito:,.2f}"
-                        indebito_dobro_str = f"{indebito_dobro:,.2f}"
+                        indebito_str, indebito_dobro_str = formatar_us([indebito, indebito_dobro])
 
                         with col2:
                             st.write(f"Indébito (A-B): {indebito_str}")
@@ -879,93 +2193,12 @@ def main():
                         if submit_final:
                             titulo_final = "Descontos Finais"
                             # Monta DataFrame com as 4 linhas especiais
-                            df_com_totais = inserir_totais_na_coluna(df_final.copy(), "DESCONTOS")
+                            with medicao.etapa("inserir_totais_na_coluna", linhas=len(df_final)):
+                                df_com_totais = inserir_totais_na_coluna(df_final.copy(), "DESCONTOS")
 
                             # =============== GERAÇÃO DO PDF FINAL ===============
-                            from fpdf import FPDF
-
-                            class PDFDescontosFinais(FPDF):
-                                def header(self):
-                                    self.set_font("Arial", "B", 16)
-                                    self.cell(0, 10, titulo_final, border=False, ln=True, align='C')
-                                    self.ln(5)
-
-                                def footer(self):
-                                    self.set_y(-15)
-                                    self.set_font('Arial', 'I', 8)
-                                    self.cell(0, 10, f'Página {self.page_no()}', border=False, ln=False, align='C')
-
-                            pdf_temp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf").name
-                            pdf_doc = PDFDescontosFinais(orientation="L", format="A4")
-                            pdf_doc.add_page()
-
-                            # Remover "DESCRIÇÃO" se ainda existir
-                            if "DESCRIÇÃO" in df_com_totais.columns:
-                                df_com_totais = df_com_totais.drop(columns=["DESCRIÇÃO"])
-
-                            colunas_final = df_com_totais.columns.tolist()
-                            col_widths = []
-                            for c in colunas_final:
-                                if c.upper() == "DISCRIMINAÇÃO":
-                                    col_widths.append(150)
-                                elif c.upper() == "DATAS":
-                                    col_widths.append(40)
-                                else:
-                                    col_widths.append(40)
-
-                            # Cabeçalho
-                            pdf_doc.set_font("Arial", "B", 10)
-                            for i, col in enumerate(colunas_final):
-                                pdf_doc.cell(col_widths[i], 8, col, border=1, align='C')
-                            pdf_doc.ln()
-
-                            # Linhas especiais para destacar
-                            linhas_especiais = [
-                                "A = Valor Total (R$)",
-                                "B = Valor Recebido - Autor (a)",
-                                "Indébito (A-B)",
-                                "Indébito em dobro (R$)"
-                            ]
-
-                            # Impressão das linhas do PDF
-                            for _, row_ in df_com_totais.iterrows():
-                                is_special_line = False
-                                if row_["DISCRIMINAÇÃO"] in linhas_especiais:
-                                    is_special_line = True
-
-                                for i, col in enumerate(colunas_final):
-                                    val = str(row_[col]) if pd.notnull(row_[col]) else ""
-
-                                    # Para a linha "B = Valor Recebido - Autor (a)" no PDF,
-                                    # dividir valor inserido pelo usuário por 10.
-                                    if (row_["DISCRIMINAÇÃO"] == "B = Valor Recebido - Autor (a)") and (col.upper() == "DESCONTOS"):
-                                        # Tentar converter e dividir por 10
-                                        try:
-                                            val_float = float(val.replace(',', '.').strip())
-
-                                            val = f"{val_float:.2f}"
-                                        except:
-                                            pass
-
-                                    # Se for coluna de valores (DESCONTOS), converter para BR
-                                    if col.upper() == "DESCONTOS" and not (val in linhas_especiais):
-                                        val = formatar_valor_brl(val)
-
-                                    # Configurar cores/fonte se for linha especial
-                                    if is_special_line:
-                                        pdf_doc.set_text_color(255, 0, 0)     # Vermelho
-                                        pdf_doc.set_font("Arial", "B", 12)    # Negrito, maior
-                                    else:
-                                        pdf_doc.set_text_color(0, 0, 0)
-                                        pdf_doc.set_font("Arial", "", 10)
-
-                                    pdf_doc.cell(col_widths[i], 8, val, border=1, align='C')
-                                pdf_doc.ln()
-
-                            pdf_doc.output(pdf_temp)
-                            with open(pdf_temp, "rb") as fpdf_:
-                                pdf_data_finais = fpdf_.read()
-                            os.remove(pdf_temp)
+                            with medicao.etapa("gerar_pdf_descontos_finais", linhas=len(df_com_totais)):
+                                pdf_data_finais = gerar_pdf_descontos_finais(df_com_totais, titulo_final)
 
                             pdf_download_name = f"Descontos_Finais_Cronologico_{sanitizar_para_arquivo(nome_cliente_extraido)}.pdf"
                             st.download_button(
@@ -976,18 +2209,39 @@ def main():
                             )
 
                             # =============== GERAÇÃO DO DOCX FINAL ===============
-                            docx_data = df_to_docx_bytes(df_com_totais, titulo_final)
-                            # Ajustar valores para formato BR (via regex)
-                            docx_corrigido = ajustar_valores_docx(docx_data)
+                            # Valores já saem no formato BR (sem reprocessar o arquivo)
+                            with medicao.etapa("df_to_docx_bytes", linhas=len(df_com_totais)):
+                                docx_data = df_to_docx_bytes(df_com_totais, titulo_final)
+
+                            # Descontos finais e valor recebido (B) do cliente no armazenamento, uma
+                            # vez por resultado (fichas, descontos e B); reexecuções não regravam
+                            gravacao = (
+                                chave_fichas, valor_b_receb,
+                                hash_bytes(pd.util.hash_pandas_object(df_final, index=False).to_numpy().tobytes()),
+                            )
+                            if get_state_value("descontos_gravados") != gravacao:
+                                try:
+                                    with medicao.etapa("gravar_descontos", linhas=len(df_final)):
+                                        obter_armazenamento().gravar_descontos(
+                                            df_final.assign(CATEGORIA=df_final["DISCRIMINAÇÃO"].map(categoria_por_desc)),
+                                            documento.hash_sha256, matricula=matricula, valor_recebido=valor_b_receb,
+                                            periodos=periodos_consolidado(df_consolidado),
+                                        )
+                                    set_state_value("descontos_gravados", gravacao)
+                                except Exception as e:
+                                    st.warning(f"Não foi possível gravar os descontos no armazenamento: {e}")
                             docx_download_name = f"Descontos_Finais_Cronologico_{sanitizar_para_arquivo(nome_cliente_extraido)}.docx"
 
                             st.download_button(
                                 label="Baixar DOCX (Descontos Finais - Cronológico)",
-                                data=docx_corrigido,
+                                data=docx_data,
                                 file_name=docx_download_name,
                                 mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
                             )
 
+        if mostrar_medicao:
+            exibir_painel_medicao(medicao)
+
 if __name__ == "__main__":
     st.set_page_config(page_title="Analista de Contracheques", layout="centered")
     main()
@@ -0,0 +1,81 @@
+"""
+Aquecimento do processo: pré-carga, em segundo plano, dos módulos pesados e dos glossários.
+
+A aplicação importa PyMuPDF, python-docx, fpdf2, rapidfuzz e Camelot/OpenCV só no
+primeiro uso, para a tela de envio abrir rápido. Depois que a interface sobe,
+`aquecer()` importa esses módulos (e executa as tarefas extras, ex.: montar o
+classificador dos glossários) em uma thread, de modo que o primeiro envio
+também não pague a importação. Os workers do Camelot e do OCR não herdam estes
+módulos: partem do forkserver (extracao_paralela.contexto_processos), que importa
+o Camelot uma vez ao ser criado.
+
+Cada importação é medida como uma etapa (instrumentacao.MedicaoDocumento, documento
+"aquecimento"): tempo, CPU e memória vão para o log de etapas e ficam em
+`medicao_aquecimento()`. benchmarks/bench_importacao.py mede a partida a frio.
+
+O aquecimento roda uma única vez por processo (reexecuções do Streamlit não o
+repetem). Módulos ausentes (ex.: Camelot sem Ghostscript) são registrados como
+erro e não interrompem a aplicação.
+
+Configuração por variável de ambiente:
+  FICHA_AQUECIMENTO   "0" desativa o aquecimento na aplicação (padrão: ativado)
+"""
+import importlib
+import os
+import threading
+
+from instrumentacao import MedicaoDocumento
+
+AQUECIMENTO_PADRAO = os.environ.get("FICHA_AQUECIMENTO", "1") != "0"
+
+# Módulos carregados no primeiro uso, na ordem em que o fluxo costuma precisar deles
+MODULOS_PESADOS = ["fitz", "rapidfuzz.process", "fpdf", "docx", "cv2", "camelot"]
+
+_lock = threading.Lock()
+_thread = None
+_medicao = None
+
+
+def _executar(tarefas_extras):
+    for modulo in MODULOS_PESADOS:
+        try:
+            with _medicao.etapa(f"importar {modulo}"):
+                importlib.import_module(modulo)
+        except Exception:
+            pass  # registrado na medição; o módulo será importado (ou falhará) no uso
+    for nome, funcao in (tarefas_extras or {}).items():
+        try:
+            with _medicao.etapa(nome):
+                funcao()
+        except Exception:
+            pass
+
+
+def aquecer(tarefas_extras=None, em_segundo_plano=True):
+    """
+    Importa os módulos pesados e executa `tarefas_extras` ({nome: função sem
+    argumentos}), uma única vez por processo. Em segundo plano, retorna a thread
+    (ou None se o aquecimento já foi iniciado); senão, a MedicaoDocumento.
+    """
+    global _thread, _medicao
+    with _lock:
+        if _medicao is not None:
+            return None if em_segundo_plano else _medicao
+        _medicao = MedicaoDocumento("aquecimento")
+        if em_segundo_plano:
+            _thread = threading.Thread(
+                target=_executar, args=(tarefas_extras,), name="ficha-aquecimento", daemon=True
+            )
+            _thread.start()
+            return _thread
+    _executar(tarefas_extras)
+    return _medicao
+
+
+def aquecimento_em_andamento() -> bool:
+    return _thread is not None and _thread.is_alive()
+
+
+def medicao_aquecimento():
+    """Medição das etapas do aquecimento (None se ainda não foi iniciado)."""
+    return _medicao
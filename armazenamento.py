@@ -0,0 +1,373 @@
+"""
+Armazenamento persistente (SQLite) dos dados extraídos das fichas, para consultas
+entre clientes (ex.: "quais clientes tiveram a rubrica X entre 2018 e 2022?").
+
+Os dados ficam por cliente (servidor), identificado pela matrícula (só dígitos) ou,
+sem ela, pelo hash do PDF:
+
+  clientes     matrícula, CPF, nome, valor recebido (B) do último relatório
+  fichas       PDFs (SHA-256) que contribuíram para o cliente
+  lancamentos  consolidado em formato longo: uma linha por célula com valor
+               (TIPO, DISCRIMINAÇÃO, ANO, MÊS, valor em centavos)
+  descontos    descontos finais do relatório (DISCRIMINAÇÃO, ANO, MÊS, centavos)
+
+Ao gravar um consolidado, os meses presentes nele substituem os mesmos meses já
+guardados para o cliente; os demais são mantidos. Assim, fichas de períodos
+diferentes se acumulam e fichas que se sobrepõem não duplicam valores. Os
+descontos finais seguem a mesma regra: os de um relatório substituem os do
+cliente nos meses cobertos pela ficha (periodos_consolidado) e nos meses dos
+próprios descontos.
+
+Há índices por CPF, matrícula, DISCRIMINAÇÃO (normalizada: sem acentos,
+maiúsculas), ANO e MÊS. A conversão para o formato longo é vetorizada e a
+gravação usa uma única transação por ficha.
+
+Configuração por variável de ambiente:
+  FICHA_BANCO   arquivo SQLite (padrão: <tmp>/ficha_armazenamento.sqlite3)
+"""
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from glossario import normalizar_termo
+from valores import para_centavos, centavos_digitados
+
+CAMINHO_PADRAO = os.environ.get(
+    "FICHA_BANCO", os.path.join(tempfile.gettempdir(), "ficha_armazenamento.sqlite3")
+)
+
+MESES = ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS clientes (
+    id INTEGER PRIMARY KEY,
+    chave TEXT NOT NULL UNIQUE,
+    matricula TEXT,
+    cpf TEXT,
+    nome TEXT,
+    valor_recebido_centavos INTEGER,
+    atualizado_em TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_clientes_cpf ON clientes (cpf);
+CREATE INDEX IF NOT EXISTS ix_clientes_matricula ON clientes (matricula);
+
+CREATE TABLE IF NOT EXISTS fichas (
+    cliente_id INTEGER NOT NULL REFERENCES clientes (id) ON DELETE CASCADE,
+    hash TEXT NOT NULL,
+    gravada_em TEXT,
+    PRIMARY KEY (cliente_id, hash)
+);
+
+CREATE TABLE IF NOT EXISTS lancamentos (
+    cliente_id INTEGER NOT NULL REFERENCES clientes (id) ON DELETE CASCADE,
+    tipo TEXT,
+    discriminacao TEXT,
+    discriminacao_norm TEXT,
+    ano INTEGER,
+    mes INTEGER,
+    centavos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_cliente ON lancamentos (cliente_id, ano, mes);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_discriminacao ON lancamentos (discriminacao_norm, ano, mes);
+CREATE INDEX IF NOT EXISTS ix_lancamentos_periodo ON lancamentos (ano, mes);
+
+CREATE TABLE IF NOT EXISTS descontos (
+    cliente_id INTEGER NOT NULL REFERENCES clientes (id) ON DELETE CASCADE,
+    discriminacao TEXT,
+    discriminacao_norm TEXT,
+    categoria TEXT,
+    ano INTEGER,
+    mes INTEGER,
+    centavos INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_descontos_cliente ON descontos (cliente_id);
+CREATE INDEX IF NOT EXISTS ix_descontos_discriminacao ON descontos (discriminacao_norm, ano, mes);
+CREATE INDEX IF NOT EXISTS ix_descontos_periodo ON descontos (ano, mes);
+"""
+
+_lock = threading.Lock()
+_armazenamentos = {}
+
+
+def _agora():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def chave_cliente(matricula=None, hash_pdf=None):
+    """Chave do cliente: dígitos da matrícula ou, sem matrícula, o hash do PDF."""
+    digitos = re.sub(r"\D", "", str(matricula or ""))
+    if digitos:
+        return digitos
+    if not hash_pdf:
+        raise ValueError("Informe a matrícula ou o hash do PDF para identificar o cliente.")
+    return f"hash:{hash_pdf}"
+
+
+def _normalizar_coluna(valores):
+    unicos = pd.unique(pd.Series(valores, dtype=object).fillna(""))
+    mapa = {valor: normalizar_termo(valor) for valor in unicos}
+    return pd.Series(valores, dtype=object).fillna("").map(mapa)
+
+
+def consolidado_para_lancamentos(df_consolidado) -> pd.DataFrame:
+    """
+    Converte o consolidado (colunas JAN..DEZ por linha) para o formato longo, uma
+    linha por célula com valor: tipo, discriminacao, discriminacao_norm, ano, mes,
+    centavos. Células vazias, zeradas ou não numéricas são descartadas.
+    """
+    colunas = ["tipo", "discriminacao", "discriminacao_norm", "ano", "mes", "centavos"]
+    if df_consolidado is None or df_consolidado.empty:
+        return pd.DataFrame(columns=colunas)
+    n = len(df_consolidado)
+    matriz = df_consolidado.reindex(columns=MESES).to_numpy(dtype=object)
+    centavos = para_centavos(pd.Series(matriz.ravel(), dtype=object))
+    mascara = (centavos.fillna(0) != 0).to_numpy(dtype=bool)
+    idx_linha = np.repeat(np.arange(n), len(MESES))[mascara]
+    idx_mes = np.tile(np.arange(1, len(MESES) + 1), n)[mascara]
+
+    anos = pd.to_numeric(df_consolidado["ANO"], errors="coerce").to_numpy()
+    discriminacao = df_consolidado["DISCRIMINAÇÃO"].to_numpy(dtype=object)[idx_linha]
+    df = pd.DataFrame({
+        "tipo": df_consolidado["TIPO"].to_numpy(dtype=object)[idx_linha],
+        "discriminacao": discriminacao,
+        "discriminacao_norm": _normalizar_coluna(discriminacao).to_numpy(dtype=object),
+        "ano": pd.array(anos[idx_linha], dtype="Int64"),
+        "mes": idx_mes,
+        "centavos": centavos.to_numpy(dtype=np.int64, na_value=0)[mascara],
+    }, columns=colunas)
+    return df
+
+
+def periodos_consolidado(df_consolidado) -> pd.DataFrame:
+    """Meses (ano, mes) com algum valor no consolidado: o período coberto pela ficha."""
+    return consolidado_para_lancamentos(df_consolidado)[["ano", "mes"]].drop_duplicates()
+
+
+def descontos_para_registros(df_final, coluna_valor="DESCONTOS") -> pd.DataFrame:
+    """
+    Converte os descontos finais (DATAS "MES/ANO", DISCRIMINAÇÃO, valor, CATEGORIA
+    opcional) para discriminacao, discriminacao_norm, categoria, ano, mes, centavos.
+    As linhas especiais de totais (sem DATAS) são ignoradas.
+    """
+    colunas = ["discriminacao", "discriminacao_norm", "categoria", "ano", "mes", "centavos"]
+    if df_final is None or df_final.empty:
+        return pd.DataFrame(columns=colunas)
+    partes = df_final["DATAS"].astype("string").str.extract(r"^([A-Z]{3})(?:/(\d{4}))?$")
+    mes = partes[0].map({nome: i for i, nome in enumerate(MESES, start=1)})
+    centavos = para_centavos(df_final[coluna_valor])
+    validas = (mes.notna() & centavos.notna()).to_numpy(dtype=bool)
+    discriminacao = df_final["DISCRIMINAÇÃO"].to_numpy(dtype=object)[validas]
+    categoria = (
+        df_final["CATEGORIA"].to_numpy(dtype=object)[validas] if "CATEGORIA" in df_final.columns
+        else np.full(int(validas.sum()), None, dtype=object)
+    )
+    return pd.DataFrame({
+        "discriminacao": discriminacao,
+        "discriminacao_norm": _normalizar_coluna(discriminacao).to_numpy(dtype=object),
+        "categoria": categoria,
+        "ano": pd.array(pd.to_numeric(partes[1][validas], errors="coerce"), dtype="Int64"),
+        "mes": mes[validas].astype(int).to_numpy(),
+        "centavos": centavos[validas].astype("int64").to_numpy(),
+    }, columns=colunas)
+
+
+def _linhas(df):
+    """Tuplas para o executemany, com <NA> convertido em None."""
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+class ArmazenamentoFichas:
+    """Banco SQLite com os lançamentos e descontos de todos os clientes processados."""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or CAMINHO_PADRAO
+        self._local = threading.local()
+        diretorio = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(diretorio, exist_ok=True)
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")  # leituras não bloqueiam a gravação
+            con.executescript(_ESQUEMA)
+
+    @contextmanager
+    def _conectar(self):
+        """
+        Transação na conexão desta thread (o Streamlit e o lote chamam de threads e
+        processos diferentes), confirmada ao sair do bloco e desfeita em caso de erro.
+        A conexão é mantida aberta: fechar a última conexão força um checkpoint do WAL.
+        """
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.caminho, timeout=30)
+            con.execute("PRAGMA foreign_keys=ON")
+            con.execute("PRAGMA synchronous=NORMAL")  # seguro com WAL; evita um fsync por gravação
+            self._local.con = con
+        with con:
+            yield con
+
+    def _obter_cliente(self, con, chave, matricula=None, cpf=None, nome=None):
+        con.execute(
+            "INSERT INTO clientes (chave, matricula, cpf, nome, atualizado_em) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (chave) DO UPDATE SET "
+            "matricula = COALESCE(excluded.matricula, matricula), cpf = COALESCE(excluded.cpf, cpf), "
+            "nome = COALESCE(excluded.nome, nome), atualizado_em = excluded.atualizado_em",
+            (chave, matricula, cpf, nome, _agora()),
+        )
+        return con.execute("SELECT id FROM clientes WHERE chave = ?", (chave,)).fetchone()[0]
+
+    def gravar_consolidado(self, df_consolidado, hash_pdf, matricula=None, cpf=None, nome=None):
+        """
+        Grava o consolidado de uma ficha (ou de fichas mescladas; `hash_pdf` pode ser
+        a lista dos hashes) no cliente; os meses presentes substituem os já
+        guardados. Retorna o id do cliente.
+        """
+        hashes = [hash_pdf] if isinstance(hash_pdf, str) else list(hash_pdf)
+        lancamentos = consolidado_para_lancamentos(df_consolidado)
+        chave = chave_cliente(matricula, hashes[0])
+        matricula = re.sub(r"\D", "", str(matricula or "")) or None
+        nome = None if nome in (None, "", "N/D") else nome
+        cpf = None if cpf in (None, "", "N/D") else cpf
+        periodos = lancamentos[["ano", "mes"]].drop_duplicates()
+        with _lock, self._conectar() as con:
+            cliente_id = self._obter_cliente(con, chave, matricula, cpf, nome)
+            con.executemany(
+                "DELETE FROM lancamentos WHERE cliente_id = ? AND ano IS ? AND mes = ?",
+                [(cliente_id, ano, mes) for ano, mes in _linhas(periodos)],
+            )
+            con.executemany(
+                "INSERT INTO lancamentos (cliente_id, tipo, discriminacao, discriminacao_norm, ano, mes, centavos) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(cliente_id, *linha) for linha in _linhas(lancamentos)],
+            )
+            con.executemany(
+                "INSERT OR REPLACE INTO fichas (cliente_id, hash, gravada_em) VALUES (?, ?, ?)",
+                [(cliente_id, h, _agora()) for h in hashes],
+            )
+        return cliente_id
+
+    def gravar_descontos(self, df_final, hash_pdf, matricula=None, valor_recebido=None, coluna_valor="DESCONTOS",
+                         periodos=None):
+        """
+        Grava os descontos finais (DATAS, DISCRIMINAÇÃO, valor) e registra o valor
+        recebido (B), se informado. Os descontos substituem os já guardados do
+        cliente nos meses dos próprios descontos e nos de `periodos` (ano, mes; ex.:
+        periodos_consolidado da ficha, para limpar também os meses que ficaram sem
+        descontos); os demais meses são mantidos. `hash_pdf` identifica o cliente
+        sem matrícula (o mesmo usado em gravar_consolidado). Retorna o id do cliente.
+        """
+        registros = descontos_para_registros(df_final, coluna_valor)
+        substituidos = registros[["ano", "mes"]]
+        if periodos is not None:
+            substituidos = pd.concat([substituidos, periodos[["ano", "mes"]]], ignore_index=True)
+        substituidos = substituidos.drop_duplicates()
+        chave = chave_cliente(matricula, hash_pdf)
+        with _lock, self._conectar() as con:
+            cliente_id = self._obter_cliente(con, chave, re.sub(r"\D", "", str(matricula or "")) or None)
+            if valor_recebido is not None:
+                con.execute(
+                    "UPDATE clientes SET valor_recebido_centavos = ? WHERE id = ?",
+                    (centavos_digitados(valor_recebido), cliente_id),
+                )
+            con.executemany(
+                "DELETE FROM descontos WHERE cliente_id = ? AND ano IS ? AND mes = ?",
+                [(cliente_id, ano, mes) for ano, mes in _linhas(substituidos)],
+            )
+            con.executemany(
+                "INSERT INTO descontos (cliente_id, discriminacao, discriminacao_norm, categoria, ano, mes, centavos) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(cliente_id, *linha) for linha in _linhas(registros)],
+            )
+        return cliente_id
+
+    def possui_ficha(self, hash_pdf) -> bool:
+        """Indica se o PDF (SHA-256) já foi gravado para algum cliente."""
+        with self._conectar() as con:
+            return con.execute("SELECT 1 FROM fichas WHERE hash = ? LIMIT 1", (hash_pdf,)).fetchone() is not None
+
+    def consultar(self, tabela="lancamentos", discriminacao=None, contem=False, ano_inicial=None,
+                  ano_final=None, meses=None, cpf=None, matricula=None, tipo=None) -> pd.DataFrame:
+        """
+        Lançamentos (ou descontos finais, tabela="descontos") com os dados do cliente,
+        filtrados por DISCRIMINAÇÃO (exata após normalização, ou trecho com
+        contem=True), intervalo de anos, meses (1 a 12), CPF, matrícula e TIPO.
+        """
+        if tabela not in ("lancamentos", "descontos"):
+            raise ValueError(f"Tabela inválida: {tabela}")
+        condicoes, parametros = [], []
+        if discriminacao:
+            termo = normalizar_termo(discriminacao)
+            if contem:
+                condicoes.append("t.discriminacao_norm LIKE ?")
+                parametros.append(f"%{termo}%")
+            else:
+                condicoes.append("t.discriminacao_norm = ?")
+                parametros.append(termo)
+        if ano_inicial is not None:
+            condicoes.append("t.ano >= ?")
+            parametros.append(int(ano_inicial))
+        if ano_final is not None:
+            condicoes.append("t.ano <= ?")
+            parametros.append(int(ano_final))
+        if meses:
+            condicoes.append(f"t.mes IN ({','.join('?' * len(meses))})")
+            parametros.extend(int(m) for m in meses)
+        if cpf:
+            condicoes.append("c.cpf = ?")
+            parametros.append(cpf)
+        if matricula:
+            condicoes.append("c.matricula = ?")
+            parametros.append(re.sub(r"\D", "", str(matricula)))
+        if tipo and tabela == "lancamentos":
+            condicoes.append("UPPER(t.tipo) = ?")
+            parametros.append(str(tipo).upper())
+        colunas_tabela = "t.tipo, " if tabela == "lancamentos" else "t.categoria, "
+        sql = (
+            f"SELECT c.id AS cliente_id, c.matricula, c.cpf, c.nome, {colunas_tabela}"
+            "t.discriminacao, t.ano, t.mes, t.centavos "
+            f"FROM {tabela} t JOIN clientes c ON c.id = t.cliente_id"
+        )
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        sql += " ORDER BY c.id, t.ano, t.mes"
+        return self.ler_sql(sql, parametros)
+
+    def ler_sql(self, sql, parametros=()) -> pd.DataFrame:
+        """Resultado de uma consulta SQL qualquer (ex.: agregações da análise da carteira)."""
+        with self._conectar() as con:
+            return pd.read_sql_query(sql, con, params=list(parametros))
+
+    def clientes_com_rubrica(self, discriminacao, ano_inicial=None, ano_final=None, contem=False,
+                             tabela="lancamentos") -> pd.DataFrame:
+        """
+        Clientes que tiveram a rubrica no período, com a quantidade de meses, o total
+        (centavos) e o primeiro/último ano em que ela aparece.
+        """
+        df = self.consultar(tabela, discriminacao=discriminacao, contem=contem,
+                            ano_inicial=ano_inicial, ano_final=ano_final)
+        colunas = ["cliente_id", "matricula", "cpf", "nome", "meses", "total_centavos", "ano_inicial", "ano_final"]
+        if df.empty:
+            return pd.DataFrame(columns=colunas)
+        resumo = df.groupby(["cliente_id", "matricula", "cpf", "nome"], dropna=False, sort=False).agg(
+            meses=("centavos", "size"),
+            total_centavos=("centavos", "sum"),
+            ano_inicial=("ano", "min"),
+            ano_final=("ano", "max"),
+        )
+        return resumo.reset_index()[colunas]
+
+
+def obter_armazenamento(caminho=None) -> ArmazenamentoFichas:
+    """Retorna o armazenamento (compartilhado pelo processo) para o arquivo dado."""
+    caminho = caminho or CAMINHO_PADRAO
+    with _lock:
+        armazenamento = _armazenamentos.get(caminho)
+        if armazenamento is None:
+            armazenamento = ArmazenamentoFichas(caminho)
+            _armazenamentos[caminho] = armazenamento
+    return armazenamento
@@ -0,0 +1,182 @@
+"""
+Micro-benchmark da consolidação de tabelas em `extrair_tabelas`.
+
+Compara a implementação atual (recortes concatenados uma única vez e busca
+vetorizada dos marcadores 'TIPO'/'TOTAL BRUTO') com a implementação anterior
+(pd.concat dentro do laço e df.apply(..., axis=1) por linha), usando tabelas
+sintéticas no formato devolvido pelo Camelot. Não requer PDFs nem Camelot.
+
+Uso:
+    python benchmarks/bench_consolidacao.py [--paginas 50 100 200 400] [--rubricas 30]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app5  # noqa: E402
+
+MESES_IMPAR = ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]
+MESES_PAR = ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
+
+
+def gerar_tabelas(num_paginas, num_rubricas):
+    """Gera [(página, DataFrame)] imitando as tabelas lattice de uma ficha SIAPE."""
+    tabelas = []
+    for pagina in range(1, num_paginas + 1):
+        meses = MESES_IMPAR if pagina % 2 else MESES_PAR
+        linhas = [
+            ["NOME DO SERVIDOR", "FULANO DE TAL", "", "", "", "", "", ""],
+            [f"ANO REFERÊNCIA {2000 + pagina // 2}", "", "", "", "", "", "", ""],
+            ["TIPO", "DISCRIMINAÇÃO"] + meses,
+        ]
+        for r in range(num_rubricas):
+            tipo = "RENDIMENTOS" if r == 0 else ("DESCONTOS" if r == num_rubricas // 2 else "")
+            linhas.append([tipo, f"RUBRICA {r:03d}"] + [f"{(r + 1) * 10 + m},{m:02d}" for m in range(6)])
+        linhas.append(["TOTAL BRUTO", ""] + ["9.999,99"] * 6)
+        linhas.append(["TOTAL LÍQUIDO", ""] + ["8.888,88"] * 6)
+        tabelas.append((pagina, pd.DataFrame(linhas)))
+    return tabelas
+
+
+def consolidar_legado(tabelas, anos_referencia):
+    """Implementação anterior de extrair_tabelas (concat no laço e apply por linha), para referência."""
+    colunas_finais = app5.COLUNAS_FINAIS
+    df_final = pd.DataFrame(columns=colunas_finais)
+
+    for pagina_atual, df_table in tabelas:
+        df_tab = df_table.copy()
+
+        # Localiza indices de início e fim (com base em 'TIPO' e 'TOTAL BRUTO')
+        start_idx_list = df_tab.index[df_tab.apply(
+            lambda row: any("TIPO" in str(cell).upper() for cell in row), axis=1
+        )].tolist()
+        end_idx_list = df_tab.index[df_tab.apply(
+            lambda row: any("TOTAL BRUTO" in str(cell).upper() for cell in row), axis=1
+        )].tolist()
+
+        if not start_idx_list or not end_idx_list:
+            continue
+        start_idx = start_idx_list[0]
+        end_idx = end_idx_list[0]
+        if end_idx <= start_idx:
+            continue
+
+        # Recorta o trecho da tabela
+        df_slice = df_tab.iloc[start_idx:end_idx].copy()
+        df_slice.columns = df_slice.iloc[0].values  # Usar a primeira linha como cabeçalho
+        df_slice = df_slice[1:]  # Remove a linha de cabeçalho duplicada
+        df_slice.reset_index(drop=True, inplace=True)
+
+        # Ajusta colunas conforme página ímpar ou par
+        if pagina_atual % 2 != 0:
+            # Páginas ímpares – colunas de JAN a JUN
+            colunas_impar = ["TIPO", "DISCRIMINAÇÃO", "JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]
+            map_rename = {}
+            for c in df_slice.columns:
+                c_up = c.upper().strip()
+                if "TIPO" in c_up:
+                    map_rename[c] = "TIPO"
+                elif "DISCRIMIN" in c_up:
+                    map_rename[c] = "DISCRIMINAÇÃO"
+                elif "JAN" in c_up:
+                    map_rename[c] = "JAN"
+                elif "FEV" in c_up:
+                    map_rename[c] = "FEV"
+                elif "MAR" in c_up:
+                    map_rename[c] = "MAR"
+                elif "ABR" in c_up:
+                    map_rename[c] = "ABR"
+                elif "MAI" in c_up:
+                    map_rename[c] = "MAI"
+                elif "JUN" in c_up:
+                    map_rename[c] = "JUN"
+            df_slice.rename(columns=map_rename, inplace=True)
+            for col in colunas_impar:
+                if col not in df_slice.columns:
+                    df_slice[col] = None
+            for mes in ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]:
+                df_slice[mes] = None
+        else:
+            # Páginas pares – colunas de JUL a DEZ
+            colunas_par = ["TIPO", "DISCRIMINAÇÃO", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
+            map_rename = {}
+            for c in df_slice.columns:
+                c_up = c.upper().strip()
+                if "TIPO" in c_up:
+                    map_rename[c] = "TIPO"
+                elif "DISCRIMIN" in c_up:
+                    map_rename[c] = "DISCRIMINAÇÃO"
+                elif "JUL" in c_up:
+                    map_rename[c] = "JUL"
+                elif "AGO" in c_up:
+                    map_rename[c] = "AGO"
+                elif "SET" in c_up:
+                    map_rename[c] = "SET"
+                elif "OUT" in c_up:
+                    map_rename[c] = "OUT"
+                elif "NOV" in c_up:
+                    map_rename[c] = "NOV"
+                elif "DEZ" in c_up:
+                    map_rename[c] = "DEZ"
+            df_slice.rename(columns=map_rename, inplace=True)
+            for col in colunas_par:
+                if col not in df_slice.columns:
+                    df_slice[col] = None
+            for mes in ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]:
+                df_slice[mes] = None
+
+        df_slice["PÁGINA"] = pagina_atual
+        df_slice["ANO"] = anos_referencia.get(pagina_atual, "")
+        df_slice = df_slice[
+            ["PÁGINA", "TIPO", "DISCRIMINAÇÃO",
+             "JAN", "FEV", "MAR", "ABR", "MAI", "JUN",
+             "JUL", "AGO", "SET", "OUT", "NOV", "DEZ", "ANO"]
+        ]
+        df_final = pd.concat([df_final, df_slice], ignore_index=True)
+    return df_final
+
+
+def consolidar_atual(tabelas, anos_referencia):
+    documento = app5.DocumentoFicha(None)
+    documento._tabelas = tabelas  # tabelas já "lidas", sem PDF
+    return app5.extrair_tabelas(documento, anos_referencia, levantar_erros=True)
+
+
+def medir(funcao, *args):
+    """Retorna (resultado, segundos, pico de memória alocada em bytes).
+    Tempo e memória são medidos em execuções separadas (o tracemalloc distorce o tempo)."""
+    inicio = time.perf_counter()
+    resultado = funcao(*args)
+    duracao = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, duracao, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[50, 100, 200, 400])
+    parser.add_argument("--rubricas", type=int, default=30)
+    args = parser.parse_args()
+
+    print(f"{'páginas':>8} {'linhas':>8} {'legado (s)':>11} {'atual (s)':>10} "
+          f"{'ganho':>6} {'pico legado':>12} {'pico atual':>11}")
+    for num_paginas in args.paginas:
+        tabelas = gerar_tabelas(num_paginas, args.rubricas)
+        anos = {p: str(2000 + p // 2) for p, _ in tabelas}
+        df_legado, t_legado, m_legado = medir(consolidar_legado, tabelas, anos)
+        df_atual, t_atual, m_atual = medir(consolidar_atual, tabelas, anos)
+        assert df_legado.astype(str).equals(df_atual.astype(str)), "resultados divergentes"
+        print(f"{num_paginas:>8} {len(df_atual):>8} {t_legado:>11.3f} {t_atual:>10.3f} "
+              f"{t_legado / t_atual:>5.1f}x {m_legado / 2**20:>10.1f}MB {m_atual / 2**20:>9.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
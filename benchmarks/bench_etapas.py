@@ -0,0 +1,171 @@
+"""
+Benchmark de cada etapa do fluxo de app5.py sobre fichas sintéticas.
+
+Para cada número de páginas, gera (ou reaproveita) uma ficha com
+gerar_ficha_sintetica.py e mede, etapa por etapa, o tempo, a vazão (páginas/s e
+linhas/s) e o pico de memória alocada (tracemalloc):
+
+  nome          extrair_nome_e_matricula + extrair_nome_cliente (inclui a leitura do texto)
+  tabelas       leitura das tabelas pelo backend (Camelot ou camada de texto)
+  anos          extrair_celulas_interesse + montar_anos_referencia
+  consolidacao  extrair_tabelas + preparar_consolidado
+  glossario     filtrar_descontos + cruzar_descontos_com_rubricas (classificador a frio)
+  datas         ajustar_datas + inserir_totais_na_coluna
+  pdf           gerar_pdf_consolidado (Extrato Financeiro Único)
+  pdf_final     gerar_pdf_descontos_finais
+  docx          df_to_docx_bytes
+
+Tempo e memória são medidos em execuções separadas do fluxo (o tracemalloc
+distorce o tempo). Com --json, os resultados são gravados para comparação entre
+versões.
+
+Uso:
+    python benchmarks/bench_etapas.py [--paginas 10 40 100] [--rubricas 30]
+                                      [--backend camelot|texto] [--workers N]
+                                      [--sem-memoria] [--json resultados.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app5  # noqa: E402
+import glossario  # noqa: E402
+from gerar_ficha_sintetica import gerar_ficha  # noqa: E402
+
+DIRETORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ETAPAS = ["nome", "tabelas", "anos", "consolidacao", "glossario", "datas", "pdf", "pdf_final", "docx"]
+
+
+def obter_ficha(num_paginas, num_rubricas):
+    """Caminho de uma ficha sintética com os parâmetros dados (gerada uma única vez)."""
+    caminho = os.path.join(tempfile.gettempdir(), f"ficha_sintetica_{num_paginas}p_{num_rubricas}r.pdf")
+    if not os.path.exists(caminho):
+        gerar_ficha(caminho, paginas=num_paginas, rubricas=num_rubricas)
+    return caminho
+
+
+def executar_fluxo(caminho, backend, workers, medir_etapa):
+    """
+    Executa o fluxo completo da ficha; cada etapa roda dentro de
+    medir_etapa(nome, funcao) -> (resultado, linhas processadas).
+    """
+    documento = app5.DocumentoFicha(caminho, workers=workers, backend=backend)
+
+    def _nome():
+        app5.extrair_nome_e_matricula(documento)
+        app5.extrair_nome_cliente(documento)
+        return None, documento.num_paginas
+    medir_etapa("nome", _nome)
+
+    tabelas = medir_etapa("tabelas", lambda: (documento.tabelas, sum(len(df) for _, df in documento.tabelas)))
+
+    def _anos():
+        _, dict_anos = app5.montar_anos_referencia(
+            app5.extrair_celulas_interesse(documento, levantar_erros=True)
+        )
+        return dict_anos, len(tabelas)
+    dict_anos = medir_etapa("anos", _anos)
+
+    def _consolidacao():
+        df = app5.extrair_tabelas(documento, dict_anos, levantar_erros=True)
+        df = app5.preparar_consolidado(df, dict_anos)
+        return df, len(df)
+    df_consolidado = medir_etapa("consolidacao", _consolidacao)
+
+    def _glossario():
+        glossario.limpar_memoria()
+        classificador = app5.carregar_classificador(
+            os.path.join(DIRETORIO_APP, "Rubricas.txt"), os.path.join(DIRETORIO_APP, "Tarifas.txt")
+        )
+        df_descontos = app5.filtrar_descontos(df_consolidado, incluir_cabecalho=False)
+        return app5.cruzar_descontos_com_rubricas(df_descontos, classificador), len(df_descontos)
+    df_gloss = medir_etapa("glossario", _glossario)
+
+    def _datas():
+        df_final = app5.ajustar_datas(df_gloss).rename(columns={"VALOR (R$)": "DESCONTOS"})
+        return app5.inserir_totais_na_coluna(df_final, "DESCONTOS", "0"), len(df_gloss)
+    df_com_totais = medir_etapa("datas", _datas)
+
+    medir_etapa("pdf", lambda: (app5.gerar_pdf_consolidado(df_consolidado), len(df_consolidado)))
+    medir_etapa("pdf_final", lambda: (
+        app5.gerar_pdf_descontos_finais(df_com_totais, "Descontos Finais"), len(df_com_totais)
+    ))
+    medir_etapa("docx", lambda: (app5.df_to_docx_bytes(df_com_totais, "Descontos Finais"), len(df_com_totais)))
+
+
+def medir_ficha(caminho, num_paginas, backend, workers, com_memoria=True):
+    """Retorna {etapa: {segundos, linhas, paginas_s, linhas_s, pico_mb}} para a ficha."""
+    resultados = {}
+
+    def _tempo(etapa, funcao):
+        inicio = time.perf_counter()
+        resultado, linhas = funcao()
+        segundos = time.perf_counter() - inicio
+        resultados[etapa] = {
+            "segundos": round(segundos, 4),
+            "linhas": int(linhas),
+            "paginas_s": round(num_paginas / segundos, 1) if segundos else None,
+            "linhas_s": round(linhas / segundos, 1) if segundos else None,
+            "pico_mb": None,
+        }
+        return resultado
+
+    def _memoria(etapa, funcao):
+        tracemalloc.start()
+        try:
+            resultado, _ = funcao()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        resultados[etapa]["pico_mb"] = round(pico / 2**20, 2)
+        return resultado
+
+    executar_fluxo(caminho, backend, workers, _tempo)
+    if com_memoria:
+        executar_fluxo(caminho, backend, workers, _memoria)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[10, 40, 100])
+    parser.add_argument("--rubricas", type=int, default=30)
+    parser.add_argument("--backend", choices=["camelot", "texto"], default=app5.BACKEND_PADRAO)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--sem-memoria", action="store_true", help="Não mede o pico de memória.")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo.")
+    args = parser.parse_args()
+    # ln=True e a troca Arial -> Helvetica emitem DeprecationWarning a cada chamada no fpdf2
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    todos = []
+    for num_paginas in args.paginas:
+        caminho = obter_ficha(num_paginas, args.rubricas)
+        resultados = medir_ficha(caminho, num_paginas, args.backend, args.workers, not args.sem_memoria)
+        print(f"\n{num_paginas} página(s), {args.rubricas} rubricas, backend {args.backend}")
+        print(f"{'etapa':<13} {'tempo (s)':>10} {'linhas':>8} {'páginas/s':>10} {'linhas/s':>10} {'pico':>9}")
+        for etapa in ETAPAS:
+            r = resultados[etapa]
+            pico = f"{r['pico_mb']:.1f}MB" if r["pico_mb"] is not None else "-"
+            print(f"{etapa:<13} {r['segundos']:>10.3f} {r['linhas']:>8} {r['paginas_s'] or 0:>10.1f} "
+                  f"{r['linhas_s'] or 0:>10.0f} {pico:>9}")
+        total = sum(r["segundos"] for r in resultados.values())
+        print(f"{'total':<13} {total:>10.3f} {'':>8} {num_paginas / total:>10.1f}")
+        todos.append({
+            "paginas": num_paginas, "rubricas": args.rubricas, "backend": args.backend,
+            "etapas": resultados, "total_segundos": round(total, 4),
+        })
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(todos, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
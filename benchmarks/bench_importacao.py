@@ -0,0 +1,107 @@
+"""
+Tempo de partida a frio de app5.py (importação) e do aquecimento.
+
+Em processos Python novos (cache do sistema de arquivos já quente, módulos não
+importados), mede com `python -X importtime`:
+
+  partida       importação de app5 (o que a tela de envio carrega)
+  módulos       tempo acumulado dos principais módulos importados junto
+  pesados       módulos que deveriam ficar para o primeiro uso (aquecimento.MODULOS_PESADOS)
+                e foram importados na partida
+  aquecimento   tempo de importação de cada módulo pesado por aquecimento.aquecer()
+
+Cada medida é o mínimo de --repeticoes execuções. Com --limite-ms, o script termina
+com código 1 se a partida passar do limite ou se algum módulo pesado for importado
+na partida, para flagrar regressões.
+
+Uso:
+    python benchmarks/bench_importacao.py [--repeticoes 3] [--limite-ms 2000] [--json resultados.json]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+DIRETORIO_APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DIRETORIO_APP)
+from aquecimento import MODULOS_PESADOS  # noqa: E402
+
+MODULOS_RELATORIO = ["streamlit", "pandas", "numpy", "pyarrow", "glossario", "cache_extracao",
+                     "armazenamento", "instrumentacao"] + [m.split(".")[0] for m in MODULOS_PESADOS]
+
+_REGEX_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def _executar(codigo, importtime=False):
+    comando = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", codigo]
+    env = dict(os.environ, FICHA_AQUECIMENTO="0", PYTHONWARNINGS="ignore")
+    return subprocess.run(comando, cwd=DIRETORIO_APP, env=env, capture_output=True, text=True, check=True)
+
+
+def medir_partida():
+    """Retorna ({módulo: ms acumulados}, total de app5 em ms) de uma importação a frio."""
+    saida = _executar("import app5", importtime=True).stderr
+    acumulado = {}
+    for linha in saida.splitlines():
+        m = _REGEX_IMPORTTIME.match(linha)
+        if m:
+            # O mesmo módulo aparece uma única vez (na primeira importação)
+            acumulado[m.group(4)] = int(m.group(2)) / 1000
+    return acumulado, acumulado.get("app5")
+
+
+def medir_aquecimento():
+    """Retorna {etapa: segundos} de aquecimento.aquecer() síncrono em um processo novo."""
+    codigo = (
+        "import json, app5, aquecimento\n"
+        "medicao = aquecimento.aquecer(em_segundo_plano=False)\n"
+        "df = medicao.como_dataframe()\n"
+        "print(json.dumps(dict(zip(df['etapa'] + ' (' + df['status'] + ')', df['wall_s']))))"
+    )
+    return json.loads(_executar(codigo).stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--limite-ms", type=float, default=None,
+                        help="Falha se a importação de app5 passar deste tempo (ms).")
+    parser.add_argument("--sem-aquecimento", action="store_true", help="Não mede o aquecimento.")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo.")
+    args = parser.parse_args()
+
+    medidas = [medir_partida() for _ in range(args.repeticoes)]
+    partida_ms = min(total for _, total in medidas)
+    modulos = {
+        nome: min(acumulado.get(nome, 0.0) for acumulado, _ in medidas)
+        for nome in MODULOS_RELATORIO if nome in medidas[0][0]
+    }
+    pesados = [m for m in MODULOS_PESADOS if m in medidas[0][0]]
+
+    print(f"Partida (import app5): {partida_ms:.0f} ms (mínimo de {args.repeticoes})")
+    for nome, ms in sorted(modulos.items(), key=lambda item: -item[1]):
+        print(f"  {nome:<16} {ms:>8.0f} ms")
+    print("Módulos pesados importados na partida:", ", ".join(pesados) if pesados else "nenhum")
+
+    aquecimento = None
+    if not args.sem_aquecimento:
+        aquecimento = medir_aquecimento()
+        print("Aquecimento:")
+        for etapa, segundos in aquecimento.items():
+            print(f"  {etapa:<40} {segundos * 1000:>8.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"partida_ms": partida_ms, "modulos_ms": modulos, "pesados_na_partida": pesados,
+                       "aquecimento_s": aquecimento}, f, ensure_ascii=False, indent=2)
+
+    if args.limite_ms is not None and (partida_ms > args.limite_ms or pesados):
+        print(f"FALHA: limite de {args.limite_ms:.0f} ms excedido ou módulo pesado na partida.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
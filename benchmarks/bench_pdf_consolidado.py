@@ -0,0 +1,161 @@
+"""
+Benchmark da geração do PDF do consolidado ("Extrato Financeiro Único").
+
+Compara `app5.gerar_pdf_consolidado` (linhas agrupadas por página uma única vez,
+texto das células convertido de uma vez, grade desenhada por bloco de linhas) com a
+implementação anterior de `salvar_em_pdf` (filtro df[df["PÁGINA"] == p] por página,
+iterrows e pdf.cell por célula), em consolidados sintéticos de N linhas.
+Não requer PDFs nem Camelot.
+
+Uso:
+    python benchmarks/bench_pdf_consolidado.py [--linhas 1000 5000 10000] [--sem-legado]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app5  # noqa: E402
+
+LINHAS_POR_PAGINA = 12
+
+
+def gerar_consolidado(num_linhas, semente=0):
+    """Gera um DataFrame no formato de app5.COLUNAS_FINAIS com LINHAS_POR_PAGINA linhas por página."""
+    rng = np.random.default_rng(semente)
+    paginas = np.arange(num_linhas) // LINHAS_POR_PAGINA + 1
+    impar = paginas % 2 == 1
+    df = pd.DataFrame({
+        "PÁGINA": paginas,
+        "TIPO": np.where(rng.random(num_linhas) < 0.5, "DESCONTOS", "RENDIMENTOS"),
+        "DISCRIMINAÇÃO": [f"RUBRICA {i % 40:03d}" for i in range(num_linhas)],
+    })
+    for mes in app5.MESES_IMPAR + app5.MESES_PAR:
+        valores = np.array([f"{v:.2f}".replace(".", ",") for v in rng.random(num_linhas) * 5000], dtype=object)
+        valores[~impar if mes in app5.MESES_IMPAR else impar] = None
+        df[mes] = valores
+    df["ANO"] = (2000 + paginas // 2).astype(str)
+    return df[app5.COLUNAS_FINAIS]
+
+
+def renderizar_legado(df, nome_pdf):
+    """Implementação anterior de salvar_em_pdf (filtro por página, iterrows e pdf.cell por célula)."""
+    from fpdf import FPDF
+
+    class PDFCustom(FPDF):
+        def header(self):
+            self.set_font("Arial", "B", 16)
+            # Cabeçalho com o título solicitado:
+            self.cell(0, 10, "Extrato Financeiro Único", border=False, ln=True, align='C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Página {self.page_no()}', border=False, ln=False, align='C')
+
+    pdf = PDFCustom(orientation='L', format='A4')
+    pdf.add_page()
+    pdf.set_font("Arial", size=10)
+
+    paginas_unicas = sorted(df["PÁGINA"].unique())
+    for pagina in paginas_unicas:
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, f"Página {pagina}", border=False, ln=True, align='C')
+        pdf.ln(5)
+        df_pag = df[df["PÁGINA"] == pagina].copy()
+
+        # Remoção das colunas não pertinentes para cada página ímpar/par
+        if pagina % 2 != 0:
+            for col_drop in ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]:
+                if col_drop in df_pag.columns:
+                    df_pag.drop(columns=col_drop, inplace=True)
+        else:
+            for col_drop in ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]:
+                if col_drop in df_pag.columns:
+                    df_pag.drop(columns=col_drop, inplace=True)
+
+        colunas_cabecalho = list(df_pag.columns)
+        larguras = []
+        for col in colunas_cabecalho:
+            if col.upper() == "DISCRIMINAÇÃO":
+                larguras.append(70)
+            elif col.upper() == "PÁGINA":
+                larguras.append(15)
+            elif col.upper() in ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN",
+                                 "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]:
+                larguras.append(20)
+            elif col.upper() == "TIPO":
+                larguras.append(30)
+            elif col.upper() == "ANO":
+                larguras.append(15)
+            else:
+                larguras.append(20)
+
+        pdf.set_font("Arial", size=10)
+        # Cabeçalho da tabela
+        for i, col in enumerate(colunas_cabecalho):
+            pdf.cell(larguras[i], 10, col, border=1, align='C')
+        pdf.ln()
+
+        # Linhas
+        for _, row in df_pag.iterrows():
+            for i, col in enumerate(colunas_cabecalho):
+                valor = str(row[col]) if pd.notnull(row[col]) else ""
+                pdf.cell(larguras[i], 10, valor, border=1, align='C')
+            pdf.ln()
+        pdf.ln(5)
+
+    pdf.output(nome_pdf)
+
+
+def renderizar_atual(df, nome_pdf):
+    app5.salvar_em_pdf(df, nome_pdf)
+
+
+def medir(funcao, *args):
+    """Retorna (segundos, pico de memória alocada em bytes), medidos em execuções separadas."""
+    inicio = time.perf_counter()
+    funcao(*args)
+    duracao = time.perf_counter() - inicio
+    tracemalloc.start()
+    funcao(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duracao, pico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--sem-legado", action="store_true", help="Mede apenas a implementação atual.")
+    args = parser.parse_args()
+    # ln=True e a troca Arial -> Helvetica emitem DeprecationWarning a cada chamada no fpdf2
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    destino = os.path.join(tempfile.gettempdir(), "bench_pdf_consolidado.pdf")
+    print(f"{'linhas':>8} {'legado (s)':>11} {'atual (s)':>10} {'ganho':>6} "
+          f"{'linhas/s':>9} {'pico legado':>12} {'pico atual':>11} {'PDF':>8}")
+    for num_linhas in args.linhas:
+        df = gerar_consolidado(num_linhas)
+        t_atual, m_atual = medir(renderizar_atual, df, destino)
+        tamanho = os.path.getsize(destino)
+        if args.sem_legado:
+            t_legado = m_legado = float("nan")
+        else:
+            t_legado, m_legado = medir(renderizar_legado, df, destino)
+        print(f"{num_linhas:>8} {t_legado:>11.2f} {t_atual:>10.2f} {t_legado / t_atual:>5.1f}x "
+              f"{num_linhas / t_atual:>9.0f} {m_legado / 2**20:>10.1f}MB {m_atual / 2**20:>9.1f}MB "
+              f"{tamanho / 2**10:>6.0f}KB")
+    os.remove(destino)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Gerador de fichas financeiras sintéticas no formato SIAPE (reportlab).
+
+As fichas reais são confidenciais; este gerador produz PDFs com a mesma estrutura
+usada pelos extratores de app5.py, para reproduzir lentidões e medir o desempenho:
+
+  * cabeçalho com os rótulos NOME DO SERVIDOR / CPF e MATRÍCULA-SEQ-DIG, cada um
+    seguido da linha com os valores;
+  * célula "ANO REFERÊNCIA <ano>" em todas as páginas;
+  * grade 'TIPO' ... 'TOTAL BRUTO' com DISCRIMINAÇÃO e os meses: páginas ímpares
+    com JAN..JUN e páginas pares com JUL..DEZ (duas páginas por ano);
+  * rendimentos e descontos com o TIPO só na primeira linha de cada grupo, e
+    descontos que casam com Rubricas.txt / Tarifas.txt misturados a outros.
+
+Os valores seguem o formato brasileiro ("1.234,56"), com alguns meses vazios.
+A geração é determinística para a mesma semente.
+
+Uso:
+    python benchmarks/gerar_ficha_sintetica.py SAIDA.pdf [--anos 5] [--paginas N]
+                                               [--rubricas 20] [--semente 0]
+"""
+import argparse
+import random
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.platypus import PageBreak, SimpleDocTemplate, Spacer, Table, TableStyle
+
+MESES_IMPAR = ["JAN", "FEV", "MAR", "ABR", "MAI", "JUN"]
+MESES_PAR = ["JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
+ANO_INICIAL = 2010
+
+RENDIMENTOS = [
+    "VENCIMENTO BASICO", "GRAT DESEMP ATIV TEC ADM", "AUXILIO ALIMENTACAO",
+    "ADIC TEMPO SERVICO", "AUXILIO TRANSPORTE", "GRATIFICACAO NATALINA",
+    "ADICIONAL FERIAS 1/3", "VANTAGEM PESSOAL NOMINAL", "INCENTIVO QUALIFICACAO",
+    "AUXILIO PRE-ESCOLAR",
+]
+# Metade dos descontos corresponde a termos de Rubricas.txt / Tarifas.txt
+DESCONTOS = [
+    "IMPOSTO DE RENDA RETIDO FONTE", "BMG CARTAO", "CONTRIB PLANO SEG SOC SERV", "AMASEP",
+    "FUNPRESP CONTRIB NORMAL", "PAN CARTAO", "SINDICATO MENSALIDADE", "SABEMI",
+    "PENSAO ALIMENTICIA", "DAYCOVAL CARTAO", "EMPRESTIMO BCO DO BRASIL", "SEGURO PRESTAMISTA",
+]
+
+# Altura útil (pt) para a grade em A4 paisagem, descontados margens e cabeçalho
+_ALTURA_GRADE = 440
+_ALTURA_LINHA_MAX = 14
+_ALTURA_LINHA_MIN = 9  # abaixo disso o Camelot (lattice) deixa de separar as linhas
+
+_ESTILO_CABECALHO = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+])
+
+
+def formatar_brl(valor):
+    """Valor float no formato brasileiro ("1.234,56")."""
+    return f"{valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def escolher_rubricas(num_rubricas, rng):
+    """Lista de (TIPO, DISCRIMINAÇÃO): cerca de metade rendimentos e metade descontos."""
+    num_descontos = max(1, num_rubricas // 2)
+    num_rendimentos = max(1, num_rubricas - num_descontos)
+
+    def _nomes(base, quantidade):
+        nomes = [base[i % len(base)] + ("" if i < len(base) else f" {i // len(base) + 1}")
+                 for i in range(quantidade)]
+        rng.shuffle(nomes)
+        return nomes
+
+    return ([("RENDIMENTOS", d) for d in _nomes(RENDIMENTOS, num_rendimentos)]
+            + [("DESCONTOS", d) for d in _nomes(DESCONTOS, num_descontos)])
+
+
+def _grade_pagina(rubricas, meses, rng):
+    linhas = [["TIPO", "DISCRIMINAÇÃO"] + meses]
+    totais = [0.0] * len(meses)
+    tipo_anterior = None
+    for tipo, discriminacao in rubricas:
+        valores = []
+        for i in range(len(meses)):
+            if rng.random() < 0.1:  # meses sem lançamento
+                valores.append("")
+                continue
+            valor = round(rng.uniform(20, 8000), 2)
+            if tipo == "RENDIMENTOS":
+                totais[i] += valor
+            valores.append(formatar_brl(valor))
+        # Como na ficha real, o TIPO aparece só na primeira linha do grupo
+        linhas.append([tipo if tipo != tipo_anterior else "", discriminacao] + valores)
+        tipo_anterior = tipo
+    linhas.append(["TOTAL BRUTO", ""] + [formatar_brl(t) for t in totais])
+    return linhas
+
+
+def gerar_ficha(destino, anos=2, rubricas=12, paginas=None, semente=0,
+                nome="FULANO DE TAL DA SILVA", cpf="123.456.789-00", matricula="1234567"):
+    """
+    Gera o PDF em `destino`. Com `paginas`, o número de anos é calculado (duas
+    páginas por ano) e a última página pode ficar só com JAN..JUN.
+    Retorna o número de páginas gerado.
+    """
+    rng = random.Random(semente)
+    if paginas is None:
+        paginas = 2 * anos
+    lista_rubricas = escolher_rubricas(rubricas, rng)
+    matricula_formatada = f"{matricula[:3]}.{matricula[3:6]}-{matricula[6:7]} AP"
+
+    # A grade de cada página cabe em uma única folha (como na ficha real)
+    altura_linha = min(_ALTURA_LINHA_MAX, _ALTURA_GRADE / (len(lista_rubricas) + 2))
+    if altura_linha < _ALTURA_LINHA_MIN:
+        raise ValueError(f"{rubricas} rubricas não cabem em uma página (máximo: "
+                         f"{int(_ALTURA_GRADE // _ALTURA_LINHA_MIN) - 2}).")
+    estilo_grade = TableStyle([
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+        ("FONTSIZE", (0, 0), (-1, -1), min(7, altura_linha * 0.6)),
+        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TOPPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 1),
+    ])
+
+    elementos = []
+    for pagina in range(1, paginas + 1):
+        ano = ANO_INICIAL + (pagina - 1) // 2
+        meses = MESES_IMPAR if pagina % 2 else MESES_PAR
+        # Cada linha do cabeçalho é uma única linha de texto, como na ficha do SIAPE
+        cabecalho = Table([
+            [f"NOME DO SERVIDOR{' ' * 40}CPF{' ' * 20}UPAG 000000001"],
+            [f"{nome}{' ' * 10}{cpf}"],
+            [f"MATRÍCULA-SEQ-DIG{' ' * 10}ÓRGÃO 00001"],
+            [matricula_formatada],
+            [f"ANO REFERÊNCIA {ano}"],
+        ])
+        cabecalho.setStyle(_ESTILO_CABECALHO)
+        linhas_grade = _grade_pagina(lista_rubricas, meses, rng)
+        grade = Table(linhas_grade, rowHeights=altura_linha)
+        grade.setStyle(estilo_grade)
+        elementos += [cabecalho, Spacer(1, 8), grade]
+        if pagina < paginas:
+            elementos.append(PageBreak())
+
+    SimpleDocTemplate(destino, pagesize=landscape(A4), topMargin=20, bottomMargin=20).build(elementos)
+    return paginas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("saida", help="Arquivo PDF a gerar.")
+    parser.add_argument("--anos", type=int, default=2, help="Anos de histórico (2 páginas por ano).")
+    parser.add_argument("--paginas", type=int, default=None, help="Número exato de páginas (ignora --anos).")
+    parser.add_argument("--rubricas", type=int, default=12, help="Linhas por página (rendimentos + descontos).")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    paginas = gerar_ficha(args.saida, anos=args.anos, rubricas=args.rubricas,
+                          paginas=args.paginas, semente=args.semente)
+    print(f"{args.saida}: {paginas} página(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Cache em disco dos resultados da extração de fichas financeiras.
+
+Cada entrada é endereçada pela chave de extração (chave_extracao: SHA-256 dos bytes
+do PDF, versão do formato, backend, OCR e triagem das páginas, que mudam o resultado) e guarda, em um
+único arquivo Parquet (formato colunar, compactado), o DataFrame consolidado de
+`extrair_tabelas` e, nos metadados do arquivo, o mapa PÁGINA -> ANO obtido por
+`extrair_celulas_interesse`. Artefatos derivados (ex.: o PDF do consolidado) podem
+ser guardados sob a mesma chave com outro sufixo. O tamanho total do diretório é limitado; quando o
+limite é excedido, as entradas menos usadas recentemente (LRU) são removidas.
+
+Configuração por variáveis de ambiente:
+  FICHA_CACHE_DIR     diretório do cache (padrão: <tmp>/ficha_cache)
+  FICHA_CACHE_MAX_MB  tamanho máximo do cache em MB (padrão: 512)
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DIRETORIO_PADRAO = os.environ.get(
+    "FICHA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ficha_cache")
+)
+LIMITE_PADRAO_MB = int(os.environ.get("FICHA_CACHE_MAX_MB", "512"))
+
+# Versão do formato do resultado: incremente ao mudar a extração ou a normalização do
+# consolidado (ex.: tipos das colunas), para que as entradas antigas não sejam servidas
+VERSAO_FORMATO = 1
+
+_CHAVE_METADADOS_ANOS = b"ficha_anos_referencia"
+_TAMANHO_BLOCO = 1024 * 1024
+
+
+def hash_bytes(dados) -> str:
+    """Retorna o SHA-256 (hexadecimal) de um conteúdo em memória."""
+    return hashlib.sha256(dados).hexdigest()
+
+
+def hash_arquivo(caminho) -> str:
+    """Retorna o SHA-256 (hexadecimal) de um arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(_TAMANHO_BLOCO), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def chave_extracao(hash_pdf, backend, ocr=False, triagem=True) -> str:
+    """
+    Chave do resultado da extração de um PDF: o mesmo arquivo extraído com outro
+    backend, com OCR das páginas digitalizadas ou sem a triagem das páginas gera
+    outro consolidado, assim como uma nova VERSAO_FORMATO.
+    """
+    return f"{hash_pdf}-v{VERSAO_FORMATO}-{backend}" + ("-ocr" if ocr else "") + ("" if triagem else "-semtriagem")
+
+
+class CacheExtracao:
+    """
+    Cache endereçado por conteúdo (chave_extracao: SHA-256 do PDF, versão do formato, backend, OCR e triagem) com política LRU limitada por
+    tamanho. O instante do último acesso é registrado no mtime do arquivo.
+    """
+
+    def __init__(self, diretorio=None, limite_mb=None):
+        self.diretorio = diretorio or DIRETORIO_PADRAO
+        self.limite_bytes = int((limite_mb if limite_mb is not None else LIMITE_PADRAO_MB) * 1024 * 1024)
+        self._lock = threading.Lock()
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def _caminho(self, chave, extensao=".parquet"):
+        return os.path.join(self.diretorio, f"{chave}{extensao}")
+
+    def obter(self, chave):
+        """
+        Retorna (dict_anos, df_consolidado) para a chave ou None se não houver
+        entrada (ou se ela estiver corrompida, caso em que é descartada).
+        """
+        caminho = self._caminho(chave)
+        if not os.path.exists(caminho):
+            return None
+        try:
+            tabela = pq.read_table(caminho)
+            metadados = tabela.schema.metadata or {}
+            anos_json = json.loads(metadados.get(_CHAVE_METADADOS_ANOS, b"{}").decode("utf-8"))
+            dict_anos = {int(pagina): ano for pagina, ano in anos_json.items()}
+            df = tabela.replace_schema_metadata(None).to_pandas()
+        except Exception:
+            self._remover(caminho)
+            return None
+        try:
+            os.utime(caminho, None)  # marca como usado recentemente (LRU)
+        except OSError:
+            pass
+        return dict_anos, df
+
+    def salvar(self, chave, dict_anos, df):
+        """Grava o DataFrame consolidado e o mapa de anos para a chave e aplica o limite."""
+        tabela = pa.Table.from_pandas(df, preserve_index=False)
+        anos_json = json.dumps({str(pagina): ano for pagina, ano in dict_anos.items()})
+        metadados = dict(tabela.schema.metadata or {})
+        metadados[_CHAVE_METADADOS_ANOS] = anos_json.encode("utf-8")
+        tabela = tabela.replace_schema_metadata(metadados)
+
+        caminho = self._caminho(chave)
+        fd, caminho_tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(tabela, caminho_tmp, compression="zstd")
+            os.replace(caminho_tmp, caminho)  # escrita atômica
+        finally:
+            self._remover(caminho_tmp)
+        self._aplicar_limite()
+
+    def obter_arquivo(self, chave, sufixo):
+        """Retorna os bytes de um artefato gerado para a chave (ex.: PDF) ou None."""
+        caminho = self._caminho(chave, sufixo)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(caminho, None)  # marca como usado recentemente (LRU)
+        except OSError:
+            pass
+        return dados
+
+    def salvar_arquivo(self, chave, sufixo, dados):
+        """Grava um artefato gerado para a chave (mesma política LRU das extrações)."""
+        fd, caminho_tmp = tempfile.mkstemp(dir=self.diretorio, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(dados)
+            os.replace(caminho_tmp, self._caminho(chave, sufixo))  # escrita atômica
+        finally:
+            self._remover(caminho_tmp)
+        self._aplicar_limite()
+
+    def _aplicar_limite(self):
+        """Remove as entradas menos usadas recentemente até caber no limite de tamanho."""
+        with self._lock:
+            entradas = []
+            total = 0
+            for nome in os.listdir(self.diretorio):
+                if nome.endswith(".tmp"):
+                    continue
+                caminho = os.path.join(self.diretorio, nome)
+                try:
+                    info = os.stat(caminho)
+                except OSError:
+                    continue
+                entradas.append((info.st_mtime, info.st_size, caminho))
+                total += info.st_size
+            entradas.sort()
+            for _, tamanho, caminho in entradas:
+                if total <= self.limite_bytes:
+                    break
+                self._remover(caminho)
+                total -= tamanho
+
+    @staticmethod
+    def _remover(caminho):
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+
+_cache_padrao = None
+
+
+def obter_cache():
+    """Retorna a instância de cache compartilhada pelo processo."""
+    global _cache_padrao
+    if _cache_padrao is None:
+        _cache_padrao = CacheExtracao()
+    return _cache_padrao
@@ -0,0 +1,375 @@
+"""
+Representação compacta, por sessão, dos DataFrames da análise e orçamento de memória.
+
+Cada sessão da aplicação guarda o consolidado das fichas e os recortes derivados
+dele (descontos filtrados, descontos x glossário, itens incluídos). Em vez de uma
+cópia completa de cada um, com todas as colunas como texto (object), o
+EstadoSessao guarda:
+
+  * a base (o consolidado) uma única vez, em forma compacta: colunas de texto
+    repetitivo (TIPO, DISCRIMINAÇÃO, CATEGORIA) como categóricas, meses como
+    centavos inteiros, ANO e PÁGINA como inteiros pequenos;
+  * cada recorte como as posições das suas linhas na base (int32) e apenas as
+    colunas novas (ex.: CATEGORIA), também compactas.
+
+A conversão é exata: ao ler, cada coluna volta ao texto original ("1826,97",
+"1.826,97", "2018", "" ou None); o separador de milhar é guardado por coluna. Uma coluna só é convertida se a volta reproduzir todos os
+seus valores; caso contrário, fica como está.
+
+O total em memória de todas as sessões do processo é limitado. Quando o limite é
+excedido, os dados das sessões usadas há mais tempo são descarregados em disco
+(pickle) e recarregados no próximo acesso; o arquivo é removido quando a sessão
+termina.
+
+Este estado fica em um módulo importado (e não em app5.py) para sobreviver às
+reexecuções do script pelo Streamlit.
+
+Configuração por variáveis de ambiente:
+  FICHA_SESSOES_MAX_MB   memória para os dados de todas as sessões (padrão: 256)
+  FICHA_SESSOES_DIR      diretório dos dados descarregados (padrão: <tmp>/ficha_sessoes)
+"""
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from valores import para_centavos
+
+LIMITE_PADRAO_MB = float(os.environ.get("FICHA_SESSOES_MAX_MB", "256"))
+DIRETORIO_PADRAO = os.environ.get(
+    "FICHA_SESSOES_DIR", os.path.join(tempfile.gettempdir(), "ficha_sessoes")
+)
+
+# Colunas de texto com menos valores distintos que esta fração das linhas viram categóricas
+_FRACAO_CATEGORICA = 0.5
+_REGEX_INTEIRO = r"^(?:0|[1-9]\d*)$"
+_REGEX_CENTAVOS = {
+    "": re.compile(r"-?(?:0|[1-9]\d*),\d\d"),
+    ".": re.compile(r"-?(?:0|[1-9]\d{0,2}(?:\.\d{3})*),\d\d"),
+}
+
+_lock = threading.Lock()
+_estados = weakref.WeakValueDictionary()
+
+
+def _int_menor(valores):
+    """Array de inteiros com o menor dtype que comporta os valores."""
+    if not len(valores):
+        return valores.astype(np.int8)
+    return valores.astype(np.result_type(np.min_scalar_type(int(valores.min())),
+                                         np.min_scalar_type(int(valores.max()))))
+
+
+class _ColunaTexto:
+    """
+    Coluna de texto numérico ("1826,97", "1.826,97" ou "2018") guardada como
+    inteiros, com máscaras de ausentes.
+    """
+
+    def __init__(self, inteiros, nulos, vazios, tipo, milhar=""):
+        self.inteiros = inteiros
+        self.nulos = nulos    # None/NaN no original
+        self.vazios = vazios  # "" no original
+        self.tipo = tipo      # "centavos" ou "inteiro"
+        self.milhar = milhar  # separador de milhar dos centavos ("" ou ".")
+
+    @classmethod
+    def tentar(cls, serie):
+        """Retorna a coluna compacta, ou None se algum valor não voltar idêntico."""
+        valores = serie.to_numpy(dtype=object)
+        nulos = pd.isna(valores)
+        textos = pd.Series(np.where(nulos, "", valores), dtype=object)
+        if pd.api.types.infer_dtype(textos, skipna=False) != "string":
+            return None
+        vazios = (textos == "").to_numpy() & ~nulos
+        preenchidos = ~(nulos | vazios)
+        if not preenchidos.any():
+            return None
+        amostra = textos[preenchidos]
+        for tipo, milhar in (("inteiro", ""), ("centavos", ""), ("centavos", ".")):
+            if tipo == "inteiro":
+                if not amostra.str.fullmatch(_REGEX_INTEIRO).all():
+                    continue
+                numeros = pd.to_numeric(amostra).astype(np.int64)
+            elif all(_REGEX_CENTAVOS[milhar].fullmatch(texto) for texto in amostra):
+                # Formato da ficha ("1826,97" ou "1.826,97"): conversão direta, bem mais
+                # rápida que para_centavos
+                numeros = pd.Series(
+                    [int(texto.replace(".", "").replace(",", "")) for texto in amostra], dtype=np.int64
+                )
+            elif milhar:
+                continue
+            else:
+                numeros = para_centavos(amostra)
+                if numeros.isna().any():
+                    continue
+                numeros = numeros.astype(np.int64)
+            inteiros = np.zeros(len(valores), dtype=np.int64)
+            inteiros[preenchidos] = numeros.to_numpy()
+            coluna = cls(_int_menor(inteiros), nulos, vazios, tipo, milhar)
+            if (coluna._textos()[preenchidos] == amostra.to_numpy()).all():
+                return coluna
+        return None
+
+    def _textos(self, posicoes=None):
+        """Texto dos valores preenchidos nas posições (None nas demais)."""
+        if posicoes is None:
+            posicoes = slice(None)
+        preenchidos = ~(self.nulos[posicoes] | self.vazios[posicoes])
+        inteiros = self.inteiros[posicoes][preenchidos].tolist()
+        textos = np.full(len(preenchidos), None, dtype=object)
+        if self.tipo == "inteiro":
+            textos[preenchidos] = [str(v) for v in inteiros]
+        elif self.milhar:
+            # Mesmo formato de formatar_brl ("1.826,97"), sem passar pelo pandas
+            textos[preenchidos] = [
+                ("-" if v < 0 else "") + f"{abs(v) // 100:,}".replace(",", ".") + f",{abs(v) % 100:02d}"
+                for v in inteiros
+            ]
+        else:
+            # Mesmo formato de formatar_centavos(separador_milhar=""), sem passar pelo pandas
+            textos[preenchidos] = [
+                f"-{-v // 100},{-v % 100:02d}" if v < 0 else f"{v // 100},{v % 100:02d}" for v in inteiros
+            ]
+        return textos
+
+    def valores(self, posicoes):
+        textos = self._textos(posicoes)
+        textos[self.vazios[posicoes]] = ""
+        return textos
+
+    @property
+    def nbytes(self):
+        return self.inteiros.nbytes + self.nulos.nbytes + self.vazios.nbytes
+
+
+class _ColunaCategorica:
+    """Texto repetitivo como códigos inteiros + categorias (None preservado)."""
+
+    def __init__(self, serie):
+        self.categorias = pd.Categorical(serie.to_numpy(dtype=object))
+
+    def valores(self, posicoes):
+        codigos = self.categorias.codes[posicoes]
+        valores = np.asarray(self.categorias.categories, dtype=object).take(np.maximum(codigos, 0))
+        valores[codigos < 0] = None
+        return valores
+
+    @property
+    def nbytes(self):
+        return int(self.categorias.codes.nbytes + self.categorias.categories.memory_usage(deep=True))
+
+
+class _ColunaBruta:
+    """Coluna mantida como está (numérica com dtype reduzido quando possível)."""
+
+    def __init__(self, serie):
+        self.dtype = serie.dtype
+        valores = serie.to_numpy()
+        if pd.api.types.is_integer_dtype(serie.dtype) and len(valores):
+            valores = _int_menor(valores)
+        self.dados = valores
+
+    def valores(self, posicoes):
+        return self.dados[posicoes].astype(self.dtype, copy=False)
+
+    @property
+    def nbytes(self):
+        if self.dados.dtype == object:
+            return int(pd.Series(self.dados, dtype=object).memory_usage(deep=True, index=False))
+        return self.dados.nbytes
+
+
+def _compactar_coluna(serie):
+    if serie.dtype == object:
+        coluna = _ColunaTexto.tentar(serie)
+        if coluna is not None:
+            return coluna
+        if serie.nunique(dropna=True) <= max(1, _FRACAO_CATEGORICA * len(serie)):
+            return _ColunaCategorica(serie)
+    return _ColunaBruta(serie)
+
+
+class DataFrameCompacto:
+    """DataFrame guardado coluna a coluna na forma compacta; `para_dataframe()` o reconstrói."""
+
+    def __init__(self, df):
+        self.colunas = list(df.columns)
+        self.indice = df.index
+        self.dados = {coluna: _compactar_coluna(df[coluna]) for coluna in self.colunas}
+
+    def __len__(self):
+        return len(self.indice)
+
+    def para_dataframe(self, posicoes=None, colunas=None) -> pd.DataFrame:
+        """As linhas nas `posicoes` (todas, se None) das `colunas` (todas, se None)."""
+        if posicoes is None:
+            posicoes = np.arange(len(self.indice))
+        colunas = self.colunas if colunas is None else colunas
+        return pd.DataFrame(
+            {coluna: self.dados[coluna].valores(posicoes) for coluna in colunas},
+            index=self.indice[posicoes], columns=colunas,
+        )
+
+    @property
+    def nbytes(self):
+        return sum(coluna.nbytes for coluna in self.dados.values()) + int(self.indice.memory_usage())
+
+
+class EstadoSessao:
+    """
+    Consolidado (`base`) e recortes derivados de uma sessão, identificados por
+    `chave` (ex.: hash das fichas). Os recortes devem ser subconjuntos de linhas da
+    base (mesmo índice), podendo ter colunas novas; recortes que não seguem isso
+    são guardados inteiros, também compactos.
+    """
+
+    def __init__(self, chave, df_base, diretorio=None):
+        self.chave = chave
+        self.diretorio = diretorio or DIRETORIO_PADRAO
+        self.ultimo_acesso = time.monotonic()
+        self._lock = threading.RLock()
+        self._dados = {"base": DataFrameCompacto(df_base), "recortes": {}}
+        self._arquivo = None
+        self._finalizador = None
+
+    # --- acesso -----------------------------------------------------------
+    def _carregar(self):
+        """Dados em memória (recarregados do disco, se tiverem sido descarregados)."""
+        self.ultimo_acesso = time.monotonic()
+        if self._dados is None:
+            with open(self._arquivo, "rb") as f:
+                self._dados = pickle.load(f)
+            self._descartar_arquivo()
+        return self._dados
+
+    def base(self) -> pd.DataFrame:
+        with self._lock:
+            return self._carregar()["base"].para_dataframe()
+
+    def guardar(self, nome, df):
+        """Guarda o recorte `nome` (None remove)."""
+        with self._lock:
+            dados = self._carregar()
+            if df is None:
+                dados["recortes"].pop(nome, None)
+                return
+            base = dados["base"]
+            posicoes = base.indice.get_indexer(df.index) if base.indice.is_unique else None
+            if posicoes is None or (posicoes < 0).any():
+                dados["recortes"][nome] = ("inteiro", DataFrameCompacto(df))
+            else:
+                novas = [c for c in df.columns if c not in base.colunas]
+                extras = DataFrameCompacto(df[novas].reset_index(drop=True)) if novas else None
+                dados["recortes"][nome] = ("posicoes", _int_menor(posicoes), list(df.columns), extras)
+        _aplicar_limite(self)
+
+    def obter(self, nome):
+        """O recorte `nome` reconstruído como DataFrame, ou None."""
+        with self._lock:
+            dados = self._carregar()
+            recorte = dados["recortes"].get(nome)
+            if recorte is None:
+                return None
+            if recorte[0] == "inteiro":
+                return recorte[1].para_dataframe()
+            _, posicoes, colunas, extras = recorte
+            base = dados["base"]
+            df = base.para_dataframe(posicoes, [c for c in colunas if c in base.colunas])
+            if extras is not None:
+                for coluna, valores in extras.para_dataframe().items():
+                    df[coluna] = valores.to_numpy()
+            return df[colunas]
+
+    # --- memória ----------------------------------------------------------
+    @property
+    def em_memoria(self):
+        return self._dados is not None
+
+    @property
+    def nbytes(self):
+        """Bytes em memória (0 se descarregado)."""
+        dados = self._dados
+        if dados is None:
+            return 0
+        total = dados["base"].nbytes
+        for recorte in dados["recortes"].values():
+            if recorte[0] == "inteiro":
+                total += recorte[1].nbytes
+            else:
+                total += recorte[1].nbytes + (recorte[3].nbytes if recorte[3] is not None else 0)
+        return total
+
+    def descarregar(self):
+        """Grava os dados em disco e os libera da memória (recarregados no próximo acesso)."""
+        with self._lock:
+            if self._dados is None:
+                return
+            os.makedirs(self.diretorio, exist_ok=True)
+            fd, caminho = tempfile.mkstemp(dir=self.diretorio, suffix=".pkl")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self._dados, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._arquivo = caminho
+            self._finalizador = weakref.finalize(self, _remover_arquivo, caminho)
+            self._dados = None
+
+    def _descartar_arquivo(self):
+        if self._finalizador is not None:
+            self._finalizador()  # remove o arquivo
+        self._arquivo = None
+        self._finalizador = None
+
+
+def _remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def _aplicar_limite(atual=None, limite_mb=None):
+    """Descarrega as sessões usadas há mais tempo (exceto a atual) até caber no limite."""
+    limite = (LIMITE_PADRAO_MB if limite_mb is None else limite_mb) * 2**20
+    with _lock:
+        estados = [e for e in list(_estados.values()) if e.em_memoria]
+    total = sum(e.nbytes for e in estados)
+    for estado in sorted(estados, key=lambda e: e.ultimo_acesso):
+        if total <= limite:
+            break
+        if estado is atual:
+            continue
+        total -= estado.nbytes
+        estado.descarregar()
+
+
+def obter_estado(estado_atual, chave, df_base) -> EstadoSessao:
+    """
+    Retorna o estado da sessão para a chave: o atual, se for da mesma chave, ou um
+    novo com `df_base` (registrado no orçamento de memória do processo).
+    """
+    if estado_atual is not None and estado_atual.chave == chave:
+        estado_atual.ultimo_acesso = time.monotonic()
+        return estado_atual
+    estado = EstadoSessao(chave, df_base)
+    with _lock:
+        _estados[id(estado)] = estado
+    _aplicar_limite(estado)
+    return estado
+
+
+def uso_memoria() -> dict:
+    """Sessões registradas, quantas estão em memória e o total em MB."""
+    with _lock:
+        estados = list(_estados.values())
+    em_memoria = [e for e in estados if e.em_memoria]
+    return {
+        "sessoes": len(estados),
+        "em_memoria": len(em_memoria),
+        "memoria_mb": round(sum(e.nbytes for e in em_memoria) / 2**20, 2),
+    }
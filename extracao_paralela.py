@@ -0,0 +1,148 @@
+"""
+Leitura das tabelas do PDF com Camelot (flavor 'lattice'), opcionalmente
+distribuída por faixas de páginas em um pool de processos.
+
+A detecção de linhas do Camelot (OpenCV) é limitada por CPU e roda em um único
+núcleo quando chamada com pages="all". Aqui as páginas são divididas em faixas
+contíguas, cada faixa é processada por um worker e os resultados são devolvidos
+na ordem das páginas, exatamente como a leitura serial.
+
+O número de workers vem do parâmetro `workers` ou da variável de ambiente
+FICHA_WORKERS (padrão: 1, leitura serial).
+
+As funções executadas nos workers ficam neste módulo (e não em app5.py) porque
+precisam ser importáveis pelos processos filhos.
+
+Os pools são criados a partir de threads (fila de tarefas, servidor do
+Streamlit); um fork de um processo com várias threads pode herdar travas em uso
+(logging, importações, BLAS) e travar o filho. Por isso os processos partem de um
+servidor forkserver (spawn onde ele não existe), que já importa o Camelot
+(`contexto_processos`).
+"""
+import math
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+
+WORKERS_PADRAO = int(os.environ.get("FICHA_WORKERS", "1"))
+
+# Cada worker recebe algumas faixas, para equilibrar páginas mais pesadas
+_FAIXAS_POR_WORKER = 4
+
+# Módulos importados uma vez pelo forkserver e herdados pelos workers
+_PRE_CARGA = ["extracao_paralela", "camelot"]
+
+_lock = threading.Lock()
+_contexto = None
+
+
+def contexto_processos():
+    """
+    Contexto de multiprocessing dos pools de processos (Camelot e OCR): forkserver,
+    com _PRE_CARGA, ou spawn onde o forkserver não existe (ex.: Windows).
+    """
+    global _contexto
+    with _lock:
+        if _contexto is None:
+            if "forkserver" in multiprocessing.get_all_start_methods():
+                _contexto = multiprocessing.get_context("forkserver")
+                _contexto.set_forkserver_preload(_PRE_CARGA)
+            else:
+                _contexto = multiprocessing.get_context("spawn")
+        return _contexto
+
+
+def _ler_faixa(caminho, paginas):
+    """Lê as tabelas de uma faixa de páginas ('1-5', 'all', ...) e retorna [(página, DataFrame)]."""
+    import camelot
+    tables = camelot.read_pdf(caminho, pages=paginas, flavor="lattice")
+    return [(int(table.page), table.df) for table in tables]
+
+
+def formatar_paginas(paginas):
+    """Converte uma lista de páginas no formato do Camelot, compactando sequências ([1,2,3,5] -> '1-3,5')."""
+    partes = []
+    paginas = sorted(paginas)
+    i = 0
+    while i < len(paginas):
+        j = i
+        while j + 1 < len(paginas) and paginas[j + 1] == paginas[j] + 1:
+            j += 1
+        partes.append(str(paginas[i]) if i == j else f"{paginas[i]}-{paginas[j]}")
+        i = j + 1
+    return ",".join(partes)
+
+
+def dividir_em_faixas(paginas, workers):
+    """Divide a lista de páginas em faixas contíguas no formato do Camelot ('ini-fim')."""
+    paginas = sorted(paginas)
+    if not paginas:
+        return []
+    tamanho = max(1, math.ceil(len(paginas) / (workers * _FAIXAS_POR_WORKER)))
+    return [formatar_paginas(paginas[i:i + tamanho]) for i in range(0, len(paginas), tamanho)]
+
+
+def resolver_workers(workers=None):
+    """Normaliza o número de workers (None -> FICHA_WORKERS; 0 ou negativo -> todos os núcleos)."""
+    if workers is None:
+        workers = WORKERS_PADRAO
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def ler_tabelas(caminho, paginas=None, workers=None):
+    """
+    Retorna as tabelas do PDF como lista de (página, DataFrame), em ordem de página.
+    `paginas` é a lista de páginas a ler (None = todas). Com um único worker
+    (ou uma única página), faz a leitura serial em uma só chamada ao Camelot.
+    """
+    if paginas is not None and not paginas:
+        return []
+    workers = resolver_workers(workers)
+    if workers <= 1 or paginas is None or len(paginas) <= 1:
+        return _ler_faixa(caminho, "all" if paginas is None else formatar_paginas(paginas))
+
+    faixas = dividir_em_faixas(paginas, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(faixas)), mp_context=contexto_processos()) as executor:
+        # executor.map preserva a ordem das faixas, logo a ordem das páginas
+        resultados = executor.map(_ler_faixa, repeat(caminho), faixas)
+        return [tabela for resultado in resultados for tabela in resultado]
+
+
+def iterar_tabelas(caminho, paginas, workers=None):
+    """
+    Como `ler_tabelas`, mas entrega as tabelas à medida que são lidas, em ordem de
+    página: na leitura serial, uma página por vez; com vários workers, a cada faixa
+    concluída (as faixas seguintes continuam sendo lidas em paralelo).
+
+    As faixas são submetidas aos poucos (até duas por worker em andamento). Se o
+    gerador for fechado antes do fim (ex.: cancelamento), as faixas ainda não
+    iniciadas são descartadas e o fechamento não espera pelas que estão em leitura.
+    """
+    paginas = sorted(paginas)
+    if not paginas:
+        return
+    workers = resolver_workers(workers)
+    if workers <= 1 or len(paginas) <= 1:
+        for pagina in paginas:
+            yield from _ler_faixa(caminho, str(pagina))
+        return
+
+    faixas = dividir_em_faixas(paginas, workers)
+    workers = min(workers, len(faixas))
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=contexto_processos())
+    try:
+        restantes = iter(faixas)
+        # Futuros na ordem das faixas, logo na ordem das páginas
+        em_leitura = deque(executor.submit(_ler_faixa, caminho, faixa) for faixa in islice(restantes, 2 * workers))
+        while em_leitura:
+            resultado = em_leitura.popleft().result()
+            for faixa in islice(restantes, 1):
+                em_leitura.append(executor.submit(_ler_faixa, caminho, faixa))
+            yield from resultado
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,277 @@
+"""
+Correspondência aproximada (fuzzy) entre as DISCRIMINAÇÕES da ficha e o glossário
+de rubricas.
+
+A pontuação de cada descrição é o maior `fuzz.ratio` contra o glossário, calculado
+em lote pela matriz descrições x glossário (`rapidfuzz.process.cdist`, com vários
+threads). O resultado fica memorizado no processo por descrição normalizada e por
+glossário, de modo que descrições repetidas entre clientes não são pontuadas de
+novo e mudar o nível de similaridade é apenas uma máscara sobre as pontuações.
+
+O ClassificadorGlossario une vários glossários (Rubricas.txt e Tarifas.txt), cada
+um com sua categoria. Os termos são normalizados (sem acentos, maiúsculos) e
+indexados por trigramas de caracteres; cada descrição é comparada apenas com os
+termos candidatos que compartilham trigramas com ela, e recebe a categoria do
+termo mais próximo. Os pares (descrição, candidato) de todas as descrições
+são pontuados em lote (`rapidfuzz.process.cpdist`, com vários threads).
+
+Este estado fica em um módulo importado (e não em app5.py) para sobreviver às
+reexecuções do script pelo Streamlit. Só os MAX_GLOSSARIOS_MEMORIZADOS glossários
+usados mais recentemente são mantidos (classificador e pontuações): editar um
+glossário não deixa as versões anteriores na memória.
+"""
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+import pandas as pd
+
+CATEGORIA_RUBRICA = "Cartão/Empréstimo (rubrica)"
+CATEGORIA_TARIFA = "Tarifa/Associação"
+
+# Máximo de termos candidatos (por sobreposição de trigramas) pontuados por descrição
+MAX_CANDIDATOS = 50
+# Glossários até este tamanho são pontuados pela matriz descrições x termos (cdist), mais
+# rápida que montar os pares com os candidatos; acima dele, só os pares (cpdist)
+MAX_TERMOS_MATRIZ = 1000
+_CELULAS_BLOCO = 1 << 22  # células por bloco da matriz (limita a memória)
+
+# Glossários (versões) com classificador e pontuações memorizados; os menos usados saem
+MAX_GLOSSARIOS_MEMORIZADOS = 4
+
+_memo_pontuacoes = OrderedDict()
+_classificadores = OrderedDict()
+_lock = threading.Lock()
+
+
+def normalizar_descricao(texto) -> str:
+    """Remove espaços nas pontas e colapsa espaços internos repetidos."""
+    return " ".join(str(texto).split())
+
+
+def normalizar_termo(texto) -> str:
+    """Remove acentos, converte para maiúsculas e colapsa espaços."""
+    sem_acentos = unicodedata.normalize("NFKD", str(texto))
+    sem_acentos = "".join(c for c in sem_acentos if not unicodedata.combining(c))
+    return " ".join(sem_acentos.upper().split())
+
+
+def ngramas(texto_normalizado, n=3):
+    """Trigramas de caracteres de cada palavra (com espaço nas bordas), sem repetição."""
+    gramas = set()
+    for palavra in texto_normalizado.split():
+        palavra = f" {palavra} "
+        gramas.update(palavra[i:i + n] for i in range(len(palavra) - n + 1))
+    return gramas
+
+
+def _memorizado(memoria, chave, criar):
+    """
+    Valor de `chave` em `memoria` (OrderedDict, do menos ao mais usado), criado com
+    `criar()` se ausente; descarta os mais antigos além de MAX_GLOSSARIOS_MEMORIZADOS.
+    Chamar com _lock.
+    """
+    valor = memoria.get(chave)
+    if valor is None:
+        valor = memoria[chave] = criar()
+        while len(memoria) > MAX_GLOSSARIOS_MEMORIZADOS:
+            memoria.popitem(last=False)
+    else:
+        memoria.move_to_end(chave)
+    return valor
+
+
+def assinatura_glossario(glossario) -> str:
+    """Identificador estável do conteúdo do glossário (para a memória de pontuações)."""
+    return hashlib.sha256("\n".join(glossario).encode("utf-8")).hexdigest()
+
+
+def pontuar_descricoes(descricoes, glossario, workers=-1) -> pd.DataFrame:
+    """
+    Retorna DataFrame indexado pelas descrições únicas com as colunas SCORE
+    (maior similaridade com o glossário, 0 a 100) e RUBRICA (termo mais próximo).
+    Apenas as descrições ainda não vistas com este glossário são pontuadas.
+    """
+    unicas = pd.unique(pd.Series(list(descricoes), dtype=object))
+    if not len(unicas) or not glossario:
+        return pd.DataFrame({"SCORE": 0.0, "RUBRICA": None}, index=pd.Index(unicas, dtype=object))
+
+    with _lock:
+        memo = _memorizado(_memo_pontuacoes, assinatura_glossario(glossario), dict)
+    normalizadas = [normalizar_descricao(d) for d in unicas]
+    faltantes = list(dict.fromkeys(n for n in normalizadas if n not in memo))
+    if faltantes:
+        from rapidfuzz import fuzz, process  # importado no primeiro uso (aquecimento.py)
+
+        matriz = process.cdist(faltantes, glossario, scorer=fuzz.ratio, workers=workers)
+        melhores = matriz.argmax(axis=1)
+        with _lock:
+            for i, desc in enumerate(faltantes):
+                memo[desc] = (float(matriz[i, melhores[i]]), glossario[melhores[i]])
+
+    return pd.DataFrame(
+        [memo[n] for n in normalizadas], columns=["SCORE", "RUBRICA"], index=pd.Index(unicas, dtype=object)
+    )
+
+
+class ClassificadorGlossario:
+    """
+    Classificador das DISCRIMINAÇÕES sobre vários glossários com categoria.
+
+    `glossarios` é um dicionário categoria -> lista de termos (na ordem de
+    prioridade: um termo presente em mais de um glossário fica com a primeira
+    categoria). As pontuações ficam memorizadas por descrição normalizada;
+    `assinatura` identifica o conteúdo dos glossários.
+    """
+
+    def __init__(self, glossarios, max_candidatos=MAX_CANDIDATOS):
+        self.max_candidatos = max_candidatos
+        self.termos = []
+        self.originais = []
+        self.categorias = []
+        vistos = set()
+        for categoria, termos in glossarios.items():
+            for termo in termos:
+                normalizado = normalizar_termo(termo)
+                if not normalizado or normalizado in vistos:
+                    continue
+                vistos.add(normalizado)
+                self.termos.append(normalizado)
+                self.originais.append(str(termo).strip())
+                self.categorias.append(categoria)
+        # Identifica o conteúdo (termos e categorias) para quem guarda pontuações fora daqui
+        self.assinatura = assinatura_glossario(
+            [f"{categoria}\t{termo}" for categoria, termo in zip(self.categorias, self.originais)]
+        )
+
+        # Índice invertido: trigrama -> ids dos termos que o contêm
+        indice = defaultdict(list)
+        self._num_gramas = np.zeros(len(self.termos), dtype=np.int32)
+        for i, termo in enumerate(self.termos):
+            gramas = ngramas(termo)
+            self._num_gramas[i] = len(gramas)
+            for grama in gramas:
+                indice[grama].append(i)
+        self._indice = {g: np.array(ids, dtype=np.int32) for g, ids in indice.items()}
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.termos)
+
+    def __getstate__(self):
+        # O lock não é serializável (envio aos workers do processamento em lote)
+        estado = self.__dict__.copy()
+        del estado["_lock"]
+        return estado
+
+    def __setstate__(self, estado):
+        self.__dict__.update(estado)
+        self._lock = threading.Lock()
+
+    def como_dataframe(self):
+        """Termos do glossário com sua categoria (para exibição)."""
+        return pd.DataFrame({"TERMO": self.originais, "CATEGORIA": self.categorias})
+
+    def candidatos(self, descricao_normalizada):
+        """Ids dos termos plausíveis, ordenados pela sobreposição de trigramas (Dice)."""
+        gramas = ngramas(descricao_normalizada)
+        listas = [self._indice[g] for g in gramas if g in self._indice]
+        if not listas:
+            return np.empty(0, dtype=np.int32)
+        comuns = np.bincount(np.concatenate(listas), minlength=len(self.termos))
+        ids = np.flatnonzero(comuns)
+        if len(ids) > self.max_candidatos:
+            dice = 2 * comuns[ids] / (len(gramas) + self._num_gramas[ids])
+            ids = ids[np.argsort(-dice, kind="stable")[:self.max_candidatos]]
+        return ids
+
+    def _pontuar_lote(self, descricoes_normalizadas, workers=-1):
+        """
+        (SCORE, RUBRICA, CATEGORIA) de cada descrição contra os seus candidatos. Os
+        pares (descrição, candidato) são pontuados em lote, com vários threads: lidos
+        da matriz descrições x termos (`cdist`, em blocos) em glossários pequenos, ou
+        pontuados diretamente (`cpdist`). Vale o primeiro candidato com a maior
+        pontuação, como no `extractOne` sobre os candidatos.
+        """
+        from rapidfuzz import fuzz, process  # importado no primeiro uso (aquecimento.py)
+
+        grupos = [self.candidatos(d) for d in descricoes_normalizadas]
+        tamanhos = np.array([len(g) for g in grupos], dtype=np.int64)
+        resultados = [(0.0, None, None)] * len(grupos)
+        com_candidatos = np.flatnonzero(tamanhos)
+        if not len(com_candidatos):
+            return resultados
+
+        ids = np.concatenate(grupos)
+        consultas = np.repeat(np.arange(len(grupos)), tamanhos)
+        if len(self.termos) <= MAX_TERMOS_MATRIZ:
+            scores = np.empty(len(ids), dtype=np.float64)
+            linhas_bloco = max(1, _CELULAS_BLOCO // len(self.termos))
+            for inicio in range(0, len(grupos), linhas_bloco):
+                fim = min(inicio + linhas_bloco, len(grupos))
+                matriz = process.cdist(
+                    descricoes_normalizadas[inicio:fim], self.termos,
+                    scorer=fuzz.ratio, dtype=np.float64, workers=workers,
+                )
+                a, b = np.searchsorted(consultas, [inicio, fim])
+                scores[a:b] = matriz[consultas[a:b] - inicio, ids[a:b]]
+        else:
+            scores = process.cpdist(
+                [descricoes_normalizadas[i] for i in consultas], [self.termos[j] for j in ids],
+                scorer=fuzz.ratio, dtype=np.float64, workers=workers,
+            )
+        # Maior pontuação de cada descrição e a primeira posição que a atinge
+        inicios = (np.cumsum(tamanhos) - tamanhos)[com_candidatos]
+        maximos = np.maximum.reduceat(scores, inicios)
+        posicoes = np.where(scores == np.repeat(maximos, tamanhos[com_candidatos]), np.arange(len(scores)), len(scores))
+        primeiras = np.minimum.reduceat(posicoes, inicios)
+        for i, score, pos in zip(com_candidatos, maximos, primeiras):
+            melhor = ids[pos]
+            resultados[i] = (float(score), self.originais[melhor], self.categorias[melhor])
+        return resultados
+
+    def pontuar(self, descricoes, workers=-1) -> pd.DataFrame:
+        """
+        Retorna DataFrame indexado pelas descrições únicas com SCORE (0 a 100),
+        RUBRICA (termo mais próximo) e CATEGORIA.
+        """
+        unicas = pd.unique(pd.Series(list(descricoes), dtype=object))
+        normalizadas = [normalizar_termo(d) for d in unicas]
+        faltantes = [d for d in dict.fromkeys(normalizadas) if d not in self._memo]
+        if faltantes:
+            resultados = self._pontuar_lote(faltantes, workers)
+            with self._lock:
+                self._memo.update(zip(faltantes, resultados))
+        return pd.DataFrame(
+            [self._memo[n] for n in normalizadas],
+            columns=["SCORE", "RUBRICA", "CATEGORIA"],
+            index=pd.Index(unicas, dtype=object),
+        )
+
+
+def obter_classificador(glossarios) -> ClassificadorGlossario:
+    """
+    Retorna o classificador (compartilhado pelo processo) para os glossários dados,
+    construindo o índice apenas na primeira vez para o mesmo conteúdo.
+    """
+    chave = assinatura_glossario(
+        [f"{categoria}\t{termo}" for categoria, termos in glossarios.items() for termo in termos]
+    )
+    with _lock:
+        classificador = _classificadores.get(chave)
+        if classificador is not None:
+            _classificadores.move_to_end(chave)
+            return classificador
+    classificador = ClassificadorGlossario(glossarios)
+    with _lock:
+        return _memorizado(_classificadores, chave, lambda: classificador)
+
+
+def limpar_memoria():
+    """Descarta as pontuações e classificadores memorizados (ex.: troca de glossário)."""
+    with _lock:
+        _memo_pontuacoes.clear()
+        _classificadores.clear()
@@ -0,0 +1,178 @@
+"""
+Medição de cada etapa do processamento de uma ficha financeira.
+
+Cada etapa registra o tempo de relógio (wall), o tempo de CPU do processo, o pico
+de memória residente (RSS) durante a etapa e o número de linhas processadas. Os
+registros de um mesmo documento compartilham um identificador de correlação, que
+permite seguir no log todas as etapas (e reexecuções) de uma ficha.
+
+Os registros ficam na MedicaoDocumento (exibidos no painel lateral da aplicação)
+e são acrescentados, um JSON por linha, ao arquivo de log:
+
+  {"ts": "...", "id_correlacao": "...", "documento": "<sha256>", "origem": "streamlit",
+   "etapa": "extrair_tabelas", "status": "ok", "wall_s": 1.23, "cpu_s": 0.98,
+   "rss_pico_mb": 412.5, "rss_inicio_mb": 380.1, "linhas": 1200}
+
+O pico de RSS é amostrado por uma thread enquanto a etapa roda e vale para este
+processo; a memória dos workers do Camelot (processos separados) não entra na conta.
+
+Configuração por variáveis de ambiente:
+  FICHA_LOG_ETAPAS     arquivo de log (padrão: <tmp>/ficha_etapas.jsonl; vazio desativa)
+  FICHA_LOG_MAX_MB     tamanho a partir do qual o log é rotacionado para .1 (padrão: 50)
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CAMINHO_LOG_PADRAO = os.environ.get(
+    "FICHA_LOG_ETAPAS", os.path.join(tempfile.gettempdir(), "ficha_etapas.jsonl")
+)
+LIMITE_LOG_MB = float(os.environ.get("FICHA_LOG_MAX_MB", "50"))
+
+INTERVALO_AMOSTRAGEM = 0.02  # segundos entre leituras do RSS
+
+_lock_log = threading.Lock()
+_TAMANHO_PAGINA = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_atual_mb():
+    """RSS atual do processo em MB (None se não for possível obtê-lo)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _TAMANHO_PAGINA / 2**20
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Fora do Linux, usa o pico do processo inteiro (ru_maxrss em bytes no macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**20
+    return None
+
+
+class _AmostradorRss(threading.Thread):
+    """Lê o RSS periodicamente e guarda o maior valor até ser parada."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.pico = rss_atual_mb()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(INTERVALO_AMOSTRAGEM):
+            atual = rss_atual_mb()
+            if atual is not None and (self.pico is None or atual > self.pico):
+                self.pico = atual
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        atual = rss_atual_mb()
+        if atual is not None and (self.pico is None or atual > self.pico):
+            self.pico = atual
+        return self.pico
+
+
+def novo_id_correlacao() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def gravar_log(registro, caminho=None):
+    """Acrescenta o registro (dict) como uma linha JSON ao log, rotacionando-o se necessário."""
+    caminho = CAMINHO_LOG_PADRAO if caminho is None else caminho
+    if not caminho:
+        return
+    linha = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+    with _lock_log:
+        try:
+            if os.path.getsize(caminho) > LIMITE_LOG_MB * 2**20:
+                os.replace(caminho, caminho + ".1")
+        except OSError:
+            pass
+        with open(caminho, "a", encoding="utf-8") as f:
+            f.write(linha)
+
+
+class MedicaoDocumento:
+    """
+    Registros das etapas de um documento, com um identificador de correlação.
+
+    `documento` identifica a ficha no log (ex.: SHA-256 do PDF) e `origem` indica
+    quem a processou ("streamlit", "lote"). Com `caminho_log=False`, os registros
+    ficam só em memória. Para cada nome de etapa é mantido o registro mais recente
+    (reexecuções do Streamlit substituem o anterior; o log guarda todos).
+    """
+
+    def __init__(self, documento="", origem="streamlit", id_correlacao=None, caminho_log=None):
+        self.documento = documento
+        self.origem = origem
+        self.id_correlacao = id_correlacao or novo_id_correlacao()
+        self.caminho_log = caminho_log
+        self.registros = {}
+        self._lock = threading.Lock()  # etapas podem rodar em outra thread (fila de tarefas)
+
+    @contextmanager
+    def etapa(self, nome, linhas=None):
+        """
+        Mede o bloco como a etapa `nome`. O registro é entregue ao bloco, que pode
+        informar as linhas processadas depois de calculá-las (registro["linhas"] = n).
+        Exceções são registradas (status "erro") e propagadas.
+        """
+        registro = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "id_correlacao": self.id_correlacao,
+            "documento": self.documento,
+            "origem": self.origem,
+            "etapa": nome,
+            "linhas": linhas,
+        }
+        amostrador = _AmostradorRss()
+        registro["rss_inicio_mb"] = amostrador.pico
+        amostrador.start()
+        inicio_wall = time.perf_counter()
+        inicio_cpu = time.process_time()
+        try:
+            yield registro
+            registro["status"] = "ok"
+        except BaseException as e:
+            registro["status"] = "erro"
+            registro["erro"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            registro["wall_s"] = round(time.perf_counter() - inicio_wall, 4)
+            registro["cpu_s"] = round(time.process_time() - inicio_cpu, 4)
+            pico = amostrador.parar()
+            registro["rss_pico_mb"] = round(pico, 1) if pico is not None else None
+            if registro["rss_inicio_mb"] is not None:
+                registro["rss_inicio_mb"] = round(registro["rss_inicio_mb"], 1)
+            with self._lock:
+                self.registros.pop(nome, None)
+                self.registros[nome] = registro
+            if self.caminho_log is not False:
+                try:
+                    gravar_log(registro, self.caminho_log)
+                except OSError:
+                    pass  # o log nunca interrompe o processamento
+
+    def como_dataframe(self) -> pd.DataFrame:
+        """Último registro de cada etapa, na ordem em que foram executadas."""
+        colunas = ["etapa", "status", "wall_s", "cpu_s", "rss_pico_mb", "linhas"]
+        with self._lock:
+            registros = list(self.registros.values())
+        df = pd.DataFrame(registros, columns=colunas)
+        df["linhas"] = df["linhas"].astype("Int64")
+        return df
+
+    def total_wall(self) -> float:
+        with self._lock:
+            return round(sum(r["wall_s"] for r in self.registros.values()), 4)
@@ -0,0 +1,250 @@
+"""
+Processamento em lote (sem interface) de fichas financeiras.
+
+Uso:
+    python lote.py ENTRADA [ENTRADA ...] -o SAIDA [--workers N] [--threshold 85]
+                   [--backend camelot|texto] [--glossario Rubricas.txt]
+                   [--tarifas Tarifas.txt] [--valor-recebido 0] [--banco fichas.sqlite3]
+                   [--ocr]
+
+ENTRADA pode ser um diretório (todos os *.pdf, recursivamente), um arquivo PDF ou
+um padrão glob (ex.: "fichas/2024-*.pdf"). Cada ficha passa pelo mesmo fluxo da
+aplicação Streamlit (app5.processar_ficha) e gera, em SAIDA/<servidor>_<hash>/:
+  consolidado.csv                          DataFrame consolidado (todas as colunas + ANO)
+  extrato_financeiro_unico.pdf             PDF do consolidado
+  descontos_finais.csv                     descontos filtrados pelo glossário + totais
+                                           (rubricas e tarifas/associações)
+  Descontos_Finais_Cronologico.pdf/.docx   relatório final
+
+Com --ocr, as páginas sem camada de texto (fichas digitalizadas) passam pelo OCR
+(ocr_paginas.py) antes da extração.
+
+O consolidado e os descontos finais também são acumulados no armazenamento SQLite
+(--banco; armazenamento.py), para consultas entre clientes.
+
+O manifesto SAIDA/manifesto.json registra o estado de cada ficha (pela chave de
+extração: SHA-256 do arquivo, versão do formato, backend, OCR e triagem); ao reexecutar, as fichas já concluídas
+com as mesmas opções são ignoradas. As falhas são
+listadas em SAIDA/erros.csv, uma linha por arquivo. O tempo, a CPU e a memória de
+cada etapa vão para o log de etapas (instrumentacao.py), identificados pelo
+id_correlacao registrado no manifesto.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import app5
+from armazenamento import CAMINHO_PADRAO as BANCO_PADRAO, obter_armazenamento, periodos_consolidado
+from cache_extracao import chave_extracao, hash_arquivo
+from instrumentacao import MedicaoDocumento
+
+DIRETORIO_APP = os.path.dirname(os.path.abspath(__file__))
+TITULO_RELATORIO = "Descontos Finais"
+
+
+def listar_pdfs(entradas):
+    """Expande diretórios e padrões glob em uma lista ordenada de PDFs, sem repetições."""
+    encontrados = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            candidatos = glob.glob(os.path.join(entrada, "**", "*.pdf"), recursive=True)
+            candidatos += glob.glob(os.path.join(entrada, "**", "*.PDF"), recursive=True)
+        else:
+            candidatos = glob.glob(entrada, recursive=True)
+        encontrados.extend(c for c in candidatos if c.lower().endswith(".pdf") and os.path.isfile(c))
+    return sorted({os.path.abspath(c) for c in encontrados})
+
+
+def carregar_manifesto(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def gravar_manifesto(caminho, manifesto):
+    """Grava o manifesto de forma atômica (arquivo temporário + rename)."""
+    fd, caminho_tmp = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(caminho_tmp, caminho)
+
+
+def gravar_relatorio_erros(caminho, manifesto):
+    with open(caminho, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["arquivo", "sha256", "erro"])
+        for chave, item in sorted(manifesto.items(), key=lambda kv: kv[1]["arquivo"]):
+            if item["status"] == "erro":
+                writer.writerow([item["arquivo"], item.get("sha256", chave), item["erro"]])
+
+
+def processar_arquivo(caminho, chave, diretorio_saida, opcoes):
+    """
+    Processa uma ficha (executado nos workers) e grava seus arquivos de saída.
+    Retorna o registro do manifesto para o arquivo; nunca levanta exceção.
+    """
+    inicio = time.time()
+    # As etapas de cada ficha vão para o log JSON lines (FICHA_LOG_ETAPAS) com um id próprio
+    medicao = MedicaoDocumento(chave, origem="lote")
+    registro = {"arquivo": caminho, "sha256": chave, "id_correlacao": medicao.id_correlacao}
+    try:
+        # Arquivo mapeado em memória: hash e texto sem copiar o PDF para o processo
+        with app5.DocumentoFicha(caminho, workers=1, backend=opcoes["backend"], mapear=True,
+                                ocr=opcoes["ocr"]) as documento:
+            resultado = app5.processar_ficha(
+                documento,
+                opcoes["rubricas"],
+                threshold=opcoes["threshold"],
+                valor_recebido=opcoes["valor_recebido"],
+                medicao=medicao,
+            )
+        nome_cliente = resultado["nome_servidor"]
+        if nome_cliente == "N/D":
+            nome_cliente = resultado["nome"]
+        pasta = os.path.join(
+            diretorio_saida, f"{app5.sanitizar_para_arquivo(nome_cliente)}_{chave[:12]}"
+        )
+        os.makedirs(pasta, exist_ok=True)
+
+        resultado["df_consolidado"].to_csv(
+            os.path.join(pasta, "consolidado.csv"), index=False, encoding="utf-8-sig"
+        )
+        with medicao.etapa("salvar_em_pdf", linhas=len(resultado["df_consolidado"])):
+            app5.salvar_em_pdf(resultado["df_consolidado"], os.path.join(pasta, "extrato_financeiro_unico.pdf"))
+
+        df_com_totais = resultado["df_com_totais"]
+        df_com_totais.to_csv(os.path.join(pasta, "descontos_finais.csv"), index=False, encoding="utf-8-sig")
+        with medicao.etapa("gerar_pdf_descontos_finais", linhas=len(df_com_totais)):
+            pdf_final = app5.gerar_pdf_descontos_finais(df_com_totais, TITULO_RELATORIO)
+        with open(os.path.join(pasta, "Descontos_Finais_Cronologico.pdf"), "wb") as f:
+            f.write(pdf_final)
+        with medicao.etapa("df_to_docx_bytes", linhas=len(df_com_totais)):
+            docx_final = app5.df_to_docx_bytes(df_com_totais, TITULO_RELATORIO)
+        with open(os.path.join(pasta, "Descontos_Finais_Cronologico.docx"), "wb") as f:
+            f.write(docx_final)
+
+        if opcoes.get("banco"):
+            with medicao.etapa("gravar_armazenamento", linhas=len(resultado["df_consolidado"])):
+                armazenamento = obter_armazenamento(opcoes["banco"])
+                armazenamento.gravar_consolidado(
+                    resultado["df_consolidado"], chave, matricula=resultado["matricula"],
+                    cpf=resultado["cpf"], nome=nome_cliente,
+                )
+                categorias = resultado["df_gloss"].drop_duplicates("DISCRIMINAÇÃO").set_index("DISCRIMINAÇÃO")
+                armazenamento.gravar_descontos(
+                    df_com_totais.assign(CATEGORIA=df_com_totais["DISCRIMINAÇÃO"].map(
+                        categorias["CATEGORIA"] if "CATEGORIA" in categorias.columns else {}
+                    )),
+                    chave, matricula=resultado["matricula"], valor_recebido=opcoes["valor_recebido"],
+                    periodos=periodos_consolidado(resultado["df_consolidado"]),
+                )
+
+        registro.update({
+            "status": "ok",
+            "saida": pasta,
+            "nome": nome_cliente,
+            "matricula": resultado["matricula"],
+            "linhas_consolidado": int(len(resultado["df_consolidado"])),
+            "linhas_descontos": int(len(resultado["df_gloss"])),
+        })
+    except Exception as e:
+        registro.update({"status": "erro", "erro": f"{type(e).__name__}: {e}"})
+    registro["segundos"] = round(time.time() - inicio, 3)
+    return registro
+
+
+def executar_lote(pdfs, diretorio_saida, opcoes, workers=1, reprocessar=False):
+    """
+    Processa a lista de PDFs, atualizando o manifesto a cada ficha concluída.
+    Retorna o manifesto final.
+    """
+    os.makedirs(diretorio_saida, exist_ok=True)
+    caminho_manifesto = os.path.join(diretorio_saida, "manifesto.json")
+    manifesto = carregar_manifesto(caminho_manifesto)
+
+    pendentes = []
+    for caminho in pdfs:
+        chave = hash_arquivo(caminho)
+        # Outro backend, --ocr ou FICHA_TRIAGEM produzem outro resultado: não reaproveita o registro
+        item = manifesto.get(chave_extracao(chave, opcoes["backend"], opcoes["ocr"], app5.TRIAGEM_PADRAO))
+        if not reprocessar and item is not None and item["status"] == "ok":
+            continue
+        pendentes.append((caminho, chave))
+    print(f"{len(pdfs)} ficha(s) encontrada(s); {len(pdfs) - len(pendentes)} já concluída(s); "
+          f"{len(pendentes)} a processar.")
+
+    def _registrar(n, chave, registro):
+        manifesto[chave_extracao(chave, opcoes["backend"], opcoes["ocr"], app5.TRIAGEM_PADRAO)] = registro
+        gravar_manifesto(caminho_manifesto, manifesto)
+        situacao = "ok" if registro["status"] == "ok" else f"ERRO ({registro['erro']})"
+        print(f"[{n}/{len(pendentes)}] {registro['arquivo']}: {situacao} em {registro['segundos']}s")
+
+    if workers <= 1:
+        for n, (caminho, chave) in enumerate(pendentes, start=1):
+            _registrar(n, chave, processar_arquivo(caminho, chave, diretorio_saida, opcoes))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futuros = {
+                executor.submit(processar_arquivo, caminho, chave, diretorio_saida, opcoes): chave
+                for caminho, chave in pendentes
+            }
+            for n, futuro in enumerate(as_completed(futuros), start=1):
+                _registrar(n, futuros[futuro], futuro.result())
+
+    gravar_relatorio_erros(os.path.join(diretorio_saida, "erros.csv"), manifesto)
+    return manifesto
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Processamento em lote de fichas financeiras (SIAPE).")
+    parser.add_argument("entradas", nargs="+", help="Diretórios, arquivos PDF ou padrões glob.")
+    parser.add_argument("-o", "--saida", required=True, help="Diretório de saída.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Fichas processadas em paralelo (padrão: núcleos da máquina).")
+    parser.add_argument("--threshold", type=int, default=85,
+                        help="Similaridade mínima com o glossário, de 0 a 100 (padrão: 85).")
+    parser.add_argument("--backend", choices=["camelot", "texto"], default=app5.BACKEND_PADRAO,
+                        help="Backend de extração das tabelas.")
+    parser.add_argument("--glossario", default=os.path.join(DIRETORIO_APP, "Rubricas.txt"),
+                        help="Arquivo de rubricas de cartão/empréstimo (uma por linha).")
+    parser.add_argument("--tarifas", default=os.path.join(DIRETORIO_APP, "Tarifas.txt"),
+                        help="Arquivo de tarifas/associações (uma por linha).")
+    parser.add_argument("--valor-recebido", default="0", help="Valor B usado em todos os relatórios (ponto separa os centavos).")
+    parser.add_argument("--banco", default=BANCO_PADRAO,
+                        help="Arquivo SQLite onde os resultados são acumulados (vazio para não gravar).")
+    parser.add_argument("--ocr", action="store_true", default=app5.OCR_PADRAO,
+                        help="Aplica OCR às páginas sem camada de texto (fichas digitalizadas).")
+    parser.add_argument("--reprocessar", action="store_true",
+                        help="Processa novamente as fichas já concluídas no manifesto.")
+    args = parser.parse_args(argv)
+
+    for caminho_glossario in (args.glossario, args.tarifas):
+        if not os.path.exists(caminho_glossario):
+            parser.error(f"glossário não encontrado: {caminho_glossario}")
+    pdfs = listar_pdfs(args.entradas)
+    if not pdfs:
+        parser.error("nenhum PDF encontrado nas entradas informadas.")
+
+    opcoes = {
+        "rubricas": app5.carregar_classificador(args.glossario, args.tarifas),
+        "threshold": args.threshold,
+        "backend": args.backend,
+        "valor_recebido": args.valor_recebido,
+        "banco": args.banco,
+        "ocr": args.ocr,
+    }
+    manifesto = executar_lote(pdfs, args.saida, opcoes, workers=args.workers, reprocessar=args.reprocessar)
+    erros = sum(1 for item in manifesto.values() if item["status"] == "erro")
+    print(f"Concluído: {len(manifesto) - erros} ficha(s) ok, {erros} com erro. Saída em {args.saida}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
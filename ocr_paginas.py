@@ -0,0 +1,176 @@
+"""
+OCR (Tesseract) das páginas da ficha que não têm camada de texto (fichas digitalizadas).
+
+Só as páginas sem texto aproveitável passam pelo OCR; as demais continuam sendo
+lidas pela camada de texto do PDF. Cada página é rasterizada (PyMuPDF) e
+reconhecida (pytesseract) em um pool de processos, e o resultado vira a mesma
+lista de palavras com coordenadas (x0, y0, x1, y1, texto, bloco, linha, n), em
+pontos do PDF, que a camada de texto fornece. Assim, a grade
+TIPO / DISCRIMINAÇÃO / meses é reconstruída pelo mesmo código
+(app5.tabela_por_palavras).
+
+O resultado de cada página fica no cache de extração (cache_extracao.py),
+endereçado pelo hash da página (conteúdo e imagens da página, resolução e
+idioma): a mesma página digitalizada em outro PDF não é reconhecida de novo.
+
+As funções executadas nos workers ficam neste módulo (e não em app5.py) porque
+precisam ser importáveis pelos processos filhos, criados pelo forkserver
+(extracao_paralela.contexto_processos), como os do Camelot. Cada página
+reconhecida é gravada no cache assim que fica pronta; `verificar_cancelamento`
+é chamado entre as páginas para interromper o OCR de uma extração cancelada.
+
+Configuração por variáveis de ambiente:
+  FICHA_OCR           ativa o OCR das páginas sem texto ("1"; padrão: desativado)
+  FICHA_OCR_WORKERS   processos de OCR por documento (padrão: 2; 0 = todos os núcleos)
+  FICHA_OCR_DPI       resolução da rasterização (padrão: 300)
+  FICHA_OCR_IDIOMA    idioma do Tesseract (padrão: "por")
+"""
+import hashlib
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from cache_extracao import obter_cache
+from extracao_paralela import contexto_processos, resolver_workers
+
+OCR_PADRAO = os.environ.get("FICHA_OCR", "0").strip().lower() in ("1", "true", "sim")
+WORKERS_PADRAO = int(os.environ.get("FICHA_OCR_WORKERS", "2"))
+DPI_PADRAO = int(os.environ.get("FICHA_OCR_DPI", "300"))
+IDIOMA_PADRAO = os.environ.get("FICHA_OCR_IDIOMA", "por")
+
+# Abaixo disso, a página é considerada sem camada de texto (só carimbos, número da página etc.)
+MIN_PALAVRAS_TEXTO = 5
+
+_SUFIXO_CACHE = ".ocr.json"
+
+
+def pagina_sem_texto(palavras) -> bool:
+    """Indica se a página não tem texto aproveitável na camada de texto do PDF."""
+    uteis = sum(1 for p in palavras if any(c.isalnum() for c in p[4]))
+    return uteis < MIN_PALAVRAS_TEXTO
+
+
+def hash_pagina(doc, pagina, dpi=DPI_PADRAO, idioma=IDIOMA_PADRAO) -> str:
+    """
+    Hash de uma página (1 = primeira) para o cache de OCR: conteúdo da página,
+    imagens que ela usa, tamanho, rotação, resolução e idioma.
+    """
+    page = doc[pagina - 1]
+    h = hashlib.sha256()
+    h.update(f"ocr|{dpi}|{idioma}|{page.rect}|{page.rotation}|".encode())
+    h.update(page.read_contents())
+    for imagem in page.get_images(full=True):
+        h.update(doc.xref_stream_raw(imagem[0]) or b"")
+    return h.hexdigest()
+
+
+def _reconhecer_pagina(caminho, pagina, dpi, idioma):
+    """Rasteriza a página e retorna (texto, palavras) reconhecidos pelo Tesseract."""
+    import fitz
+    import pytesseract
+    from PIL import Image
+
+    with fitz.open(caminho) as doc:
+        pix = doc[pagina - 1].get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    imagem = Image.frombytes("L", (pix.width, pix.height), pix.samples)
+    dados = pytesseract.image_to_data(
+        imagem, lang=idioma, config="--psm 6", output_type=pytesseract.Output.DICT
+    )
+    escala = 72 / dpi  # pixels -> pontos do PDF
+    palavras = []
+    for i, texto in enumerate(dados["text"]):
+        texto = texto.strip()
+        if not texto or float(dados["conf"][i]) < 0:
+            continue
+        x0, y0 = dados["left"][i] * escala, dados["top"][i] * escala
+        palavras.append((
+            x0, y0, x0 + dados["width"][i] * escala, y0 + dados["height"][i] * escala, texto,
+            dados["block_num"][i], dados["line_num"][i], dados["word_num"][i],
+        ))
+    return _texto_das_palavras(palavras), palavras
+
+
+def _texto_das_palavras(palavras):
+    """Texto corrido (uma linha do Tesseract por linha), como o get_text("text") do PyMuPDF."""
+    linhas = {}
+    for p in palavras:
+        linhas.setdefault((p[5], p[6]), []).append(p[4])
+    return "\n".join(" ".join(linha) for linha in linhas.values()) + "\n"
+
+
+def _reconhecer_em_ordem(caminho, pendentes, workers, dpi, idioma):
+    """
+    Gera (página, (texto, palavras)) na ordem de `pendentes`: serial com um worker
+    (ou uma única página); senão, em um pool de processos, submetendo as páginas aos
+    poucos (até duas por worker). Fechar o gerador descarta as páginas ainda não
+    iniciadas sem esperar pelas que estão em reconhecimento.
+    """
+    if workers <= 1 or len(pendentes) == 1:
+        for pagina in pendentes:
+            yield pagina, _reconhecer_pagina(caminho, pagina, dpi, idioma)
+        return
+
+    workers = min(workers, len(pendentes))
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=contexto_processos())
+    try:
+        restantes = iter(pendentes)
+        em_leitura = deque(
+            (pagina, executor.submit(_reconhecer_pagina, caminho, pagina, dpi, idioma))
+            for pagina in islice(restantes, 2 * workers)
+        )
+        while em_leitura:
+            pagina, futuro = em_leitura.popleft()
+            resultado = futuro.result()
+            for seguinte in islice(restantes, 1):
+                em_leitura.append((seguinte, executor.submit(_reconhecer_pagina, caminho, seguinte, dpi, idioma)))
+            yield pagina, resultado
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def reconhecer_paginas(caminho, paginas, workers=None, dpi=None, idioma=None, verificar_cancelamento=None):
+    """
+    OCR das páginas (lista, 1 = primeira) do PDF em `caminho`. Retorna
+    {página: (texto, palavras)}. As páginas já reconhecidas vêm do cache; as
+    restantes são distribuídas por um pool de processos (serial com um worker
+    ou uma única página). `verificar_cancelamento` (ex.:
+    Tarefa.verificar_cancelamento) é chamado antes de cada página e pode levantar
+    uma exceção para interromper o OCR.
+    """
+    import fitz
+
+    dpi = dpi or DPI_PADRAO
+    idioma = idioma or IDIOMA_PADRAO
+    cache = obter_cache()
+    with fitz.open(caminho) as doc:
+        hashes = {pagina: hash_pagina(doc, pagina, dpi, idioma) for pagina in paginas}
+
+    resultados, pendentes = {}, []
+    for pagina in paginas:
+        dados = cache.obter_arquivo(hashes[pagina], _SUFIXO_CACHE)
+        if dados is None:
+            pendentes.append(pagina)
+            continue
+        item = json.loads(dados)
+        resultados[pagina] = (item["texto"], [tuple(p) for p in item["palavras"]])
+    if not pendentes:
+        return resultados
+
+    if verificar_cancelamento is not None:
+        verificar_cancelamento()
+    workers = resolver_workers(WORKERS_PADRAO if workers is None else workers)
+    reconhecidas = _reconhecer_em_ordem(caminho, pendentes, workers, dpi, idioma)
+    try:
+        for pagina, (texto, palavras) in reconhecidas:
+            resultados[pagina] = (texto, palavras)
+            cache.salvar_arquivo(
+                hashes[pagina], _SUFIXO_CACHE,
+                json.dumps({"texto": texto, "palavras": palavras}, ensure_ascii=False).encode("utf-8"),
+            )
+            if verificar_cancelamento is not None:
+                verificar_cancelamento()
+    finally:
+        reconhecidas.close()
+    return resultados
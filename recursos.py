@@ -0,0 +1,111 @@
+"""
+Recursos estáticos compartilhados pelo processo (logomarca, glossários), com
+invalidação quando o arquivo muda.
+
+A cada reexecução, o Streamlit roda o script de novo para cada sessão. Sem este
+módulo, a logomarca seria lida e codificada em base64 e os glossários seriam
+lidos e divididos em linhas a cada interação de cada usuário. `obter_recurso`
+guarda, por arquivo(s) e função de carga, a forma já preparada (ex.: o texto
+base64, o classificador indexado) e a devolve enquanto o arquivo não mudar.
+
+A verificação é em dois níveis:
+
+  * mtime e tamanho (os.stat), no máximo uma vez a cada FICHA_RECURSOS_VERIFICACAO_S
+    segundos por recurso; nesse intervalo, nenhum acesso a disco;
+  * se mudaram, o SHA-256 do conteúdo: só recarrega se o conteúdo for outro
+    (um `touch` ou uma cópia idêntica não reconstroem o recurso).
+
+Assim, editar Rubricas.txt ou Tarifas.txt vale para a próxima interação, sem
+reiniciar a aplicação.
+
+Este estado fica em um módulo importado (e não em app5.py) para sobreviver às
+reexecuções do script pelo Streamlit.
+
+Configuração por variável de ambiente:
+  FICHA_RECURSOS_VERIFICACAO_S   intervalo mínimo entre verificações do arquivo (padrão: 1)
+"""
+import hashlib
+import os
+import threading
+import time
+
+VERIFICACAO_PADRAO_S = float(os.environ.get("FICHA_RECURSOS_VERIFICACAO_S", "1"))
+
+_lock = threading.Lock()
+_recursos = {}
+_travas = {}
+
+
+class _Entrada:
+    def __init__(self, valor, estado, resumo):
+        self.valor = valor
+        self.estado = estado    # (mtime_ns, tamanho) de cada arquivo
+        self.resumo = resumo    # SHA-256 do conteúdo dos arquivos
+        self.verificado_em = time.monotonic()
+
+
+def _estado_arquivos(caminhos):
+    estados = []
+    for caminho in caminhos:
+        st = os.stat(caminho)
+        estados.append((st.st_mtime_ns, st.st_size))
+    return tuple(estados)
+
+
+def _ler_arquivos(caminhos):
+    conteudos = []
+    resumo = hashlib.sha256()
+    for caminho in caminhos:
+        with open(caminho, "rb") as f:
+            dados = f.read()
+        conteudos.append(dados)
+        resumo.update(len(dados).to_bytes(8, "big"))
+        resumo.update(dados)
+    return conteudos, resumo.hexdigest()
+
+
+def obter_recurso(caminhos, carregar, nome=None, verificacao_s=None):
+    """
+    Retorna `carregar(conteudo_1, conteudo_2, ...)` (bytes de cada arquivo em
+    `caminhos`, um caminho ou uma sequência deles), memorizado no processo até que
+    o conteúdo de algum dos arquivos mude.
+
+    O recurso é identificado pelos caminhos e por `nome` (padrão: módulo e nome
+    qualificado de `carregar`); passe `nome` ao usar funções anônimas. Arquivos
+    ausentes levantam FileNotFoundError (e nada é memorizado).
+    """
+    if isinstance(caminhos, (str, os.PathLike)):
+        caminhos = (caminhos,)
+    caminhos = tuple(os.path.abspath(c) for c in caminhos)
+    chave = (caminhos, nome or f"{carregar.__module__}.{carregar.__qualname__}")
+    intervalo = VERIFICACAO_PADRAO_S if verificacao_s is None else verificacao_s
+
+    entrada = _recursos.get(chave)
+    if entrada is not None and time.monotonic() - entrada.verificado_em < intervalo:
+        return entrada.valor
+
+    with _lock:
+        trava = _travas.setdefault(chave, threading.Lock())
+    with trava:
+        entrada = _recursos.get(chave)
+        agora = time.monotonic()
+        if entrada is not None and agora - entrada.verificado_em < intervalo:
+            return entrada.valor  # verificado por outra thread enquanto esperava
+        estado = _estado_arquivos(caminhos)
+        if entrada is not None and entrada.estado == estado:
+            entrada.verificado_em = agora
+            return entrada.valor
+        conteudos, resumo = _ler_arquivos(caminhos)
+        if entrada is not None and entrada.resumo == resumo:
+            entrada.estado, entrada.verificado_em = estado, agora
+            return entrada.valor
+        nova = _Entrada(carregar(*conteudos), estado, resumo)
+        with _lock:
+            _recursos[chave] = nova
+        return nova.valor
+
+
+def limpar_recursos():
+    """Descarta todos os recursos memorizados (o próximo acesso recarrega do disco)."""
+    with _lock:
+        _recursos.clear()
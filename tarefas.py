@@ -0,0 +1,210 @@
+"""
+Fila de tarefas em segundo plano (extração de fichas fora da thread do Streamlit).
+
+Cada tarefa recebe um id, roda em um pool de threads do processo e expõe seu
+estado (pendente, executando, concluída, erro, cancelada), o progresso (0 a 1),
+uma mensagem e, ao final, o resultado. A interface apenas consulta a tarefa a
+cada reexecução; uma interação no meio da extração não descarta o trabalho, e
+várias fichas podem ser enfileiradas.
+
+O cancelamento é cooperativo: tarefas pendentes são retiradas da fila e as que já
+estão executando param no próximo ponto de verificação
+(`tarefa.verificar_cancelamento()`, chamado pela função a cada página).
+
+Tarefas submetidas com a mesma `chave` (ex.: SHA-256 do PDF) enquanto uma delas
+está ativa ou concluída reaproveitam a existente. Cada sessão que submete ou
+reaproveita a tarefa é registrada como `assinante`: o cancelamento pedido por uma
+sessão só interrompe a extração quando nenhuma outra continua inscrita, e
+`liberar` descarta a tarefa (e o resultado, que pode ser um DataFrame grande) assim
+que o último assinante o guardou. Tarefas terminadas e não liberadas são
+descartadas após o tempo de retenção.
+
+Este estado fica em um módulo importado (e não em app5.py) para sobreviver às
+reexecuções do script pelo Streamlit.
+
+Configuração por variáveis de ambiente:
+  FICHA_TAREFAS_WORKERS   tarefas executadas ao mesmo tempo (padrão: 2)
+  FICHA_TAREFAS_RETENCAO  segundos que uma tarefa terminada fica disponível (padrão: 1800)
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS_PADRAO = int(os.environ.get("FICHA_TAREFAS_WORKERS", "2"))
+RETENCAO_PADRAO = float(os.environ.get("FICHA_TAREFAS_RETENCAO", "1800"))
+
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDA = "concluída"
+ERRO = "erro"
+CANCELADA = "cancelada"
+
+_lock = threading.Lock()
+_fila = None
+
+
+class TarefaCancelada(Exception):
+    """Levantada dentro da tarefa quando o cancelamento foi solicitado."""
+
+
+class Tarefa:
+    """Estado de uma tarefa; atualizado pela thread de trabalho e lido pela interface."""
+
+    def __init__(self, descricao="", chave=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.descricao = descricao
+        self.chave = chave
+        self.status = PENDENTE
+        self.progresso = 0.0
+        self.mensagem = "Aguardando na fila"
+        self.resultado = None
+        self.erro = None
+        self.parcial = []  # resultados parciais (ex.: fatias já extraídas)
+        self.metadados = {}  # informações publicadas pela função além do resultado
+        self.criada_em = time.time()
+        self.concluida_em = None
+        self.assinantes = set()
+        self._cancelar = threading.Event()
+        self._futuro = None
+
+    @property
+    def terminada(self):
+        return self.status in (CONCLUIDA, ERRO, CANCELADA)
+
+    @property
+    def cancelamento_solicitado(self):
+        return self._cancelar.is_set()
+
+    def atualizar(self, progresso=None, mensagem=None):
+        if progresso is not None:
+            self.progresso = min(max(float(progresso), 0.0), 1.0)
+        if mensagem is not None:
+            self.mensagem = mensagem
+
+    def verificar_cancelamento(self):
+        """Ponto de verificação: levanta TarefaCancelada se o cancelamento foi pedido."""
+        if self._cancelar.is_set():
+            raise TarefaCancelada()
+
+    def _encerrar(self, status, mensagem):
+        self.status = status
+        self.mensagem = mensagem
+        self.concluida_em = time.time()
+
+
+class FilaTarefas:
+    """Pool de threads com registro das tarefas por id."""
+
+    def __init__(self, workers=None, retencao=None):
+        self.workers = workers or WORKERS_PADRAO
+        self.retencao = RETENCAO_PADRAO if retencao is None else retencao
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ficha-tarefa")
+        self._tarefas = {}
+        self._lock = threading.Lock()
+
+    def submeter(self, funcao, *args, descricao="", chave=None, assinante=None, **kwargs):
+        """
+        Enfileira funcao(tarefa, *args, **kwargs) e retorna a Tarefa. O valor
+        retornado pela função vira `tarefa.resultado`. `assinante` (ex.: o id da
+        sessão) é inscrito na tarefa, nova ou reaproveitada pela `chave`.
+        """
+        with self._lock:
+            self._descartar_antigas()
+            if chave is not None:
+                for tarefa in self._tarefas.values():
+                    if tarefa.chave == chave and tarefa.status in (PENDENTE, EXECUTANDO, CONCLUIDA):
+                        if assinante is not None:
+                            tarefa.assinantes.add(assinante)
+                        return tarefa
+            tarefa = Tarefa(descricao, chave)
+            if assinante is not None:
+                tarefa.assinantes.add(assinante)
+            self._tarefas[tarefa.id] = tarefa
+            tarefa._futuro = self._executor.submit(self._executar, tarefa, funcao, args, kwargs)
+        return tarefa
+
+    @staticmethod
+    def _executar(tarefa, funcao, args, kwargs):
+        if tarefa.cancelamento_solicitado:
+            tarefa._encerrar(CANCELADA, "Cancelada")
+            return
+        tarefa.status = EXECUTANDO
+        tarefa.mensagem = "Iniciando"
+        try:
+            tarefa.resultado = funcao(tarefa, *args, **kwargs)
+        except TarefaCancelada:
+            tarefa._encerrar(CANCELADA, "Cancelada")
+        except Exception as e:
+            tarefa.erro = f"{type(e).__name__}: {e}"
+            tarefa._encerrar(ERRO, tarefa.erro)
+        else:
+            tarefa.progresso = 1.0
+            tarefa._encerrar(CONCLUIDA, "Concluída")
+        finally:
+            tarefa.parcial = []
+
+    def obter(self, id_tarefa):
+        with self._lock:
+            return self._tarefas.get(id_tarefa)
+
+    def listar(self, ids=None):
+        """Tarefas (todas ou as dos ids informados), da mais antiga para a mais nova."""
+        with self._lock:
+            tarefas = list(self._tarefas.values())
+        if ids is not None:
+            ids = set(ids)
+            tarefas = [t for t in tarefas if t.id in ids]
+        return sorted(tarefas, key=lambda t: t.criada_em)
+
+    def cancelar(self, id_tarefa, assinante=None):
+        """
+        Solicita o cancelamento; retorna False se a tarefa não existe, já terminou
+        ou ainda tem outros assinantes. Com `assinante`, ele deixa a tarefa e a
+        extração só é interrompida se foi o último; sem ele, cancela para todos.
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(id_tarefa)
+            if tarefa is None or tarefa.terminada:
+                return False
+            if assinante is not None:
+                tarefa.assinantes.discard(assinante)
+                if tarefa.assinantes:
+                    return False
+        tarefa._cancelar.set()
+        if tarefa._futuro is not None and tarefa._futuro.cancel():
+            tarefa._encerrar(CANCELADA, "Cancelada")  # ainda não tinha começado
+        return True
+
+    def liberar(self, id_tarefa, assinante=None):
+        """
+        Indica que `assinante` já guardou o resultado da tarefa terminada. Quando não
+        resta assinante (ou sem `assinante`), a tarefa sai do registro e o resultado
+        deixa de ser mantido pela fila. Retorna True se a tarefa foi descartada.
+        """
+        with self._lock:
+            tarefa = self._tarefas.get(id_tarefa)
+            if tarefa is None or not tarefa.terminada:
+                return False
+            if assinante is not None:
+                tarefa.assinantes.discard(assinante)
+                if tarefa.assinantes:
+                    return False
+            del self._tarefas[id_tarefa]
+        return True
+
+    def _descartar_antigas(self):
+        limite = time.time() - self.retencao
+        for id_tarefa in [i for i, t in self._tarefas.items()
+                          if t.terminada and t.concluida_em is not None and t.concluida_em < limite]:
+            del self._tarefas[id_tarefa]
+
+
+def obter_fila() -> FilaTarefas:
+    """Retorna a fila de tarefas compartilhada pelo processo."""
+    global _fila
+    with _lock:
+        if _fila is None:
+            _fila = FilaTarefas()
+        return _fila
@@ -0,0 +1,31 @@
+"""Valor recebido (B) digitado com ponto separando os centavos, do cálculo aos relatórios."""
+import pandas as pd
+import pytest
+
+from app5 import inserir_totais_na_coluna, textos_para_relatorio
+from valores import centavos_digitados
+
+
+@pytest.mark.parametrize("digitado, centavos", [
+    ("1.500", 150),
+    ("1500,5", 150050),
+    ("R$ 12.3", 1230),
+    ("1234.567", 123457),
+    ("0", 0),
+    ("abc", None),
+])
+def test_centavos_digitados(digitado, centavos):
+    assert centavos_digitados(digitado) == centavos
+
+
+@pytest.mark.parametrize("digitado, b, indebito", [
+    ("1.500", "1,50", "98,50"),
+    ("1234.567", "1.234,57", "-1.134,57"),
+])
+def test_relatorio_mostra_b_convertido(digitado, b, indebito):
+    df = pd.DataFrame({"DISCRIMINAÇÃO": ["TARIFA"], "DESCONTOS": ["100,00"]})
+    totais = inserir_totais_na_coluna(df, "DESCONTOS", valor_recebido=digitado)
+    textos = textos_para_relatorio(totais).set_index("DISCRIMINAÇÃO")["DESCONTOS"]
+    assert textos["A = Valor Total (R$)"] == "100,00"
+    assert textos["B = Valor Recebido - Autor (a)"] == b
+    assert textos["Indébito (A-B)"] == indebito
@@ -0,0 +1,131 @@
+"""
+Conversão e formatação de valores monetários da ficha financeira.
+
+Os valores chegam em formatos diferentes: "1826,97" (tabelas da ficha),
+"1.234,56" (brasileiro com milhar), "1,234.56" (americano, linhas de totais) ou
+"1500.5" (digitado pelo usuário). A regra usada para os valores da ficha é:
+
+  * o último separador ("." ou ",") é o decimal quando é seguido de 1 ou 2
+    dígitos no fim do texto; todos os demais separadores são de milhar;
+  * sem separador decimal, o valor é inteiro ("1.234" -> 1234,00);
+  * "R$", espaços e o sinal de menos na frente são aceitos.
+
+O valor recebido (B), digitado pelo usuário, segue a convenção do campo: ponto
+(ou vírgula) separa os centavos e não há separador de milhar ("1.500" -> 1,50;
+"1500,5" -> 1500,50). `centavos_digitados` faz essa leitura.
+
+Os valores são representados como inteiros em centavos (int64), o que torna
+somas e diferenças exatas. As funções vetorizadas operam sobre colunas inteiras
+(pandas.Series / arrays) em uma única passada; textos que não seguem a regra
+resultam em <NA>.
+"""
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+_PADRAO_VALOR = r"^(-?)(\d[\d.,]*?)(?:[.,](\d{1,2}))?$"
+_REGEX_VALOR = re.compile(_PADRAO_VALOR)
+_REGEX_LIMPEZA = r"R\$|\s"
+
+
+def _limpar(texto: str) -> str:
+    return re.sub(_REGEX_LIMPEZA, "", texto)
+
+
+def centavos_de_texto(valor):
+    """Versão escalar de `para_centavos`: retorna int (centavos) ou None se inválido."""
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float, np.number)) and not isinstance(valor, bool):
+        return None if pd.isna(valor) else int(round(float(valor) * 100))
+    m = _REGEX_VALOR.match(_limpar(str(valor)))
+    if not m:
+        return None
+    sinal, inteiro, decimal = m.groups()
+    centavos = int(re.sub(r"[.,]", "", inteiro)) * 100 + int((decimal or "0").ljust(2, "0"))
+    return -centavos if sinal else centavos
+
+
+def centavos_digitados(valor):
+    """
+    Centavos de um valor digitado com ponto (ou vírgula) como separador decimal e
+    sem milhar ("1.500" -> 150, "1500,5" -> 150050); None se inválido.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float, np.number)) and not isinstance(valor, bool):
+        return None if pd.isna(valor) else int(round(float(valor) * 100))
+    try:
+        numero = Decimal(_limpar(str(valor)).replace(",", "."))
+    except InvalidOperation:
+        return None
+    if not numero.is_finite():
+        return None
+    return int((numero * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def para_centavos(valores) -> pd.Series:
+    """
+    Converte uma coluna de valores (textos BR/US ou números) em centavos, com
+    dtype Int64 (inteiro anulável). Nulos e textos inválidos viram <NA>.
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    if pd.api.types.is_numeric_dtype(serie.dtype) and not pd.api.types.is_bool_dtype(serie.dtype):
+        numeros = serie.astype("float64")
+        return (numeros * 100).round().astype("Int64")
+
+    textos = serie.astype("string").str.replace(_REGEX_LIMPEZA, "", regex=True)
+    partes = textos.str.extract(_PADRAO_VALOR)
+    inteiro = pd.to_numeric(partes[1].str.replace(r"[.,]", "", regex=True), errors="coerce")
+    decimal = pd.to_numeric(partes[2].fillna("0").str.ljust(2, "0"), errors="coerce")
+    centavos = (inteiro * 100 + decimal).astype("Int64")
+    negativo = (partes[0] == "-").fillna(False).to_numpy(dtype=bool)
+    centavos[negativo] = -centavos[negativo]
+    centavos.index = serie.index
+    return centavos
+
+
+def somar_centavos(valores) -> int:
+    """Soma exata (em centavos) de uma coluna de valores; inválidos contam como zero."""
+    return int(para_centavos(valores).sum())
+
+
+def formatar_centavos(centavos, separador_milhar=".", separador_decimal=",") -> pd.Series:
+    """
+    Formata uma coluna de centavos (inteiros, <NA> permitido) como texto com
+    duas casas decimais ("123456" -> "1.234,56"). <NA> vira texto vazio.
+    """
+    serie = centavos if isinstance(centavos, pd.Series) else pd.Series(centavos)
+    serie = serie.astype("Int64")
+    absolutos = serie.abs()
+    inteiros = (absolutos // 100).astype("string")
+    inteiros = inteiros.str.replace(r"\B(?=(\d{3})+$)", separador_milhar, regex=True)
+    fracao = (absolutos % 100).astype("string").str.zfill(2)
+    sinal = pd.Series(np.where((serie < 0).fillna(False), "-", ""), index=serie.index, dtype="string")
+    return (sinal + inteiros + separador_decimal + fracao).fillna("").astype(object)
+
+
+def formatar_brl(centavos, simbolo=False) -> pd.Series:
+    """Formata centavos no padrão brasileiro ("1.234,56"), opcionalmente com "R$ "."""
+    textos = formatar_centavos(centavos)
+    if simbolo:
+        textos = textos.where(textos == "", "R$ " + textos.astype(str))
+    return textos
+
+
+def formatar_us(centavos) -> pd.Series:
+    """Formata centavos no padrão americano ("1,234.56")."""
+    return formatar_centavos(centavos, separador_milhar=",", separador_decimal=".")
+
+
+def texto_brl(centavos, simbolo=False) -> str:
+    """Versão escalar de `formatar_brl`."""
+    if centavos is None:
+        return ""
+    inteiros, fracao = divmod(abs(int(centavos)), 100)
+    texto = f"{inteiros:,}".replace(",", ".") + f",{fracao:02d}"
+    if centavos < 0:
+        texto = "-" + texto
+    return f"R$ {texto}" if simbolo else texto